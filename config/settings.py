@@ -1,12 +1,34 @@
-import requests
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 API_KEY = os.getenv("DUKE_API_TOKEN")
-BASE_URL = "https://streamer.oit.duke.edu/curriculum"
-endpoint = f"{BASE_URL}/list_of_values/fieldname/SUBJECT"
+# Point at a local stand-in (python -m src.fake_api) to run offline
+BASE_URL = os.getenv("DUKE_API_BASE_URL", "https://streamer.oit.duke.edu/curriculum")
 
-response = requests.get(endpoint, params={"access_token": API_KEY})
-data = response.json()  # This should include a list of subjects
+# HTTP client tuning (see src/api_client.ApiClient)
+API_TIMEOUT = (
+    float(os.getenv("DUKE_API_CONNECT_TIMEOUT", "5")),   # seconds to connect
+    float(os.getenv("DUKE_API_READ_TIMEOUT", "15")),     # seconds to first byte
+)
+API_RETRIES = int(os.getenv("DUKE_API_RETRIES", "4"))
+API_BACKOFF = float(os.getenv("DUKE_API_BACKOFF", "0.5"))
+
+# On-disk response cache (see src/api_client.ResponseCache)
+#   off    – always hit the network
+#   on     – serve fresh cached payloads, fetch and store the rest
+#   replay – cache only: never touch the network, misses come back as 504
+API_CACHE_MODE = os.getenv("DUKE_API_CACHE", "off")
+API_CACHE_PATH = os.getenv(
+    "DUKE_API_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "api_cache.db"),
+)
+API_CACHE_MAX_MB = float(os.getenv("DUKE_API_CACHE_MAX_MB", "512"))
+
+# Raw payload archive written by create_db.py --archive, read by --reparse
+# (see src/api_client.PayloadArchive)
+API_ARCHIVE_PATH = os.getenv(
+    "DUKE_API_ARCHIVE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "api_archive.db"),
+)
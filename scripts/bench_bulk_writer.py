@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Rows/sec for a create_db-shaped load: insert_many per table per subject
+(the old flush) vs. one BulkWriter session committing once per subject.
+The baseline is a copy of insert_many as it was then (connect, INSERT OR
+REPLACE, commit, close per call), since src.db.insert_many has moved on.
+
+    python scripts/bench_bulk_writer.py --subjects 200
+"""
+import os, sys, time, argparse, tempfile, sqlite3
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.db as db
+from src.db import create_table, BulkWriter
+
+TABLES = {
+    "courses":          {"crse_id": "TEXT PRIMARY KEY", "subject": "TEXT", "course_title_long": "TEXT",
+                         "catalog_nbr": "TEXT", "ssr_crse_typoff_cd": "TEXT"},
+    "course_offerings": {"offering_id": "TEXT", "strm": "TEXT", "crse_id": "TEXT", "descrlong": "TEXT",
+                         "consent_lov_descr": "TEXT", "acad_career": "TEXT", "ssr_component": "TEXT",
+                         "PRIMARY KEY (offering_id, strm)": ""},
+    "class_listings":   {"class_id": "TEXT PRIMARY KEY", "strm": "TEXT", "crse_id": "TEXT", "crse_offer_nbr": "TEXT"},
+    "meeting_patterns": {"class_id": "TEXT", "strm": "TEXT", "class_section": "TEXT",
+                         "ssr_mtg_loc_long": "TEXT", "ssr_mtg_sched_long": "TEXT"},
+    "instructors":      {"class_id": "TEXT", "strm": "TEXT", "class_section": "TEXT", "name_display": "TEXT",
+                         "last_name": "TEXT", "first_name": "TEXT"},
+}
+
+def subject_rows(s, courses):
+    """Synthetic rows for one subject, shaped like create_db's buffers."""
+    rows = {t: [] for t in TABLES}
+    for c in range(courses):
+        cid = f"{s:03d}{c:03d}"
+        cls = f"{cid}_1_1940"
+        rows["courses"].append({"crse_id": cid, "subject": f"S{s}", "course_title_long": "Title " * 4,
+                                "catalog_nbr": str(100 + c), "ssr_crse_typoff_cd": "FALL"})
+        rows["course_offerings"].append({"offering_id": f"{cid}_1", "strm": "1940", "crse_id": cid,
+                                         "descrlong": "Lorem ipsum " * 20, "consent_lov_descr": "No",
+                                         "acad_career": "UGRD", "ssr_component": "LEC"})
+        rows["class_listings"].append({"class_id": cls, "strm": "1940", "crse_id": cid, "crse_offer_nbr": "1"})
+        for sec in ("01", "02"):
+            rows["meeting_patterns"].append({"class_id": cls, "strm": "1940", "class_section": sec,
+                                             "ssr_mtg_loc_long": "LSRC B101", "ssr_mtg_sched_long": "MW 10:05AM"})
+            rows["instructors"].append({"class_id": cls, "strm": "1940", "class_section": sec,
+                                        "name_display": f"Prof {c}", "last_name": f"{c}", "first_name": "Prof"})
+    return rows
+
+def insert_many(table, rows):
+    """src.db.insert_many before BulkWriter and TableLoader, verbatim apart from connect_db()."""
+    if not rows:
+        return 0
+
+    cols = sorted({k for row in rows for k in row})
+    placeholders = ", ".join("?" for _ in cols)
+    sql = f'INSERT OR REPLACE INTO {table} ({", ".join(cols)}) VALUES ({placeholders})'
+    values = [
+        tuple(row.get(col) for col in cols)    # use .get -> None for missing
+        for row in rows
+    ]
+
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.executemany(sql, values)
+    conn.commit()
+    conn.close()
+    return len(values)
+
+def fresh_db(path):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db.set_db_file(path)
+    for table, schema in TABLES.items():
+        create_table(table, schema)
+
+def run_insert_many(path, batches):
+    fresh_db(path)
+    start = time.perf_counter()
+    for rows in batches:
+        for table in TABLES:
+            insert_many(table, rows[table])
+    return time.perf_counter() - start
+
+def run_bulk_writer(path, batches):
+    fresh_db(path)
+    start = time.perf_counter()
+    with BulkWriter(path) as w:
+        for rows in batches:
+            for table in TABLES:
+                w.upsert(table, rows[table])
+            w.commit()
+    return time.perf_counter() - start
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--subjects", type=int, default=200)
+    ap.add_argument("--courses", type=int, default=40, help="courses per subject")
+    ap.add_argument("--dir", default=None, help="where to put the scratch DB")
+    args = ap.parse_args()
+
+    batches = [subject_rows(s, args.courses) for s in range(args.subjects)]
+    total = sum(len(r) for b in batches for r in b.values())
+    path = os.path.join(args.dir or tempfile.mkdtemp(), "bench.db")
+
+    print(f"{args.subjects} subjects, {total} rows, one commit per subject")
+    for label, fn in (("insert_many", run_insert_many), ("BulkWriter", run_bulk_writer)):
+        secs = fn(path, batches)
+        print(f"  {label:<12} {secs:7.2f} s   {total / secs:>10,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Professors/sec for scrape_rmp's Chrome and HTTP backends against the local
+RateMyProfessors stub (src/fake_rmp.py), pacing off.
+
+    python scripts/bench_rmp_backends.py --professors 200 --drivers 4 --latency 0.02
+"""
+import os, sys, time, argparse, logging, threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import scrape_rmp
+from src.fake_api import start_server
+from src.fake_rmp import create_app, synthetic_professors
+
+def run(backend, names, drivers):
+    """(driver start-up seconds, total seconds, records) for one backend."""
+    make_driver, scrape = scrape_rmp.backend(backend)
+    records, lock = [], threading.Lock()
+    def save(record):
+        with lock:
+            records.append(record)
+
+    start = time.perf_counter()
+    make_driver().quit()
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scrape_rmp.ScrapePool(names, drivers, make_driver=make_driver, scrape=scrape, save=save).run()
+    return startup, time.perf_counter() - start, records
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--professors", type=int, default=200)
+    ap.add_argument("--drivers", type=int, default=4)
+    ap.add_argument("--latency", type=float, default=0.0, help="stub delay per page, seconds")
+    ap.add_argument("--backends", default="http,chrome")
+    args = ap.parse_args()
+
+    profs = synthetic_professors(args.professors)
+    server, url = start_server(create_app(profs, latency=args.latency))
+    scrape_rmp.RMP_BASE_URL = url
+    scrape_rmp.MIN_DELAY = scrape_rmp.MAX_DELAY = 0.0
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{len(profs)} professors, {args.drivers} workers, {args.latency * 1000:.0f} ms/page")
+    for backend in args.backends.split(","):
+        if backend == "chrome" and scrape_rmp.webdriver is None:
+            print(f"  {backend:<7} skipped (selenium not installed)")
+            continue
+        startup, secs, records = run(backend, list(profs), args.drivers)
+        wrong = sum(r != profs[r["professor"]] for r in records)
+        print(f"  {backend:<7} start-up {startup:6.2f} s   {secs:7.2f} s   "
+              f"{len(records) / secs:>8,.1f} professors/s   {wrong} mismatched")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
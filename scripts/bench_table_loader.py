@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Per-row cost of turning dict rows into parameter tuples: the old
+insert_many (union of every row's keys, then row.get per column) vs. a
+TableLoader compiled once per table, on create_db-shaped rows plus a
+typed table where the loader also converts INTEGER/REAL values.
+
+The typed rows cost more than dict-union, and are meant to: dict-union
+passes "abc" through to an INTEGER column unchecked, while the loader
+converts or rejects every value there and checks NOT NULL columns. What
+the numbers bound is the price of that validation.
+
+    python scripts/bench_table_loader.py --rows 200000
+"""
+import os, sys, time, argparse, sqlite3
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import src.db as db
+from bench_bulk_writer import TABLES, subject_rows
+
+TYPED = {"id": "INTEGER PRIMARY KEY", "name": "TEXT NOT NULL", "year": "INTEGER",
+         "gpa": "REAL", "units": "REAL", "major": "TEXT"}
+
+def typed_rows(n, as_text):
+    """Rows for TYPED; *as_text* sends the numbers as strings, as a form would."""
+    fmt = str if as_text else (lambda v: v)
+    return [{"name": f"user{i}", "year": fmt(2020 + i % 5), "gpa": fmt(i % 40 / 10),
+             "units": fmt(float(i % 34)), "major": "CS"} for i in range(n)]
+
+def dict_union(rows):
+    """What insert_many did before TableLoader."""
+    cols = sorted({k for row in rows for k in row})
+    return [tuple(row.get(col) for col in cols) for row in rows]
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=200_000, help="rows per table (about)")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(":memory:", factory=db.Connection)
+    for table, schema in {**TABLES, "typed": TYPED}.items():
+        db.create_table(table, schema, conn)
+
+    per_subject = sum(len(r) for r in subject_rows(0, 40).values())
+    batches = [subject_rows(s, 40) for s in range(max(1, args.rows * len(TABLES) // per_subject))]
+    workloads = [(t, t, [r for b in batches for r in b[t]]) for t in TABLES]
+    workloads += [("typed (numbers)", "typed", typed_rows(args.rows, False)),
+                  ("typed (as text)", "typed", typed_rows(args.rows, True))]
+
+    print(f"ns per row to build parameters (best of {args.repeat})")
+    print(f"  {'table':<18}{'rows':>9}{'dict-union':>12}{'TableLoader':>13}")
+    for label, table, rows in workloads:
+        compiled = db.loader(table, conn)
+        old = best_of(lambda: dict_union(rows), args.repeat)
+        new = best_of(lambda: compiled.tuples(rows), args.repeat)
+        print(f"  {label:<18}{len(rows):>9,}{old / len(rows) * 1e9:>12.0f}{new / len(rows) * 1e9:>13.0f}")
+
+    start = time.perf_counter()
+    for _ in range(10_000):
+        db.loader("course_offerings", conn)
+    cached = (time.perf_counter() - start) / 10_000
+    start = time.perf_counter()
+    for _ in range(1_000):
+        db.TableLoader("course_offerings", conn.execute("PRAGMA table_info(course_offerings)").fetchall())
+    fresh = (time.perf_counter() - start) / 1_000
+    print(f"loader lookup: {cached * 1e6:.2f} µs cached vs {fresh * 1e6:.1f} µs PRAGMA + compile")
+
+if __name__ == "__main__":
+    main()
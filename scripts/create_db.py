@@ -1,12 +1,9 @@
-import os, sys, time, re
-from collections import defaultdict
+import os, sys, time, argparse, json, hashlib, datetime, sqlite3, zlib, glob
+import queue, signal, threading, multiprocessing, itertools
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-# Remove existing database file to ensure fresh schema
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-db_file = os.path.join(project_root, "courses.db")
-if os.path.exists(db_file):
-    print(f"🔄 Removing old DB at {db_file}")
-    os.remove(db_file)
 
 # Add project root to Python path
 sys.path.append(project_root)
@@ -16,280 +13,1118 @@ from src.api_client import (
     get_all_terms,
     get_course_listings,
     get_course_offering_metadata,
-    get_course_details
+    get_course_details,
+    set_request_budget,
+    configure_client,
+    get_client,
+    set_cache_mode,
+    PayloadArchive,
 )
-from src.db import create_table, insert_many, add_columns_if_missing
+from config.settings import API_ARCHIVE_PATH
+import src.db
+from src import telemetry
+from src.db import (
+    create_table, insert_many, connect_db, add_columns_if_missing,
+    set_db_file, users_db_file, read_only_uri, check_snapshot, swap_in_snapshot, BulkWriter,
+)
+from src.parse_api import _first_listing, parse_course
+from src.schema import PROFESSORS_SCHEMA, link_professors
+from src.migrations import MOVED_TABLES, migrate_catalog, migrate_users
+
+# --------------------
+# Create Tables (fresh)
+# --------------------
+# Tables this script builds; the catalog holds nothing else. User data
+# (users, reviews, favorites, professor_ratings) lives in users.db.
+CATALOG_TABLES = [
+    "courses", "course_offerings", "course_attributes", "class_listings",
+    "meeting_patterns", "instructors", "professors", "course_sync", "terms",
+    "ingest_run", "ingest_subjects", "ingest_courses",
+]
+# Tables whose rows carry a row_hash, with the key a row is matched on when
+# diffing snapshots or reconciling re-fetched rows (None: no key, compared
+# as (class_id, row_hash) sets).
+CHANGE_KEYS = {
+    "courses":           ["crse_id"],
+    "course_offerings":  ["offering_id", "strm"],
+    "course_attributes": ["offering_id", "strm"],
+    "class_listings":    ["class_id"],
+    "meeting_patterns":  None,
+    "instructors":       None,
+}
+# Must be non-empty, and not shrink much, before a snapshot goes live.
+CHECKED_TABLES = ["courses", "course_offerings", "class_listings", "meeting_patterns"]
+
+def create_tables():
+    create_table("courses", {
+        "crse_id": "TEXT PRIMARY KEY",
+        "subject": "TEXT",
+        "course_title_long": "TEXT",
+        "catalog_nbr": "TEXT",
+        "ssr_crse_typoff_cd": "TEXT",
+        "row_hash": "TEXT"
+    })
+    create_table("terms", {"strm": "TEXT PRIMARY KEY", "descr": "TEXT"})
+    # everything below courses is per term (strm)
+    create_table("course_offerings", {
+        "offering_id": "TEXT",
+        "strm": "TEXT",
+        "crse_id": "TEXT",
+        "descrlong": "TEXT",
+        "consent_lov_descr": "TEXT",
+        "acad_career": "TEXT",
+        "ssr_component": "TEXT",
+        "row_hash": "TEXT",
+        "PRIMARY KEY (offering_id, strm)": ""
+    })
+    create_table("course_attributes", {
+        "offering_id": "TEXT",
+        "strm": "TEXT",
+        "descrlong": "TEXT",
+        "rqrmnt_group_descr": "TEXT",
+        "row_hash": "TEXT",
+        "PRIMARY KEY (offering_id, strm)": ""
+    })
+    create_table("class_listings", {"class_id": "TEXT PRIMARY KEY", "strm": "TEXT", "crse_id": "TEXT", "crse_offer_nbr": "TEXT", "row_hash": "TEXT"})
+    create_table("meeting_patterns", {"class_id": "TEXT", "strm": "TEXT", "class_section": "TEXT", "ssr_mtg_loc_long": "TEXT", "ssr_mtg_sched_long": "TEXT", "row_hash": "TEXT"})
+    create_table("instructors", {"class_id": "TEXT", "strm": "TEXT", "class_section": "TEXT", "name_display": "TEXT", "last_name": "TEXT", "first_name": "TEXT", "professor_id": "INTEGER", "row_hash": "TEXT"})
+    create_table("professors", PROFESSORS_SCHEMA)
+    # an incremental copy of an older live DB has no hashes or professor ids yet
+    for table in CHANGE_KEYS:
+        add_columns_if_missing(table, {"row_hash": "TEXT"})
+    conn = connect_db()
+    link_professors(conn, ["instructors"])
+    conn.commit()
+    conn.close()
+    # the app's indexes (src.migrations.CATALOG_INDEXES) are added by
+    # migrate_catalog() in publish(), after the bulk load
+    # what each course summary looked like when we last fetched it
+    create_table("course_sync", {
+        "crse_id": "TEXT",
+        "strm": "TEXT",
+        "effdt": "TEXT",
+        "content_hash": "TEXT",
+        "PRIMARY KEY (crse_id, strm)": ""
+    })
+    # checkpoint journal: lets an interrupted build pick up where it stopped
+    create_table("ingest_run", {"key": "TEXT PRIMARY KEY", "value": "TEXT"})
+    create_table("ingest_subjects", {
+        "subject": "TEXT PRIMARY KEY",
+        "listed": "INTEGER",          # 0 if the listing call failed
+        "completed_at": "TEXT"
+    })
+    create_table("ingest_courses", {
+        "crse_id": "TEXT PRIMARY KEY",
+        "subject": "TEXT",
+        "completed_at": "TEXT"
+    })
+
+writer = None            # BulkWriter on the staging DB for the whole build
+archive = None           # PayloadArchive: written with --archive, read with --reparse
+reparsing = False
+courses_seen = set()
+# buffer key -> table it is written to, in flush order
+BUFFER_TABLES = {
+    "courses": "courses", "offerings": "course_offerings", "attrs": "course_attributes",
+    "classes": "class_listings", "meetings": "meeting_patterns", "instructors": "instructors",
+    "professors": "professors", "sync": "course_sync", "journal": "ingest_courses",
+}
+BUFFER_KEYS = {table: key for key, table in BUFFER_TABLES.items()}
+buffers = {}             # buffer key -> RowBuffer, bound to the writer by open_buffers()
+flush_limits = {"rows": 50_000, "bytes": 32 << 20}    # --flush-rows / --flush-mb
+attribute_columns = set()
+
+# incremental refresh state
+sync_state = {}          # (crse_id, strm) -> (effdt, content_hash) as stored
+stale_courses = []       # re-fetched (crse_id, strm) to reconcile with stored rows
+rows_changed = Counter() # table -> rows the build inserted, updated or deleted
+subjects_listed = set()  # subjects whose course list we actually received
+refresh_counts = Counter()
+
+def summary_hash(course):
+    """Stable hash of a course summary exactly as the API returned it."""
+    blob = json.dumps(course, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest()
 
-def sql_safe(name: str) -> str:
+# A (crse_id, strm)'s per-term rows in each table
+TERM_ROWS = {
+    "course_offerings": "crse_id=? AND strm=?",
+    "course_attributes": "strm=?2 AND offering_id IN "
+                         "(SELECT offering_id FROM course_offerings WHERE crse_id=?1 AND strm=?2)",
+    "class_listings":   "crse_id=? AND strm=?",
+    "meeting_patterns": "class_id IN (SELECT class_id FROM class_listings WHERE crse_id=? AND strm=?)",
+    "instructors":      "class_id IN (SELECT class_id FROM class_listings WHERE crse_id=? AND strm=?)",
+}
+
+def reconcile_term_rows(keys):
     """
-    Turn arbitrary text into a valid SQLite column name.
-      • replace spaces, hyphens, parens, etc. with underscores
-      • lower-case everything
-      • if it would start with a digit, prefix with “_”
+    Match the buffered rows of each re-fetched (crse_id, strm) in *keys*
+    against the stored ones before they are written, so only real changes
+    touch the database.  Rows are matched on the table's CHANGE_KEYS key
+    (key-less tables on class_id + row_hash):
+
+      same key, same row_hash   → dropped from the buffer, nothing written
+      same key, other row_hash  → kept; the UPSERT updates it in place
+      stored, not re-fetched    → deleted
     """
-    col = re.sub(r"\W+", "_", name.strip().lower())
-    return f"_{col}" if col and col[0].isdigit() else col
+    gone = {}
+    for table, where in TERM_ROWS.items():          # read everything before deleting
+        key = CHANGE_KEYS[table] or ["class_id", "row_hash"]
+        stored = {}                                 # key → [(rowid, row_hash), …]
+        for cid, strm in keys:
+            for rowid, digest, *k in writer.execute(
+                    f"SELECT rowid, row_hash, {', '.join(key)} FROM {table} WHERE {where}", (cid, strm)):
+                stored.setdefault(tuple(k), []).append((rowid, digest))
+        if not stored:
+            continue
+        buf = buffers[BUFFER_KEYS[table]]
+        at = [buf.columns.index(c) for c in key]
+        digest_at = buf.columns.index("row_hash")
+        kept = []
+        for row in buf.rows:
+            match = stored.get(tuple(row[i] for i in at))
+            if match and match.pop()[1] == row[digest_at]:
+                continue
+            kept.append(row)
+        buf.rows = kept
+        gone[table] = [rowid for rows in stored.values() for rowid, _ in rows]
+    for table, rowids in gone.items():
+        for rowid in rowids:
+            writer.execute(f"DELETE FROM {table} WHERE rowid=?", (rowid,))
+        rows_changed[table] += len(rowids)
+
+def delete_course_rows(conn, cids):
+    """Remove *cids* and every row derived from them, in all terms."""
+    for cid in cids:
+        conn.execute("DELETE FROM instructors WHERE class_id IN "
+                     "(SELECT class_id FROM class_listings WHERE crse_id=?)", (cid,))
+        conn.execute("DELETE FROM meeting_patterns WHERE class_id IN "
+                     "(SELECT class_id FROM class_listings WHERE crse_id=?)", (cid,))
+        conn.execute("DELETE FROM course_attributes WHERE offering_id IN "
+                     "(SELECT offering_id FROM course_offerings WHERE crse_id=?)", (cid,))
+        conn.execute("DELETE FROM course_offerings WHERE crse_id=?", (cid,))
+        conn.execute("DELETE FROM class_listings WHERE crse_id=?", (cid,))
+        conn.execute("DELETE FROM courses WHERE crse_id=?", (cid,))
+        conn.execute("DELETE FROM course_sync WHERE crse_id=?", (cid,))
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+def journal_course(cid, code):
+    buffers["journal"].add({"crse_id": cid, "subject": code, "completed_at": _now()})
 
+def open_buffers():
+    """Give every buffer a RowBuffer in its table's column order."""
+    for key, table in BUFFER_TABLES.items():
+        buffers[key] = writer.buffer(table)
 
-def _is_attr_dict(x):
-    """Return True only if *x* looks like a course-attribute dict."""
-    return isinstance(x, dict) and "crse_attr_lov_descr" in x
+# Helper to flush buffers to DB and clear.  Everything - rows, sync state
+# and journal entries - lands in one transaction, so the journal never
+# claims work whose rows were lost.
 
-def _as_list(node):
-    """Return *node* itself if it is already a list,  
-    wrap it in a one-element list if it is a dict,  
-    or return an empty list if it is None / missing."""
-    if node is None:
-        return []
-    return node if isinstance(node, list) else [node]
+def flush(done_subject=None, note=""):
+    reconcile_term_rows(stale_courses)
+    for key, table in BUFFER_TABLES.items():
+        before = writer.changes
+        writer.write(buffers[key])
+        rows_changed[table] += writer.changes - before
+    if done_subject:
+        writer.upsert("ingest_subjects", [{
+            "subject": done_subject,
+            "listed": int(done_subject in subjects_listed),
+            "completed_at": _now(),
+        }])
+    writer.commit()
+    print(f"💾 Flushed: {len(buffers['courses'])} courses, {len(buffers['offerings'])} offerings{note}")
+    discard_buffers()
 
-def sql_safe(name: str) -> str:
-    col = re.sub(r'\W+', '_', name.strip().lower())        # replace non-word chars
-    return f"_{col}" if col and col[0].isdigit() else col
+def discard_buffers():
+    stale_courses.clear()
+    for buf in buffers.values():
+        buf.clear()
 
-# ───── safe nested lookup ───────────────────────────────────
-def _dig(node, *keys):
+def flush_if_full():
     """
-    Traverse `node` (a dict or None) through the given key path.
-    If any level is None/missing, return None instead of raising.
+    Flush mid-subject once the buffers pass --flush-rows or --flush-mb, so
+    memory stays flat however large a subject is.  Only called between
+    courses: everything buffered then belongs to whole, journaled courses,
+    and the subject itself is only marked done at its final flush.
     """
-    for k in keys:
-        if not isinstance(node, dict):
-            return None
-        node = node.get(k)
-    return node
+    rows = sum(len(b) for b in buffers.values())
+    size = sum(b.nbytes for b in buffers.values())
+    if rows >= flush_limits["rows"] or size >= flush_limits["bytes"]:
+        flush(note=f" (buffer limit: {rows} rows, {size / 2**20:.1f} MB)")
 
 # --------------------
-# Create Tables (fresh)
+# Network: everything one course needs, fetched together
 # --------------------
-create_table("courses", {
-    "crse_id": "TEXT PRIMARY KEY",
-    "subject": "TEXT",
-    "course_title_long": "TEXT",
-    "catalog_nbr": "TEXT",
-    "ssr_crse_typoff_cd": "TEXT"
-})
-create_table("course_offerings", {
-    "offering_id": "TEXT PRIMARY KEY",
-    "crse_id": "TEXT",
-    "descrlong": "TEXT",
-    "consent_lov_descr": "TEXT",
-    "acad_career": "TEXT",
-    "ssr_component": "TEXT"
-})
-create_table("course_attributes", {"offering_id": "TEXT PRIMARY KEY", "descrlong":"TEXT", "rqrmnt_group_descr":"TEXT"})
-create_table("class_listings", {"class_id": "TEXT PRIMARY KEY", "crse_id": "TEXT", "crse_offer_nbr": "TEXT"})
-create_table("meeting_patterns", {"class_id": "TEXT",  "class_section": "TEXT", "ssr_mtg_loc_long": "TEXT", "ssr_mtg_sched_long": "TEXT"})
-create_table("instructors", {"class_id": "TEXT",  "class_section": "TEXT", "name_display": "TEXT", "last_name": "TEXT", "first_name": "TEXT"})
+def archived(endpoint, key, strm, fetch):
+    """
+    The payload for (endpoint, key, strm): read back from the archive when
+    reparsing, otherwise fetch() it and archive it if --archive is on.
+    Error payloads are never archived.
+    """
+    if reparsing:
+        return archive.get(endpoint, key, strm)
+    payload = fetch()
+    if archive is not None and payload and "error" not in payload:
+        archive.put(endpoint, key, strm, payload)
+    return payload
+
+def fetch_course(term_code, cid, details_memo=None):
+    """
+    Return (metadata, details) for one course in one term.  Details don't
+    depend on the term, so *details_memo* ({crse_offer_nbr: details}) lets
+    several terms share one call.
+    """
+    data = archived("classes", cid, term_code,
+                    lambda: get_course_offering_metadata(term_code, cid)) or {}
+    lst = _first_listing(data)
+    if lst is None:
+        return data, None
+
+    off_nbr = lst.get("crse_offer_nbr")
+    if details_memo is not None and off_nbr in details_memo:
+        return data, details_memo[off_nbr]
+    try:
+        details = archived("details", f"{cid}/{off_nbr}", "",
+                           lambda: get_course_details(cid, off_nbr)) or {}
+    except Exception as e:
+        print(f"    ⚠️  details call failed for {cid}/{off_nbr}: {e}")
+        details = {}             # always defined so look-ups below succeed
+    if details_memo is not None:
+        details_memo[off_nbr] = details
+    return data, details
+
+def fetch_course_terms(cid, terms):
+    """
+    Return [(metadata, details), …] for one course, one entry per term.
+    This is the unit of work handed to the thread pool, so it must not
+    touch `buffers`.
+    """
+    memo = {}
+    return [fetch_course(term_code, cid, memo) for term_code in terms]
 
 # --------------------
-# Select the most recent term
+# One subject: list its courses, fan out the per-course calls
 # --------------------
-terms = get_all_terms()["scc_lov_resp"]["lovs"]["lov"]["values"]["value"]
-if not terms:
-    print("❌ No terms found.")
-    sys.exit(1)
-latest = terms[-1]
-term_code = latest.get("code")
-term_name = latest.get("descrlong", term_code)
-print(f"🔖 Scraping only most recent term: {term_name} (code {term_code})")
+def list_subject(code, terms, incremental=False):
+    """
+    List *code*'s courses and decide which need fetching.
+
+    Returns:
+      (todo, unchanged): todo is [(course, digest, todo_terms), …] for
+      courses to fetch; unchanged holds the crse_ids an incremental run
+      can skip.  Both are empty if the listing call failed.
+    """
+    resp = archived("listing", code, "", lambda: get_course_listings(code))
+    try:
+        clist = resp["ssr_get_courses_resp"]["course_search_result"]["subjects"]["subject"]["course_summaries"]["course_summary"]
+        if isinstance(clist, dict): clist = [clist]
+    except Exception:
+        print(f"⚠️ No courses for {code}")
+        return [], []
+    subjects_listed.add(code)
+    if not clist:
+        print(f"⚠️ Empty course list for {code}")
+        return [], []
+
+    todo, unchanged = [], []
+    for course in clist:
+        cid = course.get("crse_id")
+        if not cid or cid in courses_seen:
+            continue
+        courses_seen.add(cid)
+
+        digest = summary_hash(course)
+        current = (course.get("effdt"), digest)
+        todo_terms = [t for t in terms
+                      if not incremental or sync_state.get((cid, t)) != current]
+        if todo_terms:
+            todo.append((course, digest, todo_terms))
+        else:
+            unchanged.append(cid)
+    return todo, unchanged
+
+def skip_unchanged(code, cids):
+    for cid in cids:
+        refresh_counts["unchanged"] += 1
+        journal_course(cid, code)
+
+def buffer_course(code, course, digest, todo_terms, parsed):
+    """Queue one course's parsed rows, sync state and journal entry for the
+    next flush.  The journal entry goes last so an interrupted flush never
+    marks a course done without its rows."""
+    rows, columns = parsed
+    cid = course["crse_id"]
+    known = [(cid, t) for t in todo_terms if (cid, t) in sync_state]
+    stale_courses.extend(known)
+    refresh_counts["changed" if known else "new"] += 1
+    new_columns = columns - attribute_columns
+    if new_columns:
+        # ADD COLUMN appends, so attrs already buffered keep their layout
+        writer.add_columns_if_missing("course_attributes", {c: "TEXT" for c in sorted(new_columns)})
+        buffers["attrs"].rebind(writer.columns("course_attributes"))
+        attribute_columns.update(new_columns)
+    for key, batch in rows.items():
+        add = buffers[key].add
+        for row in batch:
+            add(row)
+    for t in todo_terms:
+        buffers["sync"].add({"crse_id": cid, "strm": t, "effdt": course.get("effdt"),
+                             "content_hash": digest})
+    journal_course(cid, code)
+    flush_if_full()
+
+def harvest_subject(code, terms, pool=None, incremental=False):
+    todo, unchanged = list_subject(code, terms, incremental)
+    skip_unchanged(code, unchanged)
+
+    # map() keeps submission order, so rows land in the buffers exactly
+    # as they would in a sequential run regardless of completion order
+    fetch = lambda item: fetch_course_terms(item[0]["crse_id"], item[2])
+    results = pool.map(fetch, todo) if pool else map(fetch, todo)
+    for (course, digest, todo_terms), payloads in zip(todo, results):
+        parsed = parse_course(code, course, list(zip(todo_terms, payloads)))
+        buffer_course(code, course, digest, todo_terms, parsed)
 
 # --------------------
-# Build DB Content: one course per subject, flush after each
+# Pipelined ingest: list → fetch → parse → write
 # --------------------
-subjects = get_all_subjects()["scc_lov_resp"]["lovs"]["lov"]["values"]["value"]
-print(f"Starting scrape: {len(subjects)} subjects @ {term_name}")
+class StageMeter:
+    """Items handled and time spent working, summed over one stage's workers."""
 
-courses_seen = set()
-buffers = {"courses": [], "offerings": [], "attrs": [], "classes": [], "meetings": [], "instructors": []}
-attribute_columns = set()
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.items += 1
+            self.busy += elapsed
+
+    def utilisation(self, wall):
+        return self.busy / (wall * self.workers) if wall else 0.0
+
+    def report(self, wall):
+        return (f"{self.name:<6} {self.items:>7} items {self.items / wall:9.1f}/s   "
+                f"busy {self.utilisation(wall):4.0%} of {self.workers} worker(s)")
+
+def _ignore_sigint():
+    # Ctrl-C is handled by the writer in the parent; parse workers just die with it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def run_pipeline(codes, terms, fetchers=4, parsers=2, incremental=False):
+    """
+    Ingest *codes* as a staged pipeline instead of subject by subject.
+
+    A lister thread queues course jobs for `fetchers` network threads, their
+    payloads are turned into rows by a pool of `parsers` processes, and this
+    thread is the only one that touches the buffers and the database.  The
+    queues are bounded, so the slowest stage pushes back on the ones before
+    it.  Each subject is flushed (and journaled) once all its courses are in.
+    """
+    fetch_q = queue.Queue(maxsize=fetchers * 4)
+    parse_q = queue.Queue(maxsize=parsers * 4)
+    write_q = queue.Queue(maxsize=parsers * 4)
+    meters = {name: StageMeter(name, n) for name, n in
+              (("list", 1), ("fetch", fetchers), ("parse", parsers), ("write", 1))}
+    procs = ProcessPoolExecutor(max_workers=parsers, initializer=_ignore_sigint,
+                                mp_context=multiprocessing.get_context("spawn"))
+    done = object()
+
+    def fetch_worker():
+        while (job := fetch_q.get()) is not done:
+            code, course, digest, todo_terms = job
+            started = time.perf_counter()
+            payloads = fetch_course_terms(course["crse_id"], todo_terms)
+            meters["fetch"].record(started)
+            parse_q.put((code, course, digest, todo_terms, payloads))
+
+    def parse_worker():
+        while (job := parse_q.get()) is not done:
+            code, course, digest, todo_terms, payloads = job
+            started = time.perf_counter()
+            parsed = procs.submit(parse_course, code, course,
+                                  list(zip(todo_terms, payloads))).result()
+            meters["parse"].record(started)
+            write_q.put(("course", code, course, digest, todo_terms, parsed))
+
+    def stage(target, n):
+        def run():
+            try:
+                target()
+            except BaseException as e:           # surface it in the writer
+                write_q.put(("error", e))
+        threads = [threading.Thread(target=run, daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def lister():
+        # the subject marker goes out before its jobs, so the writer always
+        # knows how many courses to wait for
+        for code in codes:
+            started = time.perf_counter()
+            todo, unchanged = list_subject(code, terms, incremental)
+            meters["list"].record(started)
+            write_q.put(("subject", code, len(todo), unchanged))
+            for course, digest, todo_terms in todo:
+                fetch_q.put((code, course, digest, todo_terms))
+        # wind the stages down in order
+        for _ in fetch_threads:
+            fetch_q.put(done)
+        for t in fetch_threads:
+            t.join()
+        for _ in parse_threads:
+            parse_q.put(done)
+        for t in parse_threads:
+            t.join()
+        write_q.put(("end",))
+
+    fetch_threads = stage(fetch_worker, fetchers)
+    parse_threads = stage(parse_worker, parsers)
+    began = time.perf_counter()
+    stage(lister, 1)
+
+    waiting = {}                     # subject -> courses still to come
+    finished = 0
+    try:
+        while (msg := write_q.get())[0] != "end":
+            started = time.perf_counter()
+            if msg[0] == "error":
+                raise msg[1]
+            if msg[0] == "subject":
+                _, code, n, unchanged = msg
+                skip_unchanged(code, unchanged)
+                waiting[code] = n
+            else:
+                _, code, course, digest, todo_terms, parsed = msg
+                buffer_course(code, course, digest, todo_terms, parsed)
+                waiting[code] -= 1
+            if waiting[code] == 0:
+                del waiting[code]
+                finished += 1
+                print(f"\n[{finished}/{len(codes)}] Subject: {code}")
+                flush(done_subject=code)
+                print(telemetry.active().subject_done(len(codes) - finished))
+            meters["write"].record(started)
+    finally:
+        procs.shutdown(wait=False, cancel_futures=True)
+
+    wall = time.perf_counter() - began
+    print(f"\n📊 Pipeline throughput over {wall:.1f}s:")
+    for meter in meters.values():
+        print(f"   {meter.report(wall)}")
+    slowest = max(meters.values(), key=lambda m: m.utilisation(wall))
+    print(f"   🐢 Busiest stage: {slowest.name}")
+    telemetry.active().add_section("pipeline", {
+        "wall_seconds": round(wall, 2),
+        "busiest": slowest.name,
+        "stages": {m.name: {"workers": m.workers, "items": m.items,
+                            "per_sec": round(m.items / wall, 1),
+                            "utilisation": round(m.utilisation(wall), 3)}
+                   for m in meters.values()},
+    })
 
-# Helper to flush buffers to DB and clear
-
-def flush():
-    insert_many("courses", buffers["courses"])
-    insert_many("course_offerings", buffers["offerings"])
-    add_columns_if_missing("course_attributes", {c: "TEXT" for c in attribute_columns})
-    insert_many("course_attributes", buffers["attrs"])
-    insert_many("class_listings", buffers["classes"])
-    insert_many("meeting_patterns", buffers["meetings"])
-    insert_many("instructors", buffers["instructors"])
-    print(f"💾 Flushed: {len(buffers['courses'])} courses, {len(buffers['offerings'])} offerings")
-    for key in buffers:
-        buffers[key].clear()
-
-try:
-    for idx, subj in enumerate(subjects, start=1):
-        code = subj.get("code")
-        if "_" in code:
-            continue                 # jump to the next subject
-        print(f"\n[{idx}/{len(subjects)}] Subject: {code}")
-        # fetch first course
-        resp = get_course_listings(code)
+def remove_vanished_courses():
+    """
+    Delete courses that are still stored under a subject we listed this
+    run but that the API no longer returned.  Subjects whose listing call
+    failed are left alone so a transient error never wipes a department.
+    """
+    conn = connect_db()
+    rows = conn.execute("SELECT crse_id, subject FROM courses").fetchall()
+    gone = [cid for cid, subject in rows
+            if subject in subjects_listed and cid not in courses_seen]
+    delete_course_rows(conn, gone)
+    # people who no longer teach anything in the catalog
+    conn.execute("DELETE FROM professors WHERE professor_id NOT IN "
+                 "(SELECT professor_id FROM instructors WHERE professor_id IS NOT NULL)")
+    conn.commit()
+    conn.close()
+    refresh_counts["removed"] = len(gone)
+
+# --------------------
+# Sharding: split the subject list across processes or machines
+# --------------------
+def parse_shard(spec):
+    """'3/8' → (3, 8): the third of eight shards, numbered from 1."""
+    try:
+        k, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected K/N such as 3/8, got {spec!r}")
+    if not 1 <= k <= n:
+        raise argparse.ArgumentTypeError(f"shard {spec}: K must be between 1 and N")
+    return k, n
+
+def in_shard(code, shard):
+    """crc32, not hash(), so every machine agrees on the assignment."""
+    k, n = shard
+    return zlib.crc32(code.encode()) % n == k - 1
+
+def shard_path(db, shard):
+    """data/courses.db → data/courses.shard3of8.db"""
+    root, ext = os.path.splitext(db)
+    return f"{root}.shard{shard[0]}of{shard[1]}{ext}"
+
+# Which rows belong to the courses a shard wins, per merged table
+SHARD_ROWS = {
+    "courses":          "crse_id IN (SELECT crse_id FROM keep)",
+    "course_offerings": "crse_id IN (SELECT crse_id FROM keep)",
+    "course_attributes": "offering_id IN (SELECT offering_id FROM shard.course_offerings "
+                         "WHERE crse_id IN (SELECT crse_id FROM keep))",
+    "class_listings":   "crse_id IN (SELECT crse_id FROM keep)",
+    "meeting_patterns": "class_id IN (SELECT class_id FROM shard.class_listings "
+                        "WHERE crse_id IN (SELECT crse_id FROM keep))",
+    "instructors":      "class_id IN (SELECT class_id FROM shard.class_listings "
+                        "WHERE crse_id IN (SELECT crse_id FROM keep))",
+    "course_sync":      "crse_id IN (SELECT crse_id FROM keep)",
+    "professors":       "1",       # ids come from the name, so shards agree
+    "terms":            "1",
+}
+
+def merge_shards(paths):
+    """
+    Combine finished shard databases into the current (staging) database.
+
+    Shards must come from one `--shard K/N` series: same N, same terms,
+    every K present and finished.  A cross-listed course can be harvested
+    by several shards; the copy kept is the one from the subject that comes
+    first in the API's subject order, as in an unsharded build.  Offerings
+    are deduplicated on offering_id as well.
+
+    Returns:
+      {"shards": n, "courses": n} for the merged snapshot.
+    """
+    runs = []
+    for path in paths:
+        conn = sqlite3.connect(read_only_uri(path), uri=True)
         try:
-            clist = resp["ssr_get_courses_resp"]["course_search_result"]["subjects"]["subject"]["course_summaries"]["course_summary"]
-            if isinstance(clist, dict): clist = [clist]
-        except Exception:
-            print(f"⚠️ No courses for {code}")
-            continue
-        if not clist:
-            print(f"⚠️ Empty course list for {code}")
+            runs.append(dict(conn.execute("SELECT key, value FROM ingest_run")))
+        except sqlite3.Error as e:
+            raise SystemExit(f"❌ {path} is not a shard database: {e}")
+        finally:
+            conn.close()
+
+    specs = [r.get("shard") for r in runs]
+    if None in specs:
+        raise SystemExit(f"❌ Not a shard build: {paths[specs.index(None)]}")
+    shards = [parse_shard(spec) for spec in specs]
+    n = shards[0][1]
+    if sorted(shards) != [(k, n) for k in range(1, n + 1)]:
+        raise SystemExit(f"❌ Need shards 1..{n} of {n} exactly once, got {', '.join(specs)}")
+    if len({r["term_codes"] for r in runs}) > 1:
+        raise SystemExit("❌ Shards were built for different terms")
+    unfinished = [p for p, r in zip(paths, runs) if "finished_at" not in r]
+    if unfinished:
+        raise SystemExit(f"❌ Unfinished shard(s): {', '.join(unfinished)}")
+
+    # first subject in API order wins a cross-listed course
+    order = {code: i for i, code in enumerate(runs[0].get("subjects", "").split(","))}
+    winner = {}                                  # crse_id -> (subject rank, shard index)
+    for idx, path in enumerate(paths):
+        conn = sqlite3.connect(read_only_uri(path), uri=True)
+        for cid, subject in conn.execute("SELECT crse_id, subject FROM courses"):
+            rank = (order.get(subject, len(order)), idx)
+            if rank < winner.get(cid, (len(order) + 1, 0)):
+                winner[cid] = rank
+        conn.close()
+
+    conn = connect_db()
+    for idx, path in enumerate(paths):
+        print(f"🧩 Merging shard {specs[idx]} from {path}")
+        conn.execute("ATTACH DATABASE ? AS shard", (path,))
+        conn.execute("CREATE TEMP TABLE keep (crse_id TEXT PRIMARY KEY)")
+        conn.executemany("INSERT INTO keep VALUES (?)",
+                         [(cid,) for cid, (_, i) in winner.items() if i == idx])
+        attrs = [r[1] for r in conn.execute("PRAGMA shard.table_info(course_attributes)")]
+        add_columns_if_missing("course_attributes", {c: "TEXT" for c in attrs}, conn)
+        for table, where in SHARD_ROWS.items():
+            cols = ", ".join(f'"{r[1]}"' for r in conn.execute(f"PRAGMA shard.table_info({table})"))
+            conn.execute(f"INSERT OR IGNORE INTO main.{table} ({cols}) "
+                         f"SELECT {cols} FROM shard.{table} WHERE {where}")
+        conn.execute("DROP TABLE temp.keep")
+        conn.commit()
+        conn.execute("DETACH DATABASE shard")
+    insert_many("ingest_run", [
+        {"key": "term_codes", "value": runs[0]["term_codes"]},
+        {"key": "incremental", "value": "0"},
+        {"key": "merged_from", "value": ",".join(specs)},
+        {"key": "finished_at", "value": _now()},
+    ], conn)
+    conn.commit()
+    conn.close()
+    return {"shards": n, "courses": len(winner)}
+
+def _crse_id(key):
+    # offering_id is "<crse_id>_<nbr>", class_id "<crse_id>_<nbr>_<strm>"
+    return key.split("_", 1)[0]
+
+def diff_snapshots(staging, live):
+    """
+    Compare the new snapshot with the live one, row by row, via row_hash.
+
+    Returns:
+      {"tables": {table: {"added", "changed", "removed"}},
+       "crse_ids": {"added": [...], "changed": [...], "removed": [...]}}
+      where a course counts as changed if any of its rows did.  With no
+      live DB every row is new; a live table from before row hashes (or
+      without the key's columns) counts as replaced outright, every new
+      row added and every old one removed.
+    """
+    conn = sqlite3.connect(staging)
+    has_live = os.path.exists(live)
+    if has_live:
+        conn.execute("ATTACH DATABASE ? AS live", (read_only_uri(live),))
+    tables, touched = {}, set()
+    added_cids = removed_cids = set()
+    for table, key in CHANGE_KEYS.items():
+        id_col = (key or ["class_id"])[0]
+        live_cols = ({r[1] for r in conn.execute(f"PRAGMA live.table_info({table})")}
+                     if has_live else set())
+        if not live_cols.issuperset(["row_hash", *(key or ["class_id"])]):
+            new = conn.execute(f"SELECT {id_col} FROM main.{table}").fetchall()
+            gone = (conn.execute(f"SELECT {id_col} FROM live.{table}").fetchall()
+                    if id_col in live_cols else [])
+            n_gone = (conn.execute(f"SELECT COUNT(*) FROM live.{table}").fetchone()[0]
+                      if live_cols else 0)
+            tables[table] = {"added": len(new), "changed": 0, "removed": n_gone}
+            touched.update(_crse_id(r[0]) for r in (*new, *gone))
+            if table == "courses":
+                added_cids = {r[0] for r in new} - {r[0] for r in gone}
+                removed_cids = {r[0] for r in gone} - {r[0] for r in new}
             continue
-        for course in clist:
-            cid = course.get("crse_id")
-            if not cid or cid in courses_seen:
-                continue
-            # record course
-            buffers["courses"].append({
-                "crse_id": cid,
-                "subject": code,
-                "course_title_long": course.get("course_title_long"),
-                "catalog_nbr": course.get("catalog_nbr"),
-                "ssr_crse_typoff_cd": course.get("ssr_crse_typoff_cd"),
-            })
-            courses_seen.add(cid)
-            #print(f" ✔ Course: {cid}")
-
-            # fetch offerings for the selected term only
-            data = get_course_offering_metadata(term_code, cid) or {}
-        
-            sr = data.get("ssr_get_classes_resp", {}).get("search_result", {})
-            subjects_block = sr.get("subjects") or {}
-            items = subjects_block.get("subject")
-            if isinstance(items, dict): items = [items]
-            entries = items or []
-            if entries:
-                lst = entries[0]
-                off_nbr = lst.get("crse_offer_nbr")
-                off_id = f"{cid}_{off_nbr}"
-                buffers["offerings"].append({
-                    "offering_id": off_id,
-                    "crse_id": cid,
-                    "descrlong": lst.get("ssr_descrlong"),
-                    "consent_lov_descr": lst.get("consent_lov_descr"),
-                    "acad_career": lst.get("acad_career"),
-                    "ssr_component": lst.get("ssr_component"),
-                })
-
-            # ──────────────────────────────────────────────────────────────
-            # 1) attributes that live in the class-listing (unchanged)
-            # 2) attributes that live in the course-details endpoint
-            #    → guarantees we pick up *every* crse_attr_lov_descr
-            # ──────────────────────────────────────────────────────────────
-                amap = defaultdict(list)
-                src_attrs = _as_list(
-                    _dig(lst, "course_attributes", "course_attribute"))
-
-                src_attrs += _as_list(
-                    _dig(data,
-                        "ssr_get_course_offering_resp",
-                        "course_offering_result",
-                        "course_offering",
-                        "course_attributes",
-                        "course_attribute"))
-
-                try:
-                    details = get_course_details(cid, off_nbr) or {}
-                except Exception as e:
-                    print(f"    ⚠️  details call failed for {cid}/{off_nbr}: {e}")
-                    details = {}             # always defined so look-ups below succeed
-
-                # ── merge attributes that appear only in the details payload ─────
-                src_attrs += _as_list(
-                    _dig(
-                        details,
-                        "ssr_get_course_offering_resp",
-                        "course_offering_result",
-                        "course_offering",
-                        "course_attributes",
-                        "course_attribute"
-                    )
-)
-            # build the pivot dict and remember new column names
-                for a in _as_list(src_attrs):
-                    if not _is_attr_dict(a):
-                        continue                        # skip stray strings / nulls
-
-                    k_raw = a["crse_attr_lov_descr"].strip()
-                    v_raw = a["crse_attr_value_lov_descr"].strip()
-                    if v_raw.lower() == "foreign languages curriculum course":
-                        v_raw = "(FL) Foreign Languages"
-                    
-                    if not (k_raw and v_raw):
-                        continue
-
-                    k = sql_safe(k_raw)                # legal SQLite identifier
-                    amap[k].append(v_raw)
-                    attribute_columns.add(k)
-
-                course_off = (
-                    _dig(details,                       # 1️⃣ preferred – full details call
-                        "ssr_get_course_offering_resp",
-                        "course_offering_result",
-                        "course_offering")
-                    or
-                    _dig(data,                          # 2️⃣ fallback – metadata call
-                        "ssr_get_course_offering_resp",
-                        "course_offering_result",
-                        "course_offering")
-                    or {}
-                )
-
-                descr_txt = (
-                    lst.get("ssr_descrlong")            # value from class-listing
-                    or course_off.get("descrlong")      # fallback to course-offering
-                )
-
-                prereq_txt = (
-                    lst.get("rqrmnt_group_descr")       # present in some class-listings
-                    or course_off.get("rqrmnt_group_descr")
-                )
-
-                buffers["attrs"].append({
-                    "offering_id":          off_id,
-                    "descrlong":            descr_txt,
-                    "rqrmnt_group_descr":   prereq_txt,
-                    **{k: ", ".join(v) for k, v in amap.items()}
-                })
-
-            # class listing
-                cls_id = f"{off_id}_{term_code}"
-                buffers["classes"].append({"class_id": cls_id, "crse_id": cid, "crse_offer_nbr": off_nbr})
-            # ------------- meeting patterns  +  instructors -------------
-                class_summaries = _as_list(
-                    lst.get("classes_summary", {}).get("class_summary")
-                )
-
-                for cs in class_summaries:
-                    pats = _as_list(_dig(cs, "classes_meeting_patterns", "class_meeting_pattern"))                    
-
-                    for p in pats:
-                        # ── meeting row ───────────────────────────────────────
-                        buffers["meetings"].append({
-                            "class_id":           cls_id,
-                            "class_section":      p.get("class_section"), 
-                            "ssr_mtg_loc_long":   p.get("ssr_mtg_loc_long"),
-                            "ssr_mtg_sched_long": p.get("ssr_mtg_sched_long"),
-                        })
-
-                        # ── instructors inside *this* pattern ────────────────
-                        for ins in _as_list(
-                                    _dig(p, "class_instructors", "class_instructor")   # safe!
-                        ):
-                            buffers["instructors"].append({
-                                "class_id":     cls_id,
-                                "class_section":      p.get("class_section"), 
-                                "name_display": ins.get("name_display"),
-                                "last_name":    ins.get("last_name"),
-                                "first_name":   ins.get("first_name"),
-                            })
-        flush()
-
-except KeyboardInterrupt:
-    print("\nInterrupted! Flushing remaining data...")
+        if key:
+            on = " AND ".join(f"n.{k} = o.{k}" for k in key)
+            new = conn.execute(f"SELECT n.{key[0]} FROM main.{table} n WHERE NOT EXISTS "
+                               f"(SELECT 1 FROM live.{table} o WHERE {on})").fetchall()
+            gone = conn.execute(f"SELECT o.{key[0]} FROM live.{table} o WHERE NOT EXISTS "
+                                f"(SELECT 1 FROM main.{table} n WHERE {on})").fetchall()
+            changed = conn.execute(f"SELECT n.{key[0]} FROM main.{table} n JOIN live.{table} o "
+                                   f"ON {on} WHERE n.row_hash IS NOT o.row_hash").fetchall()
+        else:
+            new = conn.execute(f"SELECT class_id, row_hash FROM main.{table} EXCEPT "
+                               f"SELECT class_id, row_hash FROM live.{table}").fetchall()
+            gone = conn.execute(f"SELECT class_id, row_hash FROM live.{table} EXCEPT "
+                                f"SELECT class_id, row_hash FROM main.{table}").fetchall()
+            changed = []
+        tables[table] = {"added": len(new), "changed": len(changed), "removed": len(gone)}
+        touched.update(_crse_id(r[0]) for r in (*new, *gone, *changed))
+        if table == "courses":
+            added_cids = {r[0] for r in new}
+            removed_cids = {r[0] for r in gone}
+    conn.close()
+    return {
+        "baseline": live if has_live else None,
+        "tables": tables,
+        "crse_ids": {
+            "added": sorted(added_cids),
+            "changed": sorted(touched - added_cids - removed_cids),
+            "removed": sorted(removed_cids),
+        },
+    }
+
+def publish(staging, live, min_ratio, tables=CHECKED_TABLES):
+    """
+    Swap the finished staging DB into place if *tables* pass their checks,
+    and write what changed to <live>.changes.json for the web tier.
+    """
+    # user data still kept in an old catalog is copied out before that
+    # catalog is replaced; from then on it is dropped from every snapshot
+    users = users_db_file(live)
+    if migrate_users(users, live):
+        print(f"🛠️  Migrated {users}")
+    conn = sqlite3.connect(staging)
+    for t in MOVED_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {t}")
+    conn.commit()
+    conn.close()
+    applied = migrate_catalog(staging)  # app indexes and schema version ship with the snapshot
+    if applied:
+        print(f"🛠️  Applied schema migrations {', '.join(map(str, applied))} to {staging}")
+    problems = check_snapshot(staging, live, tables, min_ratio)
+    if problems:
+        print(f"❌ Not swapping {staging} into place:")
+        for p in problems:
+            print(f"   • {p}")
+        sys.exit(1)
+    changes = diff_snapshots(staging, live)
+    swap_in_snapshot(staging, live)
+    print(f"🔀 Swapped new snapshot into {live}")
+    changes["swapped_at"] = _now()
+    with open(live + ".changes.json", "w") as f:
+        json.dump(changes, f, indent=2)
+    print("🧮 Changes: " + ", ".join(
+        f"{t} +{c['added']} ~{c['changed']} -{c['removed']}" for t, c in changes["tables"].items()))
+    ids = changes["crse_ids"]
+    print(f"   courses: {len(ids['added'])} added, {len(ids['changed'])} changed, "
+          f"{len(ids['removed'])} removed → {live}.changes.json")
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Rebuild the course catalog database from the Duke curriculum API.")
+    ap.add_argument("--terms", default="latest",
+                    help="terms to ingest: 'latest', 'latest:N' for the N most "
+                         "recent, or comma-separated codes like 1940,1945")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="concurrent per-course fetches (1 = sequential)")
+    ap.add_argument("--flush-rows", type=int, default=50_000,
+                    help="also flush mid-subject once this many rows are buffered")
+    ap.add_argument("--flush-mb", type=float, default=32,
+                    help="also flush mid-subject once buffered rows reach about this many MB")
+    ap.add_argument("--pipeline", action="store_true",
+                    help="run list/fetch/parse/write as concurrent stages with "
+                         "bounded queues and report each stage's throughput")
+    ap.add_argument("--parsers", type=int, default=os.cpu_count() or 2,
+                    help="parse processes for --pipeline (default: CPU count)")
+    ap.add_argument("--rate", type=float, default=None,
+                    help="max requests/second against the API host (default: unlimited)")
+    ap.add_argument("--burst", type=int, default=None,
+                    help="requests allowed back-to-back before --rate applies")
+    ap.add_argument("--incremental", action="store_true",
+                    help="keep the existing DB and only re-fetch courses whose "
+                         "summary (effdt + content hash) changed; drop vanished ones")
+    ap.add_argument("--resume", action="store_true",
+                    help="continue an interrupted build from its checkpoint journal "
+                         "and report how much work is left")
+    ap.add_argument("--db", default=src.db.DB_FILE,
+                    help="live database to replace (default: data/courses.db); "
+                         "the build itself goes to <db>.staging")
+    ap.add_argument("--min-ratio", type=float, default=0.9,
+                    help="refuse the swap if a core table keeps less than this "
+                         "fraction of its live row count (0 = no check)")
+    ap.add_argument("--cache", choices=("off", "on", "replay"), default=None,
+                    help="response cache: on = reuse fresh payloads, replay = "
+                         "cache only, no network (default: $DUKE_API_CACHE)")
+    ap.add_argument("--cache-path", default=None,
+                    help="response cache file (default: data/api_cache.db)")
+    ap.add_argument("--archive", nargs="?", const=API_ARCHIVE_PATH, default=None, metavar="PATH",
+                    help="keep every raw API payload, compressed, in a side DB "
+                         "(default PATH: data/api_archive.db)")
+    ap.add_argument("--reparse", action="store_true",
+                    help="rebuild every derived table from the --archive payloads "
+                         "instead of calling the API")
+    ap.add_argument("--metrics-out", default=None, metavar="PATH",
+                    help="where to write the build's JSON metrics summary "
+                         "(default: build_metrics/<timestamp>.json next to --db)")
+    ap.add_argument("--shard", type=parse_shard, default=None, metavar="K/N",
+                    help="harvest only the K-th of N deterministic subject shards "
+                         "into its own DB (<db>.shardKofN.db)")
+    ap.add_argument("--merge", nargs="*", default=None, metavar="SHARD_DB",
+                    help="merge finished shard DBs into --db instead of scraping "
+                         "(no paths: use the <db>.shard*of*.db files next to it)")
+    ap.add_argument("--base-url", default=None,
+                    help="API root to scrape, e.g. a local src.fake_api server "
+                         "(default: $DUKE_API_BASE_URL or the Duke streamer)")
+    args = ap.parse_args(argv)
+    if args.shard and args.merge is not None:
+        ap.error("--shard and --merge are separate steps")
+    return args
+
+def select_terms(spec, all_terms):
+    """
+    Resolve a --terms spec against the API's term list (oldest first).
+
+      latest      → the most recent term
+      latest:N    → the N most recent terms
+      1940,1945   → exactly those term codes
+    """
+    codes = [t.get("code") for t in all_terms]
+    if spec == "latest":
+        return codes[-1:]
+    if spec.startswith("latest:"):
+        n = spec.split(":", 1)[1]
+        if not n.isdigit() or int(n) < 1:
+            raise SystemExit(f"❌ --terms latest:N needs a whole number N of at least 1, got {n!r}")
+        return codes[-int(n):]
+    wanted = [c.strip() for c in spec.split(",") if c.strip()]
+    unknown = [c for c in wanted if c not in codes]
+    if unknown:
+        raise SystemExit(f"❌ Unknown term code(s): {', '.join(unknown)}")
+    return wanted
+
+def read_journal():
+    """Return (run_info, done_subjects, journaled_courses) from the journal,
+    or (None, ...) if there is no build to resume."""
+    conn = connect_db()
+    try:
+        run = dict(conn.execute("SELECT key, value FROM ingest_run").fetchall())
+        done = dict(conn.execute("SELECT subject, listed FROM ingest_subjects").fetchall())
+        courses = dict(conn.execute("SELECT crse_id, subject FROM ingest_courses").fetchall())
+    except sqlite3.OperationalError:          # DB predates the journal
+        return None, {}, {}
+    finally:
+        conn.close()
+    return (run or None), done, courses
+
+def start_journal(term_codes, incremental, subjects, shard=None):
+    """Forget any previous run and record the parameters of this one."""
+    conn = connect_db()
+    conn.execute("DELETE FROM ingest_run")
+    conn.execute("DELETE FROM ingest_subjects")
+    conn.execute("DELETE FROM ingest_courses")
+    insert_many("ingest_run", [
+        {"key": "term_codes", "value": ",".join(term_codes)},
+        {"key": "incremental", "value": "1" if incremental else "0"},
+        {"key": "subjects", "value": ",".join(subjects)},   # API order, all shards
+        {"key": "started_at", "value": _now()},
+        *([{"key": "shard", "value": f"{shard[0]}/{shard[1]}"}] if shard else []),
+    ], conn)
+    conn.commit()
+    conn.close()
+
+def finish_journal():
+    insert_many("ingest_run", [{"key": "finished_at", "value": _now()}])
+
+def write_metrics(path, status, term_codes):
+    """Save the build's telemetry (plus what was built) as JSON at *path*."""
+    metrics = telemetry.active()
+    metrics.add_section("build", {
+        "status": status,
+        "db": src.db.DB_FILE,
+        "terms": term_codes,
+        "courses": len(courses_seen),
+        "subjects_listed": len(subjects_listed),
+        "refresh": dict(refresh_counts),
+        "rows_changed": dict(rows_changed),
+        "connections": get_client().connection_stats(),
+    })
+    metrics.write(path)
+    print(f"📈 Build metrics written to {path}")
+
+def reset_state():
+    """Forget what a previous build in this process saw (tests call main() twice)."""
+    courses_seen.clear()
+    attribute_columns.clear()
+    sync_state.clear()
+    stale_courses.clear()
+    subjects_listed.clear()
+    refresh_counts.clear()
+    rows_changed.clear()
+    buffers.clear()
+
+builds_started = itertools.count(1)      # numbers this process's metrics files
+
+def main(argv=None):
+    args = parse_args(argv)
+    reset_state()
+    if args.metrics_out is None:
+        # pid and a per-process count: builds started in the same second
+        # (in parallel, or one after another in-process) each get their own file
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        args.metrics_out = os.path.join(os.path.dirname(os.path.abspath(args.db)), "build_metrics",
+                                        f"{stamp}-{os.getpid()}-{next(builds_started)}.json")
+    metrics = telemetry.start()
+    try:
+        build(args, metrics)
+    finally:
+        telemetry.stop()      # or later ApiClient calls in this process keep recording
+
+def build(args, metrics):
+    global archive, reparsing
+    reparsing = args.reparse
+    archive = None
+    if args.reparse:
+        path = args.archive or API_ARCHIVE_PATH
+        if not os.path.exists(path):
+            raise SystemExit(f"❌ No payload archive at {path}")
+        archive = PayloadArchive(path, readonly=True)
+        args.incremental = False          # everything is re-derived
+        print(f"🗃️  Reparsing from {path}")
+    elif args.archive:
+        archive = PayloadArchive(args.archive)
+    client_opts = {"base_url": args.base_url} if args.base_url else {}
+    configure_client(pool_size=max(10, args.workers), **client_opts)
+    set_request_budget(args.rate, args.burst)
+    if args.cache:
+        set_cache_mode(args.cache, args.cache_path)
+
+    # Everything is written to a staging file; the live DB keeps serving
+    # until the finished snapshot passes its checks and is swapped in.
+    live = os.path.abspath(shard_path(args.db, args.shard) if args.shard else args.db)
+    staging = live + ".staging"
+    set_db_file(staging)
+
+    if args.merge is not None:
+        root, ext = os.path.splitext(live)
+        paths = args.merge or sorted(glob.glob(f"{root}.shard*of*{ext}"))
+        if not paths:
+            raise SystemExit(f"❌ No shard databases found next to {live}")
+        for leftover in (staging, staging + "-journal", staging + "-wal", staging + "-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        create_tables()
+        merged = merge_shards(paths)
+        print(f"\n✅ Merged {merged['shards']} shards: {merged['courses']} courses")
+        publish(staging, live, args.min_ratio)
+        return
+
+    # no staging file: nothing was interrupted (a published build's was swapped in)
+    run, done_subjects, journaled = (read_journal() if args.resume and os.path.exists(staging)
+                                     else (None, {}, {}))
+    if args.resume and run is None:
+        print("⏯️  No interrupted build to resume; starting a fresh one.")
+    resuming = run is not None
+    if resuming:
+        # the journal, not the command line, decides what kind of run this is
+        args.incremental = run.get("incremental") == "1"
+    else:
+        # Remove any leftover staging file to ensure fresh schema
+        for leftover in (staging, staging + "-journal", staging + "-wal", staging + "-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        if args.incremental and os.path.exists(live):
+            print(f"🔄 Copying live DB into {staging}")
+            src_conn, dst_conn = sqlite3.connect(live), sqlite3.connect(staging)
+            src_conn.backup(dst_conn)
+            src_conn.close()
+            per_term = all("strm" in {r[1] for r in dst_conn.execute(f"PRAGMA table_info({t})")}
+                           for t in ("class_listings", "course_attributes"))
+            dst_conn.close()
+            if not per_term:
+                print("⚠️  Live DB predates per-term storage; doing a full build instead")
+                os.remove(staging)
+                args.incremental = False
+
+    create_tables()
+
+    subjects_lov = archived("lov", "SUBJECT", "", get_all_subjects)
+    terms_lov = archived("lov", "STRM", "", get_all_terms)
+    if not (subjects_lov and terms_lov):
+        raise SystemExit("❌ The archive has no subject/term lists; build once with --archive first.")
+    for what, lov in (("subject", subjects_lov), ("term", terms_lov)):
+        if "scc_lov_resp" not in lov:           # an error payload
+            if get_client().cache_mode == "replay":
+                raise SystemExit(f"❌ Replay miss: the response cache has no {what} list; "
+                                 "run once with --cache on to record it.")
+            raise SystemExit(f"❌ Could not fetch the {what} list: HTTP {lov.get('error')}")
+    subjects = subjects_lov["scc_lov_resp"]["lovs"]["lov"]["values"]["value"]
+    eligible = [s.get("code") for s in subjects if "_" not in s.get("code")]
+
+    # --------------------
+    # Select the terms (or the ones the interrupted run was using)
+    # --------------------
+    all_terms = terms_lov["scc_lov_resp"]["lovs"]["lov"]["values"]["value"]
+    if resuming:
+        term_codes = run["term_codes"].split(",")
+    else:
+        if not all_terms:
+            print("❌ No terms found.")
+            sys.exit(1)
+        term_codes = select_terms(args.terms, all_terms)
+        start_journal(term_codes, args.incremental, eligible, args.shard)
+    names = {t.get("code"): t.get("desc") or t.get("descrlong") or t.get("code")
+             for t in all_terms}
+    insert_many("terms", [{"strm": c, "descr": names.get(c, c)} for c in term_codes])
+    term_name = ", ".join(f"{names.get(c, c)} ({c})" for c in term_codes)
+    print(f"🔖 Scraping {len(term_codes)} term(s): {term_name}")
+
+    if args.incremental:
+        conn = connect_db()
+        marks = ",".join("?" * len(term_codes))
+        sync_state.update(
+            ((cid, strm), (effdt, digest)) for cid, strm, effdt, digest in conn.execute(
+                "SELECT crse_id, strm, effdt, content_hash FROM course_sync "
+                f"WHERE strm IN ({marks})", term_codes)
+        )
+        conn.close()
+        print(f"🔁 Incremental refresh against {len(sync_state)} known course-terms")
+
+    # --------------------
+    # Build DB Content: flush after each subject
+    # --------------------
+    if args.shard:
+        eligible = [code for code in eligible if in_shard(code, args.shard)]
+        print(f"🧩 Shard {args.shard[0]}/{args.shard[1]}: {len(eligible)} subjects → {live}")
+
+    if resuming:
+        courses_seen.update(journaled)
+        subjects_listed.update(code for code, listed in done_subjects.items() if listed)
+        left = [code for code in eligible if code not in done_subjects]
+        print(f"⏯️  Resuming: {len(eligible) - len(left)}/{len(eligible)} subjects done, "
+              f"{len(journaled)} courses journaled, {len(left)} subjects left")
+        if "finished_at" in run:
+            # its staging file is only still here if publishing it failed
+            # (a refused snapshot, a crash): try that again
+            print(f"✅ That build already finished at {run['finished_at']}; publishing it.")
+            publish(staging, live, args.min_ratio, CHECKED_TABLES if eligible else [])
+            return
+    print(f"Starting scrape: {len(eligible)} subjects @ {len(term_codes)} term(s)"
+          + (f" (pipeline: {args.workers} fetchers, {args.parsers} parsers)" if args.pipeline
+             else f" ({args.workers} workers)" if args.workers > 1 else ""))
+
+    global writer
+    writer = BulkWriter(staging)
+    open_buffers()
+    flush_limits.update(rows=args.flush_rows, bytes=int(args.flush_mb * 2**20))
+    pool = (ThreadPoolExecutor(max_workers=args.workers)
+            if args.workers > 1 and not args.pipeline else None)
+    try:
+        # subjects finished before an interruption are skipped
+        todo_codes = [code for code in eligible if code not in done_subjects]
+        if args.pipeline:
+            run_pipeline(todo_codes, term_codes, args.workers, args.parsers, args.incremental)
+        else:
+            for idx, code in enumerate(todo_codes, start=1):
+                print(f"\n[{idx}/{len(todo_codes)}] Subject: {code}")
+                harvest_subject(code, term_codes, pool, incremental=args.incremental)
+                flush(done_subject=code)
+                print(metrics.subject_done(len(todo_codes) - idx))
+
+    except KeyboardInterrupt:
+        # The interrupt may have landed mid-flush, with some tables already
+        # written: roll back to the last commit rather than flush again
+        # (tables without a key would get those rows twice). Everything
+        # committed is journaled, so --resume redoes exactly the rest.
+        print("\nInterrupted! Discarding the unfinished subject...")
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+        writer.rollback()
+        discard_buffers()
+        writer.close()
+        if archive is not None:
+            archive.close()
+        write_metrics(args.metrics_out, "interrupted", term_codes)
+        print("⏯️  Run again with --resume to continue from here.")
+        sys.exit(0)
+
+    if pool:
+        pool.shutdown()
+
+    # final flush
     flush()
-    sys.exit(0)
+    writer.close()
+    if archive is not None:
+        astats = archive.stats()
+        archive.close()
+        if not reparsing:
+            print(f"🗃️  Payload archive: {astats['entries']} entries, "
+                  f"{astats['bytes'] / 1e6:.1f} MB in {archive.path}")
+    if args.incremental:
+        remove_vanished_courses()
+        print(f"🔁 {refresh_counts['new']} new, {refresh_counts['changed']} changed, "
+              f"{refresh_counts['unchanged']} unchanged, {refresh_counts['removed']} removed")
+    finish_journal()
+    print(f"\n✅ Finished scrape: {len(courses_seen)} subjects processed, one each.")
+
+    stats = get_client().connection_stats()
+    print(f"🔌 {stats['requests']} requests over {stats['connections']} connections "
+          f"({stats['reused']} reused)")
+    if get_client().cache is not None:
+        cstats = get_client().cache.stats()
+        print(f"🗄️  Response cache: {cstats['entries']} entries, "
+              f"{cstats['bytes'] / 1e6:.1f} MB")
+    print("📈 API calls:")
+    for line in metrics.report():
+        print(f"   {line}")
+    write_metrics(args.metrics_out, "finished", term_codes)
+
+    # a shard can legitimately own no subjects; it still gets a (checked) DB
+    publish(staging, live, args.min_ratio, CHECKED_TABLES if eligible else [])
 
-# final flush
-flush()
-print(f"\n✅ Finished scrape: {len(courses_seen)} subjects processed, one each.")
+if __name__ == "__main__":
+    main()
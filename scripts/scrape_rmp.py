@@ -1,26 +1,64 @@
 #!/usr/bin/env python3
 """
-Sequantial, single‐browser RateMyProfessors scraper.
-Keeps your machine responsive, resumes on restart,
-and writes each result immediately.
+RateMyProfessors scraper with a pool of headless browsers.
+
+Each worker owns one Chrome and its own queue of names, paces itself
+politely, and recycles its browser every RESTART_EVERY scrapes. Results
+are written as they arrive and the run resumes where it left off.
+
+`--backend http` skips the browser: pages are fetched over a pooled
+keep-alive session and parsed with html.parser into the same record.
+`python -m src.fake_rmp` serves canned pages for offline runs.
+
+    python scripts/scrape_rmp.py --drivers 4
+    python scripts/scrape_rmp.py --backend http --base-url http://127.0.0.1:8002
 """
 
-import os, sys, time, random, sqlite3, logging
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    TimeoutException, NoSuchElementException, WebDriverException
-)
-from webdriver_manager.chrome import ChromeDriverManager
+import os, sys, time, random, sqlite3, logging, argparse, threading, atexit, signal, heapq, datetime
+from collections import deque
+from html.parser import HTMLParser
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import src.db
+from src.parse_api import name_key, professor_id
+from src.migrations import migrate_users
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import (
+        TimeoutException, NoSuchElementException, WebDriverException
+    )
+    from webdriver_manager.chrome import ChromeDriverManager
+    BROWSER_ERRORS = (TimeoutException, WebDriverException, NoSuchElementException)
+except ImportError:         # the HTTP backend and DB helpers work without a browser stack
+    webdriver = None
+    BROWSER_ERRORS = ()
+
+class ProfessorNotFound(LookupError):
+    """The search page had no professor link for this name."""
+
+# a failed scrape is logged and skipped; anything else stops the worker
+SCRAPE_ERRORS = (*BROWSER_ERRORS, requests.RequestException, ProfessorNotFound)
 
 # ─── CONFIG ─────────────────────────────────────────────────────────────────────
 DUKE_SCHOOL_ID = "1350"
-DB_PATH        = os.path.join(os.path.dirname(__file__), "..", "courses.db")
-RESTART_EVERY  = 200        # restart browser after this many scrapes
-MIN_DELAY      = 1.0        # seconds
+RMP_BASE_URL   = os.getenv("RMP_BASE_URL", "https://www.ratemyprofessors.com")
+DB_PATH        = src.db.DB_FILE   # the catalog DB the app reads (data/courses.db)
+USERS_DB_PATH  = None       # ratings go here (None: users.db next to DB_PATH)
+POOL_SIZE      = 4          # concurrent browsers
+RESTART_EVERY  = 200        # restart a worker's browser after this many scrapes
+MAX_AGE_DAYS   = 30         # --refresh re-scrapes ratings older than this
+BATCH_SIZE     = 50         # commit ratings after this many records…
+BATCH_SECS     = 30.0       # …or this many seconds, whichever comes first
+MIN_DELAY      = 1.0        # seconds between one worker's requests
 MAX_DELAY      = 3.0        # seconds
 LOG_LEVEL      = logging.INFO
 
@@ -32,28 +70,41 @@ logging.basicConfig(
 )
 
 # ─── DB UTILITIES ───────────────────────────────────────────────────────────────
+def users_db_path():
+    return USERS_DB_PATH or src.db.users_db_file(DB_PATH)
+
 def connect_db():
-    return sqlite3.connect(DB_PATH)
+    """The user database (ratings) with the catalog attached read-only."""
+    conn = sqlite3.connect(users_db_path(), timeout=30)
+    src.db.attach_catalog(conn, DB_PATH)
+    return conn
+
+# workers share the DB file; one writer at a time keeps SQLite from locking
+_write_lock = threading.Lock()
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
 
 def init_db():
-    """Ensure professor_ratings table exists."""
-    with connect_db() as conn:
-        conn.execute("""
-          CREATE TABLE IF NOT EXISTS professor_ratings (
-            professor            TEXT PRIMARY KEY,
-            avg_rating           REAL,
-            avg_difficulty       REAL,
-            would_take_again_pct REAL,
-            tags                 TEXT
-          );
-        """)
-        conn.commit()
+    """Bring the user database up to date: professor_ratings exists, ratings
+    still kept in an old catalog are copied over and linked to professor ids."""
+    migrate_users(users_db_path(), DB_PATH)
 
 def get_all_professors():
-    """Fetch all distinct instructor names from instructors table."""
-    with connect_db() as conn:
-        cur = conn.execute("SELECT DISTINCT name_display FROM instructors")
-        return [r[0] for r in cur.fetchall() if r[0]]
+    """Yield every professor's display name (one per person) from professors,
+    streamed rather than loaded, so a big catalog costs no extra memory."""
+    conn = connect_db()
+    try:
+        if conn.execute("SELECT 1 FROM catalog.sqlite_master WHERE name='professors'").fetchone() is None:
+            # catalog built before professor ids; the next build adds them
+            sql = "SELECT DISTINCT name_display FROM instructors ORDER BY name_display"
+        else:
+            sql = "SELECT name_display FROM professors ORDER BY professor_id"
+        for (name,) in src.db.stream(sql, conn=conn):
+            if name:
+                yield name
+    finally:
+        conn.close()
 
 def get_scraped_professors():
     """Fetch the set of professor names already in professor_ratings."""
@@ -61,25 +112,179 @@ def get_scraped_professors():
         cur = conn.execute("SELECT professor FROM professor_ratings")
         return {r[0] for r in cur.fetchall()}
 
+RATING_FIELDS = ("professor", "avg_rating", "avg_difficulty", "would_take_again_pct", "tags")
+SAVE_SQL = f"""
+  INSERT OR REPLACE INTO professor_ratings ({', '.join(RATING_FIELDS)}, scraped_at, professor_id)
+  VALUES ({', '.join('?' * len(RATING_FIELDS))}, ?, ?)
+"""
+
+def _save_params(record):
+    key = name_key(record["professor"])
+    return (*(record[f] for f in RATING_FIELDS), _now(), professor_id(key) if key else None)
+
 def save_rating(record):
     """Insert or replace one professor record."""
-    with connect_db() as conn:
-        conn.execute("""
-          INSERT OR REPLACE INTO professor_ratings
-            (professor, avg_rating, avg_difficulty, would_take_again_pct, tags)
-          VALUES (?, ?, ?, ?, ?)
-        """, (
-            record["professor"],
-            record["avg_rating"],
-            record["avg_difficulty"],
-            record["would_take_again_pct"],
-            record["tags"]
-        ))
+    with _write_lock, connect_db() as conn:
+        conn.execute(SAVE_SQL, _save_params(record))
         conn.commit()
 
+class RatingWriter:
+    """
+    Buffers scraped records and writes them in one transaction every
+    *batch* records or *secs* seconds, on a single connection, so the app's
+    readers see a short write lock now and then instead of one per
+    professor. close() (also run at exit) writes what is left; a crash
+    loses at most one batch, which the next run re-scrapes.
+    """
+
+    def __init__(self, batch=BATCH_SIZE, secs=BATCH_SECS):
+        self.batch, self.secs = batch, secs
+        self.conn = sqlite3.connect(users_db_path(), timeout=30, check_same_thread=False)
+        self.pending = []
+        self.written = self.commits = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._last = time.monotonic()
+        self._timer = threading.Thread(target=self._tick, name="rmp-writer", daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    def save(self, record):
+        with self._lock:
+            self.pending.append(_save_params(record))
+            if len(self.pending) >= self.batch:
+                self._flush()
+
+    def _tick(self):
+        # time-based flush, so a slow trickle of records still lands
+        while not self._closed.wait(min(self.secs, 1.0)):
+            with self._lock:
+                if self.pending and time.monotonic() - self._last >= self.secs:
+                    self._flush()
+
+    def _flush(self):
+        if self.pending:
+            with self.conn:
+                self.conn.executemany(SAVE_SQL, self.pending)
+            self.written += len(self.pending)
+            self.commits += 1
+            self.pending.clear()
+        self._last = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+        self.conn.close()
+        atexit.unregister(self.close)
+
+# ─── REFRESH SCHEDULING ───────────────────────────────────────────────────────
+def current_term_sections(conn):
+    """name_display → sections taught in the newest term in the catalog."""
+    try:
+        return dict(conn.execute("""
+          SELECT name_display, COUNT(DISTINCT class_id || '/' || class_section)
+          FROM instructors
+          WHERE strm = (SELECT MAX(strm) FROM class_listings)
+          GROUP BY name_display
+        """).fetchall())
+    except sqlite3.OperationalError:        # catalog without per-term rows
+        return {}
+
+def schedule(refresh=False, max_age_days=MAX_AGE_DAYS, now=None):
+    """
+    Names to scrape, most urgent first.
+
+    Never-scraped professors always come first. With *refresh*, ratings
+    older than *max_age_days* follow, ordered by age (days) weighted by
+    1 + the sections the professor teaches this term, so busy instructors
+    with old ratings go before idle ones. Ratings with no scraped_at count
+    as the oldest.
+
+    Returns:
+      (names, counts) where counts has "new" and "stale" totals.
+    """
+    now = now or datetime.datetime.now()
+    with connect_db() as conn:
+        sections = current_term_sections(conn)
+        scraped = dict(conn.execute("SELECT professor, scraped_at FROM professor_ratings"))
+    heap = []
+    new = stale = 0
+    for name in get_all_professors():
+        weight = 1 + sections.get(name, 0)
+        if name not in scraped:
+            new += 1
+            heapq.heappush(heap, (0, -weight, name))
+            continue
+        if not refresh:
+            continue
+        at = scraped[name]
+        age = (now - datetime.datetime.fromisoformat(at)).total_seconds() / 86400 if at else float("inf")
+        if age >= max_age_days:
+            stale += 1
+            heapq.heappush(heap, (1, -age * weight, name))
+    names = [heapq.heappop(heap)[2] for _ in range(len(heap))]
+    return names, {"new": new, "stale": stale}
+
+# ─── RECORDS ──────────────────────────────────────────────────────────────────
+def search_url(name):
+    return f"{RMP_BASE_URL}/search/professors/{DUKE_SCHOOL_ID}?q={quote(name)}"
+
+def _number(text, strip=""):
+    try:
+        return float(text.strip(strip)) if text else None
+    except ValueError:      # "N/A" and friends
+        return None
+
+def make_record(name, raw_rating, feedback, tags):
+    """
+    Normalise scraped text into a professor_ratings record.
+
+    Args:
+      raw_rating: Text of the overall rating, e.g. "4.2".
+      feedback:   (description, number) pairs from the feedback boxes,
+                  e.g. ("Level of Difficulty", "3.1"), ("Would take again", "85%").
+      tags:       Tag texts.
+    """
+    diff = wta = None
+    for desc, num in feedback:
+        if desc and num:
+            d = desc.lower()
+            if "difficulty" in d:
+                diff = num
+            elif "would take again" in d:
+                wta = num
+    return {
+        "professor":            name,
+        "avg_rating":           _number(raw_rating),
+        "avg_difficulty":       _number(diff),
+        "would_take_again_pct": _number(wta, "%"),
+        "tags":                 ", ".join(tags) or None,
+    }
+
 # ─── SELENIUM SCRAPERS ─────────────────────────────────────────────────────────
+_chromedriver = None
+_chromedriver_lock = threading.Lock()
+
+def chromedriver_path():
+    """Resolve (downloading if needed) chromedriver once for all workers."""
+    global _chromedriver
+    with _chromedriver_lock:
+        if _chromedriver is None:
+            _chromedriver = ChromeDriverManager().install()
+        return _chromedriver
+
 def init_driver():
-    """Start a single headless Chrome with images/stylesheets/fonts disabled."""
+    """Start a headless Chrome with images/stylesheets/fonts disabled."""
+    if webdriver is None:
+        sys.exit("selenium and webdriver-manager are needed to scrape: "
+                 "pip install selenium webdriver-manager")
     opts = webdriver.ChromeOptions()
     opts.add_argument("--headless")
     opts.add_argument("--disable-gpu")
@@ -91,7 +296,7 @@ def init_driver():
     }
     opts.add_experimental_option("prefs", prefs)
     driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
+        service=Service(chromedriver_path()),
         options=opts
     )
     driver.set_page_load_timeout(15)
@@ -107,8 +312,7 @@ def get_text(elem, css):
 
 def scrape_professor(driver, name):
     """Navigate to search → click first result → extract ratings & tags."""
-    url = f"https://www.ratemyprofessors.com/search/professors/{DUKE_SCHOOL_ID}?q={name.replace(' ','%20')}"
-    driver.get(url)
+    driver.get(search_url(name))
 
     # 1) find and click first professor link
     first = WebDriverWait(driver, 7).until(
@@ -123,83 +327,319 @@ def scrape_professor(driver, name):
     raw_rating = get_text(driver, "div[class*='RatingValue__Numerator']")
 
     # 4) extract difficulty + would-take-again
-    diff = wta = None
-    for fb in driver.find_elements(By.CSS_SELECTOR, "div[class*='FeedbackItem__StyledFeedbackItem']"):
-        desc = get_text(fb, "div[class*='FeedbackItem__FeedbackDescription']")
-        num  = get_text(fb, "div[class*='FeedbackItem__FeedbackNumber']")
-        if desc and num:
-            d = desc.lower()
-            if "difficulty" in d:
-                diff = num
-            elif "would take again" in d:
-                wta = num
+    feedback = [
+        (get_text(fb, "div[class*='FeedbackItem__FeedbackDescription']"),
+         get_text(fb, "div[class*='FeedbackItem__FeedbackNumber']"))
+        for fb in driver.find_elements(By.CSS_SELECTOR, "div[class*='FeedbackItem__StyledFeedbackItem']")
+    ]
 
     # 5) extract tags
     tag_elems = driver.find_elements(
         By.CSS_SELECTOR,
         "div[class*='TeacherTags__TagsContainer'] span.Tag-bs9vf4-0"
     )
-    tags = ", ".join(t.get_attribute("textContent").strip() for t in tag_elems) or None
+    tags = [t.get_attribute("textContent").strip() for t in tag_elems]
 
     # 6) normalize numeric fields
-    try:
-        avg_rating = float(raw_rating) if raw_rating else None
-    except ValueError:
-        avg_rating = None
-    try:
-        avg_diff   = float(diff) if diff else None
-    except ValueError:
-        avg_diff = None
-    try:
-        wta_pct    = float(wta.strip("%")) if wta else None
-    except ValueError:
-        wta_pct = None
+    return make_record(name, raw_rating, feedback, tags)
 
-    return {
-        "professor":            name,
-        "avg_rating":           avg_rating,
-        "avg_difficulty":       avg_diff,
-        "would_take_again_pct": wta_pct,
-        "tags":                 tags,
-    }
+# ─── HTTP SCRAPERS ────────────────────────────────────────────────────────────
+class _Element:
+    __slots__ = ("tag", "attrs", "children")
 
-# ─── MAIN LOOP ────────────────────────────────────────────────────────────────
-def main():
-    init_db()
-    all_names = get_all_professors()
-    done      = get_scraped_professors()
-    pending   = [n for n in all_names if n not in done]
-    total     = len(pending)
+    def __init__(self, tag, attrs):
+        self.tag, self.attrs, self.children = tag, attrs, []
+
+    def has_class(self, fragment):
+        return fragment in (self.attrs.get("class") or "")
+
+    def text(self):
+        return "".join(c if isinstance(c, str) else c.text() for c in self.children).strip()
+
+    def find_all(self, tag, class_fragment=""):
+        """Descendants with *tag* whose class contains *class_fragment* (document order)."""
+        found = []
+        for c in self.children:
+            if isinstance(c, _Element):
+                if c.tag == tag and c.has_class(class_fragment):
+                    found.append(c)
+                found.extend(c.find_all(tag, class_fragment))
+        return found
+
+    def find(self, tag, class_fragment=""):
+        hits = self.find_all(tag, class_fragment)
+        return hits[0] if hits else None
+
+class _PageParser(HTMLParser):
+    """Just enough of a DOM to run the scraper's selectors on static HTML."""
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+            "link", "meta", "source", "track", "wbr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Element("#document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        el = _Element(tag, dict(attrs))
+        self.stack[-1].children.append(el)
+        if tag not in self.VOID:
+            self.stack.append(el)
+
+    def handle_endtag(self, tag):
+        # tolerate unclosed tags: pop back to the matching open element
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                break
 
-    logging.info(f"{len(done)} already scraped; {total} to go.")
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
 
-    driver = init_driver()
-    count = 0
+def parse_page(html):
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser.root
 
-    for idx, name in enumerate(pending, 1):
+def parse_professor_page(name, html):
+    """Extract a record from professor-page HTML (same selectors as Chrome)."""
+    page = parse_page(html)
+    rating = page.find("div", "RatingValue__Numerator")
+    feedback = []
+    for fb in page.find_all("div", "FeedbackItem__StyledFeedbackItem"):
+        desc = fb.find("div", "FeedbackItem__FeedbackDescription")
+        num = fb.find("div", "FeedbackItem__FeedbackNumber")
+        feedback.append((desc and desc.text(), num and num.text()))
+    tags = [t.text() for box in page.find_all("div", "TeacherTags__TagsContainer")
+            for t in box.find_all("span", "Tag-bs9vf4-0")]
+    return make_record(name, rating and rating.text(), feedback, tags)
+
+class HttpDriver:
+    """A keep-alive session standing in for a browser: one per pool worker."""
+
+    def __init__(self, timeout=15):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.headers.update({
+            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                          "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+            "Accept": "text/html,application/xhtml+xml",
+        })
+
+    def get(self, url):
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.text
+
+    def quit(self):
+        self.session.close()
+
+def init_http_driver():
+    return HttpDriver()
+
+def scrape_professor_http(driver, name):
+    """Search → follow first professor link → parse the page, no browser."""
+    first = next((a.attrs["href"] for a in parse_page(driver.get(search_url(name))).find_all("a")
+                  if (a.attrs.get("href") or "").startswith("/professor/")), None)
+    if first is None:
+        raise ProfessorNotFound(name)
+    return parse_professor_page(name, driver.get(RMP_BASE_URL + first))
+
+def backend(name):
+    """(make_driver, scrape) for --backend *name*."""
+    if name == "http":
+        return init_http_driver, scrape_professor_http
+    return init_driver, scrape_professor
+
+# ─── BROWSER POOL ─────────────────────────────────────────────────────────────
+def split_work(names, n):
+    """Deal *names* round-robin into *n* per-worker queues."""
+    return [deque(names[i::n]) for i in range(n)]
+
+class ScrapePool:
+    """
+    N workers, each with its own browser and queue of names.
+
+    Names are dealt round-robin, so if they arrive most urgent first each
+    worker also works most-urgent first. A worker that runs out of names
+    takes the next one from the longest other queue, so the run ends
+    together instead of waiting on one slow browser. Each worker sleeps
+    MIN_DELAY–MAX_DELAY between its own requests, so the pool as a whole
+    makes about N requests per delay.
+
+    Args:
+      names:       Professors to scrape.
+      drivers:     Pool size.
+      make_driver: Callable returning a new driver (default: headless Chrome).
+      scrape:      Callable (driver, name) -> record dict.
+      save:        Callable (record) -> None (default: a RatingWriter of the
+                   pool's own, closed when run() returns).
+      budget:      Seconds after which no new scrape is started (None: no limit).
+    """
+
+    def __init__(self, names, drivers=POOL_SIZE, make_driver=None, scrape=None, save=None,
+                 budget=None):
+        self.drivers = max(1, min(drivers, len(names) or 1))
+        self.queues = split_work(list(names), self.drivers)
+        self.total = len(names)
+        self.make_driver = make_driver or init_driver
+        self.scrape = scrape or scrape_professor
+        self.save = save                 # None: run() batches through a RatingWriter
+        self.stop = threading.Event()
+        self._lock = threading.Lock()
+        self.done = self.skipped = self.restarts = 0
+        self.deadline = time.monotonic() + budget if budget else None
+
+    def _next(self, wid):
+        if self.deadline and time.monotonic() >= self.deadline:
+            return None
+        with self._lock:
+            own = self.queues[wid]
+            if own:
+                return own.popleft()
+            victim = max(self.queues, key=len)
+            return victim.popleft() if victim else None
+
+    @property
+    def left(self):
+        with self._lock:
+            return sum(len(q) for q in self.queues)
+
+    def _pause(self):
+        self.stop.wait(random.uniform(MIN_DELAY, MAX_DELAY))
+
+    def _worker(self, wid):
+        # stagger start-up so the workers' requests don't arrive in lockstep
+        self.stop.wait(wid * MIN_DELAY / self.drivers)
+        driver = self.make_driver()
+        count = 0
         try:
-            record = scrape_professor(driver, name)
-        except (TimeoutException, WebDriverException, NoSuchElementException) as e:
-            logging.warning(f"[{idx}/{total}] {name} → SKIPPED ({e.__class__.__name__})")
-            # small back-off on failure
-            time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))
-            continue
+            while not self.stop.is_set():
+                name = self._next(wid)
+                if name is None:
+                    break
+                try:
+                    record = self.scrape(driver, name)
+                except SCRAPE_ERRORS as e:
+                    with self._lock:
+                        self.skipped += 1
+                        idx = self.done + self.skipped
+                    logging.warning(f"[{idx}/{self.total}] w{wid} {name} → SKIPPED ({e.__class__.__name__})")
+                    self._pause()
+                    continue
 
-        save_rating(record)
-        count += 1
-        logging.info(f"[{idx}/{total}] {name} → {record['avg_rating']} ⭐")
+                self.save(record)
+                count += 1
+                with self._lock:
+                    self.done += 1
+                    idx = self.done + self.skipped
+                logging.info(f"[{idx}/{self.total}] w{wid} {name} → {record['avg_rating']} ⭐")
 
-        # polite, randomized pause
-        time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))
+                self._pause()
 
-        # every RESTART_EVERY scrapes, restart the browser to clear memory
-        if count and count % RESTART_EVERY == 0:
-            logging.info(f"⟳ Restarting browser after {count} scrapes")
+                # every RESTART_EVERY scrapes, restart the browser to clear memory
+                if count % RESTART_EVERY == 0 and not self.stop.is_set():
+                    logging.info(f"⟳ w{wid} restarting browser after {count} scrapes")
+                    driver.quit()
+                    driver = self.make_driver()
+                    with self._lock:
+                        self.restarts += 1
+        finally:
             driver.quit()
-            driver = init_driver()
 
-    driver.quit()
-    logging.info("✅ All done.")
+    def run(self):
+        """Scrape everything (or until Ctrl-C); returns the number saved."""
+        if not self.total:
+            return 0
+        own_writer = RatingWriter() if self.save is None else None
+        if own_writer is not None:
+            self.save = own_writer.save
+        threads = [threading.Thread(target=self._worker, args=(w,), name=f"rmp-{w}", daemon=True)
+                   for w in range(self.drivers)]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            logging.info("⏹️  Stopping workers after their current scrape…")
+            self.stop.set()
+            for t in threads:
+                t.join()
+        finally:
+            if own_writer is not None:
+                own_writer.close()
+                self.save = None
+        return self.done
+
+# ─── MAIN LOOP ────────────────────────────────────────────────────────────────
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Scrape RateMyProfessors ratings for catalog instructors.")
+    ap.add_argument("--drivers", type=int, default=POOL_SIZE,
+                    help=f"concurrent headless browsers (default: {POOL_SIZE})")
+    ap.add_argument("--backend", choices=("chrome", "http"), default="chrome",
+                    help="chrome = headless browser; http = plain requests, no browser")
+    ap.add_argument("--base-url", default=None,
+                    help="RateMyProfessors root (default: $RMP_BASE_URL or the real site)")
+    ap.add_argument("--refresh", action="store_true",
+                    help="also re-scrape ratings older than --max-age, stalest and "
+                         "busiest (most sections this term) first")
+    ap.add_argument("--max-age", type=float, default=MAX_AGE_DAYS,
+                    help=f"days before a rating is due for refresh (default: {MAX_AGE_DAYS})")
+    ap.add_argument("--budget", type=float, default=None,
+                    help="stop starting new scrapes after this many minutes")
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE,
+                    help=f"commit after this many ratings (default: {BATCH_SIZE})")
+    ap.add_argument("--batch-secs", type=float, default=BATCH_SECS,
+                    help=f"…or after this many seconds (default: {BATCH_SECS:g})")
+    ap.add_argument("--db", default=None, help="catalog to read instructors from "
+                                                "(default: data/courses.db)")
+    ap.add_argument("--users-db", default=None, help="database to write ratings to "
+                                                      "(default: users.db next to the catalog)")
+    return ap.parse_args(argv)
+
+def _interrupt(signum, frame):
+    # SIGTERM (e.g. from a process manager) stops the pool like Ctrl-C
+    raise KeyboardInterrupt
+
+def main(argv=None):
+    global DB_PATH, USERS_DB_PATH, RMP_BASE_URL
+    args = parse_args(argv)
+    if args.db:
+        DB_PATH = args.db
+    if args.users_db:
+        USERS_DB_PATH = args.users_db
+    if args.base_url:
+        RMP_BASE_URL = args.base_url.rstrip("/")
+    init_db()
+    done           = get_scraped_professors()
+    pending, count = schedule(args.refresh, args.max_age)
+
+    make_driver, scrape = backend(args.backend)
+    writer = RatingWriter(args.batch, args.batch_secs)
+    pool = ScrapePool(pending, args.drivers, make_driver=make_driver, scrape=scrape, save=writer.save,
+                      budget=args.budget * 60 if args.budget else None)
+    logging.info(f"{len(done)} already scraped; {count['new']} new"
+                 + (f" + {count['stale']} stale" if args.refresh else "")
+                 + f" to go on {pool.drivers} {args.backend} workers.")
+    on_main = threading.current_thread() is threading.main_thread()
+    previous = signal.signal(signal.SIGTERM, _interrupt) if on_main else None
+    start = time.perf_counter()
+    try:
+        saved = pool.run()
+    finally:
+        writer.close()
+        if on_main:
+            signal.signal(signal.SIGTERM, previous)
+    elapsed = time.perf_counter() - start
+    rate = saved / elapsed * 60 if elapsed else 0.0
+    logging.info(f"✅ Saved {saved}, skipped {pool.skipped} in {elapsed:.0f}s ({rate:.1f}/min), "
+                 f"{writer.commits} commits."
+                 + (f" {pool.left} left for the next run." if pool.left else ""))
 
 if __name__ == "__main__":
     main()
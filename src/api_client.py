@@ -1,74 +1,470 @@
 # src/api_client.py
 
 import requests
-from config.settings import BASE_URL, API_KEY
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
+from config.settings import (
+    BASE_URL, API_KEY, API_TIMEOUT, API_RETRIES, API_BACKOFF,
+    API_CACHE_MODE, API_CACHE_PATH, API_CACHE_MAX_MB, API_ARCHIVE_PATH,
+)
+import os
 import time
+import threading
+import hashlib
+import json
+import sqlite3
+import zlib
+from urllib.parse import urlsplit, urlencode, quote
+from src import telemetry
+
+
+class RequestBudget:
+    """
+    Per-host token bucket shared by every thread that talks to the API.
+
+    Args:
+      rate:  Sustained requests per second allowed against one host.
+      burst: How many requests may go out back-to-back before throttling
+             kicks in (defaults to one second's worth of `rate`).
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst if burst is not None else rate))
+        self._lock = threading.Lock()
+        self._buckets = {}          # host -> (tokens, last_refill)
+
+    def acquire(self, url: str) -> None:
+        """Block until a request to *url*'s host fits in the budget."""
+        host = urlsplit(url).netloc
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+# How long a cached payload stays fresh, by endpoint prefix (seconds).
+# The longest matching prefix wins.
+CACHE_TTLS = {
+    "/list_of_values":  7 * 24 * 3600,     # terms / subjects / careers barely move
+    "/courses/subject":      24 * 3600,
+    "/courses/crse_id":      24 * 3600,
+    "/classes":           6 * 3600,        # sections, rooms, instructors
+    "/synopsis":             24 * 3600,
+}
+DEFAULT_CACHE_TTL = 24 * 3600
+CACHE_MODES = ("off", "on", "replay")
+
+class ResponseCache:
+    """
+    Persistent store of successful API responses, kept in its own SQLite file.
+
+    Entries are keyed by the API's scheme, host and root plus the endpoint
+    path and query parameters, with the access token stripped: rotating the
+    token never invalidates the cache, and a client pointed at another API
+    (e.g. src.fake_api) never gets the real API's payloads. Bodies are
+    zlib-compressed; once the total exceeds `max_bytes` the least recently
+    used entries are evicted.
+
+    Args:
+      path:      SQLite file to keep the cache in.
+      max_bytes: Size cap for stored (compressed) bodies.
+      ttls:      {path_prefix: seconds} freshness per endpoint.
+    """
+
+    def __init__(self, path: str = API_CACHE_PATH,
+                 max_bytes: int = int(API_CACHE_MAX_MB * 1024 * 1024),
+                 ttls: dict[str, int] | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+          CREATE TABLE IF NOT EXISTS responses (
+            key          TEXT PRIMARY KEY,
+            path         TEXT NOT NULL,
+            body         BLOB NOT NULL,
+            size         INTEGER NOT NULL,
+            fetched_at   REAL NOT NULL,
+            last_access  REAL NOT NULL
+          )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(path: str, params: dict | None = None, base_url: str = "") -> str:
+        """Cache key for *base_url* + *path* + *params*, ignoring the access token."""
+        root = urlsplit(base_url)
+        items = sorted((k, str(v)) for k, v in (params or {}).items()
+                       if k != "access_token")
+        raw = f"{root.scheme.lower()}://{root.netloc.lower()}{root.path.rstrip('/')}{path}"
+        if items:
+            raw += f"?{urlencode(items)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def ttl_for(self, path: str) -> int:
+        matches = [p for p in self.ttls if path.startswith(p)]
+        return self.ttls[max(matches, key=len)] if matches else DEFAULT_CACHE_TTL
+
+    def get(self, path: str, params: dict | None = None,
+            ignore_ttl: bool = False, base_url: str = "") -> bytes | None:
+        """Return the cached body, or None if missing (or stale)."""
+        key = self.key(path, params, base_url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, fetched_at FROM responses WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not ignore_ttl and now - row[1] > self.ttl_for(path):
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access=? WHERE key=?", (now, key))
+            self._conn.commit()
+        return zlib.decompress(row[0])
+
+    def put(self, path: str, params: dict | None, body: bytes,
+            base_url: str = "") -> None:
+        """Store *body* for *base_url* + *path* + *params*, evicting LRU entries if over the cap."""
+        key = self.key(path, params, base_url)
+        blob = zlib.compress(body)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key=?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, path, blob, len(blob), now, now))
+            self._total += len(blob) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes:
+            victims = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                self._conn.execute("DELETE FROM responses WHERE key=?", (key,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            n = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": n, "bytes": self._total, "max_bytes": self.max_bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total = 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class PayloadArchive:
+    """
+    Every raw payload a catalog build fetched, kept in its own SQLite file so
+    the derived tables can be rebuilt (create_db.py --reparse) without the API.
+
+    Entries are keyed by (endpoint, key, strm) - e.g. ("classes", crse_id,
+    term) - and hold the zlib-compressed JSON.  Unlike ResponseCache there is
+    no TTL or size cap: an entry changes only when it is fetched again.
+
+    Args:
+      path:     SQLite file to keep the archive in.
+      readonly: Open for reading only (reparse).
+    """
+
+    COMMIT_EVERY = 256
+
+    def __init__(self, path: str = API_ARCHIVE_PATH, readonly: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = 0
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True,
+                                         check_same_thread=False)
+            return
+        # shards on one machine may share an archive, hence the busy timeout
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+          CREATE TABLE IF NOT EXISTS payloads (
+            endpoint    TEXT NOT NULL,
+            key         TEXT NOT NULL,
+            strm        TEXT NOT NULL DEFAULT '',
+            body        BLOB NOT NULL,
+            fetched_at  REAL NOT NULL,
+            PRIMARY KEY (endpoint, key, strm)
+          ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def put(self, endpoint: str, key: str, strm: str, payload) -> None:
+        """Store *payload* (any JSON value), replacing an older copy."""
+        blob = zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO payloads VALUES (?, ?, ?, ?, ?)",
+                (endpoint, key, strm or "", blob, time.time()))
+            self._pending += 1
+            if self._pending >= self.COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def get(self, endpoint: str, key: str, strm: str = ""):
+        """The archived payload, or None if it was never fetched."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM payloads WHERE endpoint=? AND key=? AND strm=?",
+                (endpoint, key, strm or "")).fetchone()
+        return None if row is None else json.loads(zlib.decompress(row[0]))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            n, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM payloads").fetchone()
+        return {"entries": n, "bytes": size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def _cached_response(url: str, body: bytes, status: int = 200,
+                     reason: str = "OK") -> requests.Response:
+    """Wrap a cached body in a Response so callers can't tell the difference."""
+    resp = requests.Response()
+    resp.status_code = status
+    resp.reason = reason
+    resp.url = url
+    resp.encoding = "utf-8"
+    resp.headers["Content-Type"] = "application/json"
+    resp.headers["X-Cache"] = "HIT" if status == 200 else "MISS"
+    resp._content = body
+    return resp
+
+
+# Statuses worth retrying: rate limiting plus transient upstream failures.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_MAX = 120                   # seconds; longest backoff sleep (as urllib3)
+
+class ApiClient:
+    """
+    One keep-alive `requests.Session` for every call to the curriculum API.
+
+    Connections are pooled per host, every request gets the same
+    (connect, read) timeout, and 429/5xx responses and connection errors
+    are retried with exponential backoff (honouring `Retry-After` when the
+    server sends it). Retries happen here rather than inside urllib3, so
+    each one waits for the request budget like any other request: the
+    rate cap holds exactly when the server is pushing back.
+
+    Args:
+      base_url:  API root that endpoint paths are appended to.
+      token:     Value sent as the `access_token` query parameter.
+      pool_size: Keep-alive connections held per host; size this to at
+                 least the number of threads sharing the client.
+      timeout:   (connect, read) seconds applied to every request.
+      retries:   Attempts after the first before giving up.
+      backoff:   Backoff factor: sleeps are backoff * 2**(attempt - 1).
+      cache:     Optional ResponseCache consulted before the network.
+      cache_mode: "on" (read/write-through) or "replay" (cache only;
+                 misses return a 504 without touching the network).
+    """
+
+    def __init__(self, base_url: str = BASE_URL, token: str | None = API_KEY,
+                 pool_size: int = 10, timeout=API_TIMEOUT,
+                 retries: int = API_RETRIES, backoff: float = API_BACKOFF,
+                 cache: ResponseCache | None = None, cache_mode: str = "on"):
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"cache_mode must be one of {CACHE_MODES}, got {cache_mode!r}")
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = None
+        self.cache = cache if cache_mode != "off" else None
+        self.cache_mode = cache_mode
+        # no retries in the adapter: get() does them, through the budget
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, path: str, **params) -> requests.Response:
+        """GET `base_url + path` with the access token and default timeout."""
+        url = f"{self.base_url}{path}"
+        if self.cache is not None:
+            replay = self.cache_mode == "replay"
+            body = self.cache.get(path, params, ignore_ttl=replay, base_url=self.base_url)
+            if body is not None:
+                telemetry.record_call(path, 0.0, len(body), 200, cached=True)
+                return _cached_response(url, body)
+            if replay:
+                telemetry.record_call(path, 0.0, 0, 504, cached=True)
+                return _cached_response(url, b'{"error": "not cached"}',
+                                        status=504, reason="Not Cached")
+
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if self.budget is not None:
+                self.budget.acquire(url)
+            try:
+                resp = self.session.get(url, params={"access_token": self.token, **params},
+                                        timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    telemetry.record_call(path, time.perf_counter() - started, 0, None, retries=attempt)
+                    raise
+                time.sleep(self._backoff(attempt + 1))
+                continue
+            except requests.RequestException:
+                telemetry.record_call(path, time.perf_counter() - started, 0, None, retries=attempt)
+                raise
+            if resp.status_code not in RETRY_STATUSES or attempt == self.retries:
+                break
+            resp.content                    # read it, so the connection goes back to the pool
+            time.sleep(self._backoff(attempt + 1, resp.headers.get("Retry-After")))
+        telemetry.record_call(path, time.perf_counter() - started, len(resp.content),
+                              resp.status_code, retries=attempt)
+        if self.cache is not None and resp.status_code == 200:
+            self.cache.put(path, params, resp.content, base_url=self.base_url)
+        return resp
+
+    def _backoff(self, retry: int, retry_after: str | None = None) -> float:
+        """Seconds to wait before retry number *retry* (1-based)."""
+        if retry_after is not None:
+            try:
+                return Retry(0).parse_retry_after(retry_after)
+            except InvalidHeader:        # malformed: fall back to backoff
+                pass
+        return min(BACKOFF_MAX, self.backoff * 2 ** (retry - 1))
+
+    def connection_stats(self) -> dict[str, int]:
+        """
+        Requests sent vs. TCP connections opened across all pooled hosts.
+
+        Returns:
+          {"requests": n, "connections": n, "reused": n} where `reused`
+          counts requests that went out over an already-open connection.
+        """
+        reqs = conns = 0
+        for adapter in {id(a): a for a in self.session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                reqs += pool.num_requests
+                conns += pool.num_connections
+        return {"requests": reqs, "connections": conns, "reused": max(0, reqs - conns)}
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client = ApiClient(
+    cache=ResponseCache() if API_CACHE_MODE != "off" else None,
+    cache_mode=API_CACHE_MODE,
+)
+
+def get_client() -> ApiClient:
+    """The shared client every get_* function routes through."""
+    return _client
+
+def configure_client(**kwargs) -> ApiClient:
+    """
+    Replace the shared client (e.g. to size the pool for N worker threads).
+    Keyword arguments are passed to ApiClient; the request budget and
+    response cache carry over unless overridden.
+    """
+    global _client
+    kwargs.setdefault("cache", _client.cache)
+    kwargs.setdefault("cache_mode", _client.cache_mode)
+    budget = _client.budget
+    _client.close()
+    _client = ApiClient(**kwargs)
+    _client.budget = budget
+    return _client
+
+def set_cache_mode(mode: str, path: str | None = None) -> None:
+    """
+    Switch the shared client's response cache: "off", "on" or "replay".
+    Opens the cache at *path* (default: settings.API_CACHE_PATH) if needed.
+    """
+    if mode not in CACHE_MODES:
+        raise ValueError(f"cache mode must be one of {CACHE_MODES}, got {mode!r}")
+    if mode == "off":
+        _client.cache = None
+    elif _client.cache is None or (path and path != _client.cache.path):
+        _client.cache = ResponseCache(path or API_CACHE_PATH)
+    _client.cache_mode = mode
+
+def set_request_budget(rate: float | None, burst: int | None = None) -> None:
+    """Cap requests/second per host for every get_* call (None = unlimited)."""
+    _client.budget = RequestBudget(rate, burst) if rate else None
 
 
 def get_all_acad_car():
-    url = f"{BASE_URL}/list_of_values/fieldname/ACAD_CAREER"
-    params = {"access_token": API_KEY}
-    response = requests.get(url, params=params)
-   
-    #print("Status code:", response.status_code)   # Debug line
-    #print("Raw response text:", response.text)    # Debug line
-   
+    response = _client.get("/list_of_values/fieldname/ACAD_CAREER")
+
     if response.ok:
         return response.json()
     else:
         return {"error": response.status_code, "message": response.text}
 
 def get_all_terms():
-    url = f"{BASE_URL}/list_of_values/fieldname/STRM"
-    params = {"access_token": API_KEY}
-    response = requests.get(url, params=params)
-   
-    #print("Status code:", response.status_code)   # Debug line
-    #print("Raw response text:", response.text)    # Debug line
-   
+    response = _client.get("/list_of_values/fieldname/STRM")
+
     if response.ok:
         return response.json()
     else:
         return {"error": response.status_code, "message": response.text}
 
 def get_all_subjects():
-    url = f"{BASE_URL}/list_of_values/fieldname/SUBJECT"
-    params = {"access_token": API_KEY}
-    response = requests.get(url, params=params)
-   
-    #print("Status code:", response.status_code)   # Debug line
-    #print("Raw response text:", response.text)    # Debug line
-   
+    response = _client.get("/list_of_values/fieldname/SUBJECT")
+
     if response.ok:
         return response.json()
     else:
         return {"error": response.status_code, "message": response.text}
-   
+
 def get_course_listings(subject_name):
-    url = f"{BASE_URL}/courses/subject/{subject_name}"
-    params = {"access_token": API_KEY}
-   
-    response = requests.get(url, params=params)
-
-    # Print the full request URL to verify encoding and structure
-    #print("Requesting:", response.url)
-    #print("Status code:", response.status_code)
-   
+    response = _client.get(f"/courses/subject/{subject_name}")
+
     try:
-        json_data = response.json()
-        #print("✅ Parsed JSON successfully")
-        return json_data
+        return response.json()
     except ValueError:
-        #print("❌ Failed to parse JSON. Raw response:")
-        #print(response.text)
         return {"error": "Invalid JSON", "message": response.text}
 
 
 def get_course_offering_metadata(strm, crse_id):
-    url = f"{BASE_URL}/classes/strm/{strm}/crse_id/{crse_id}"
-    params = {"access_token": API_KEY}
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = _client.get(f"/classes/strm/{strm}/crse_id/{crse_id}")
         resp.raise_for_status()
         return resp.json()
     except requests.RequestException as e:
@@ -76,35 +472,26 @@ def get_course_offering_metadata(strm, crse_id):
         return {}
 
 def get_section_details(strm: str, crse_id: str, crse_offer_nbr: str, session_code: str, class_section: str):
-    url = f"{BASE_URL}/classes/strm/{strm}/crse_id/{crse_id}/crse_offer_nbr/{crse_offer_nbr}/session_code/{session_code}/class_section/{class_section}"
-    params = {"access_token": API_KEY}
-    response = requests.get(url, params=params)
-   
-    #print("Requesting:", response.url)
+    response = _client.get(f"/classes/strm/{strm}/crse_id/{crse_id}/crse_offer_nbr/{crse_offer_nbr}/session_code/{session_code}/class_section/{class_section}")
+
     if response.ok:
         return response.json()
     else:
         return {"error": response.status_code, "message": response.text}
 
 def get_course_synopsis(strm: str, subject: str, catalog_nbr: str, session_code: str, class_section: str):
-    url = f"{BASE_URL}/synopsis/strm/{strm}/subject/{subject}/catalog_nbr/{catalog_nbr}/session_code/{session_code}/class_section/{class_section}"
-    params = {"access_token": API_KEY}
-    response = requests.get(url, params=params)
-   
-    #print("Requesting:", response.url)
+    response = _client.get(f"/synopsis/strm/{strm}/subject/{subject}/catalog_nbr/{catalog_nbr}/session_code/{session_code}/class_section/{class_section}")
+
     if response.ok:
         return response.json()
     else:
         return {"error": response.status_code, "message": response.text}
-    
+
 def get_course_details(crse_id, crse_offer_nbr):
-    url = f"{BASE_URL}/courses/crse_id/{crse_id}/crse_offer_nbr/{crse_offer_nbr}"
-    params = {"access_token": API_KEY}
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = _client.get(f"/courses/crse_id/{crse_id}/crse_offer_nbr/{crse_offer_nbr}")
         resp.raise_for_status()
         return resp.json()
     except requests.RequestException as e:
         print(f"⚠️  metadata error for {crse_id}@{crse_offer_nbr}: {e}")
         return {}
-
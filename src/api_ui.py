@@ -3,20 +3,21 @@ import os, re, sqlite3, hashlib, binascii, datetime
 from functools import wraps
 from flask import (
     Flask, render_template, request, redirect,
-    url_for, session, flash, jsonify
+    url_for, session, flash, jsonify, Response, stream_with_context
 )
 from werkzeug.utils import secure_filename
 
 from src.db import (
-    create_table, insert_many, query,
-    connect_db, add_columns_if_missing
+    create_table, insert_many, query, stream,
+    add_columns_if_missing, init_app
 )
-from src.schema import ensure_schema          # central schema helper
+from src.migrations import migrate_users
 
 # ──────────────────────────────────────────────────────────────
-# Ensure tables & columns exist
+# Apply pending user-database migrations (a single version check once
+# current); the catalog is read-only here and migrated by create_db.py
 # ──────────────────────────────────────────────────────────────
-ensure_schema()
+migrate_users()
 
 # ─── Paths & Flask config ─────────────────────────────────────
 BASE_DIR            = os.path.dirname(__file__)
@@ -31,6 +32,9 @@ app.config["MAX_CONTENT_LENGTH"] = 2 * 1024 * 1024  # 2 MB
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 app.config["UPLOAD_FOLDER"] = UPLOAD_PROFILE_PICS
 
+# one reader + one writer connection per worker thread, reused across requests
+db = init_app(app)
+
 # ─── Utility helpers ─────────────────────────────────────────
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -56,9 +60,54 @@ def normalize_codes(raw: list[str]) -> list[str]:
     return codes
 
 def _get_conn():
-    conn = connect_db()
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Read-only, long-lived connection to users.db with the catalog attached
+    (sqlite3.Row results); don't close it."""
+    return db.reader()
+
+def _get_write_conn():
+    """Long-lived connection that can write users.db (the catalog stays
+    read-only); commit, don't close."""
+    return db.writer()
+
+def _stream_json(rows, chunk=500):
+    """
+    Serialize *rows* (dicts) as one JSON array, yielding a chunk of text
+    every *chunk* rows, so a streamed response never holds the whole list.
+    """
+    yield "["
+    parts, first = [], True
+    for row in rows:
+        parts.append(app.json.dumps(row) if first else "," + app.json.dumps(row))
+        first = False
+        if len(parts) >= chunk:
+            yield "".join(parts)
+            parts = []
+    yield "".join(parts) + "]"
+
+def _resolve_term(conn):
+    """
+    Term (strm) to scope catalog queries to: ?term= if given, otherwise the
+    newest term in the catalog. None for a catalog built before per-term
+    storage, in which case queries run unscoped as before.
+    """
+    try:
+        latest = conn.execute("SELECT MAX(strm) FROM class_listings").fetchone()[0]
+    except sqlite3.OperationalError:        # no strm column
+        return None
+    return request.args.get("term", "").strip() or latest
+
+def _has_professor_ids(conn):
+    """
+    Whether the catalog's instructors carry professor ids (and a professors
+    table). A catalog built before them is matched to professor_ratings by
+    display name, as before, until a rebuild replaces it.
+    """
+    return any(r[1] == "professor_id" for r in conn.execute("PRAGMA table_info(instructors)"))
+
+def _rating_join(conn):
+    """ON condition joining instructors i to professor_ratings pr."""
+    return ("pr.professor_id = i.professor_id" if _has_professor_ids(conn)
+            else "pr.professor = i.name_display")
 
 # ─── Auth decorator ──────────────────────────────────────────
 def login_required(f):
@@ -82,12 +131,14 @@ def signup():
         password = request.form["password"]
         hashed   = hash_password(password)
         try:
+            conn = _get_write_conn()
             insert_many("users", [{
                 "name": name,
                 "username": username,
                 "password_hash": hashed,
                 "profile_pic_path": DEFAULT_PIC_NAME   # set default avatar
-            }])
+            }], conn)
+            conn.commit()
             flash("Account created! Please log in.", "success")
             return redirect(url_for("login"))
         except sqlite3.IntegrityError:
@@ -100,7 +151,7 @@ def login():
     if request.method == "POST":
         username = request.form["username"].strip()
         password = request.form["password"]
-        rows = query("users", {"username": username})
+        rows = query("users", {"username": username}, _get_conn())
         if rows and verify_password(rows[0][3], password):
             session["user_id"]  = rows[0][0]
             session["username"] = rows[0][2]
@@ -117,13 +168,12 @@ def logout():
 @app.route("/")
 @login_required
 def index():
-    conn = connect_db()
+    conn = _get_conn()
     subjects = [
         r[0] for r in conn.execute(
             "SELECT DISTINCT subject FROM courses ORDER BY subject"
         ).fetchall()
     ]
-    conn.close()
     return render_template("index.html",
                            subjects=subjects,
                            current_user_id=session["user_id"])
@@ -136,7 +186,6 @@ def profile():
     row  = conn.execute(
         "SELECT * FROM users WHERE id=?", (session["user_id"],)
     ).fetchone()
-    conn.close()
     if not row:
         return redirect(url_for("login"))
 
@@ -175,7 +224,6 @@ def edit_profile():
             "SELECT DISTINCT subject FROM courses ORDER BY subject"
         )
     ]
-    conn.close()
 
     years = [
         ("2029", "Incoming Freshman"),
@@ -210,10 +258,9 @@ def edit_profile():
         set_clause = ", ".join(f"{k}=?" for k in fields)
         values     = list(fields.values()) + [session["user_id"]]
 
-        conn = connect_db()
+        conn = _get_write_conn()
         conn.execute(f"UPDATE users SET {set_clause} WHERE id=?", values)
         conn.commit()
-        conn.close()
 
         flash("Profile updated!", "success")
         return redirect(url_for("profile"))
@@ -261,7 +308,12 @@ def api_courses():
     aok_codes = normalize_codes(raw_aok)
     moi_codes = normalize_codes(raw_moi)
 
+    conn = _get_conn()
+    term = _resolve_term(conn)
+
     where, params = [], []
+    if term:
+        where.append("cl.strm=?");                     params.append(term)
     if subject:
         where.append("c.subject=?");                   params.append(subject)
     for a in aok_codes:
@@ -282,14 +334,17 @@ def api_courses():
         params.append(f"%{schedule_filter}%")
 
     where_sql = " WHERE " + " AND ".join(where) if where else ""
+    co_term   = " AND co.strm = cl.strm" if term else ""
+    ca_term   = " AND ca.strm = co.strm" if term else ""
+    rated_by  = _rating_join(conn)
 
     count_sql = f"""
         SELECT COUNT(DISTINCT c.crse_id)
         FROM courses c
         LEFT JOIN class_listings cl ON c.crse_id = cl.crse_id
         LEFT JOIN meeting_patterns mp ON cl.class_id = mp.class_id
-        LEFT JOIN course_offerings co ON c.crse_id = co.crse_id
-        LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id
+        LEFT JOIN course_offerings co ON c.crse_id = co.crse_id{co_term}
+        LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id{ca_term}
         LEFT JOIN instructors i ON cl.class_id = i.class_id
         {where_sql}
     """
@@ -309,10 +364,10 @@ def api_courses():
         INNER JOIN meeting_patterns mp
             ON cl.class_id = mp.class_id
             AND mp.ssr_mtg_sched_long IS NOT NULL
-        LEFT JOIN course_offerings co ON c.crse_id = co.crse_id
-        LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id
+        LEFT JOIN course_offerings co ON c.crse_id = co.crse_id{co_term}
+        LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id{ca_term}
         LEFT JOIN instructors i ON cl.class_id = i.class_id
-        LEFT JOIN professor_ratings pr ON i.name_display = pr.professor
+        LEFT JOIN professor_ratings pr ON {rated_by}
         {where_sql}
         GROUP BY c.crse_id
         ORDER BY 
@@ -322,12 +377,11 @@ def api_courses():
         LIMIT ? OFFSET ?
     """
 
-    conn   = _get_conn()
     total  = conn.execute(count_sql, params).fetchone()[0]
     rows   = conn.execute(data_sql, params + [per_page, offset]).fetchall()
-    conn.close()
 
     return jsonify({
+        "term":        term,
         "page":        page,
         "per_page":    per_page,
         "total":       total,
@@ -338,7 +392,9 @@ def api_courses():
 # ---------- API: /api/course/<id> ------------------------------------------
 @app.route("/api/course/<course_id>", methods=["GET"])
 def api_course_detail(course_id):
-    sql = """
+    conn = _get_conn()
+    term = _resolve_term(conn)
+    sql = f"""
     SELECT
         c.crse_id AS id,
         c.subject,
@@ -348,16 +404,15 @@ def api_course_detail(course_id):
         ca.curriculum_modes_of_inquiry   AS moi,
         GROUP_CONCAT(DISTINCT i.name_display) AS professors
     FROM courses c
-    LEFT JOIN class_listings   cl ON c.crse_id = cl.crse_id
-    LEFT JOIN course_offerings co ON c.crse_id = co.crse_id
-    LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id
+    LEFT JOIN class_listings   cl ON c.crse_id = cl.crse_id{" AND cl.strm = ?" if term else ""}
+    LEFT JOIN course_offerings co ON c.crse_id = co.crse_id{" AND co.strm = ?" if term else ""}
+    LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id{" AND ca.strm = co.strm" if term else ""}
     LEFT JOIN instructors      i  ON cl.class_id = i.class_id
     WHERE c.crse_id = ?
     GROUP BY c.crse_id
     """
-    conn = _get_conn()
-    row  = conn.execute(sql, (course_id,)).fetchone()
-    conn.close()
+    params = ([term, term] if term else []) + [course_id]
+    row  = conn.execute(sql, params).fetchone()
     if row:
         return jsonify(dict(row))
     return jsonify({"error": "Course not found"}), 404
@@ -369,32 +424,44 @@ def api_departments():
     rows = conn.execute(
         "SELECT DISTINCT subject FROM courses ORDER BY subject"
     ).fetchall()
-    conn.close()
     return jsonify([{"code": r["subject"], "name": r["subject"]} for r in rows])
 
+# ---------- API: /api/terms ------------------------------------------------
+@app.route("/api/terms", methods=["GET"])
+def api_terms():
+    conn = _get_conn()
+    try:
+        rows = conn.execute("SELECT strm, descr FROM terms ORDER BY strm").fetchall()
+    except sqlite3.OperationalError:        # catalog predates the terms table
+        rows = []
+    return jsonify([{"code": r["strm"], "name": r["descr"]} for r in rows])
+
 # ---------- API: /api/professors -------------------------------------------
 @app.route("/api/professors", methods=["GET"])
 def api_professors():
     query_text = request.args.get("query", "").strip()
     conn = _get_conn()
-    sql = """
+    if _has_professor_ids(conn):
+        people, rated_by = "professors p", "pr.professor_id = p.professor_id"
+    else:
+        people, rated_by = "instructors p", "pr.professor = p.name_display"
+    sql = f"""
     SELECT DISTINCT
-      i.name_display AS professor,
+      p.name_display AS professor,
       pr.avg_rating,
       pr.avg_difficulty,
       pr.would_take_again_pct,
       pr.tags
-    FROM instructors i
+    FROM {people}
     LEFT JOIN professor_ratings pr
-      ON i.name_display = pr.professor
+      ON {rated_by}
     """
     params = []
     if query_text:
-        sql += " WHERE i.name_display LIKE ?"
+        sql += " WHERE p.name_display LIKE ?"
         params.append(f"%{query_text}%")
-    sql += " ORDER BY i.name_display"
+    sql += " ORDER BY p.name_display"
     rows = conn.execute(sql, params).fetchall()
-    conn.close()
     return jsonify([dict(r) for r in rows])
 
 # ---------- API: /api/reviews ----------------------------------------------
@@ -413,7 +480,7 @@ def api_reviews():
         if not course_id or not user_id:
             return jsonify({"error": "course_id and user_id are required"}), 400
 
-        conn = connect_db()
+        conn = _get_write_conn()
         conn.execute(
             """
             INSERT INTO reviews
@@ -423,47 +490,26 @@ def api_reviews():
             (course_id, user_id, review_text, rating, difficulty, timestamp)
         )
         conn.commit()
-        conn.close()
 
         return jsonify({"success": True}), 201
 
     # GET: fetch reviews (optionally filtered by course_id)
     course_id = request.args.get("course_id")
 
-    # Use _get_conn so we get sqlite3.Row objects
-    conn = _get_conn()
+    sql = """
+        SELECT id, course_id, user_id, review_text,
+               rating, difficulty, timestamp
+          FROM reviews
+    """
+    params = ()
     if course_id:
-        cursor = conn.execute(
-            """
-            SELECT id, course_id, user_id, review_text,
-                   rating, difficulty, timestamp
-              FROM reviews
-             WHERE course_id = ?
-             ORDER BY timestamp DESC
-            """,
-            (course_id,)
-        )
-    else:
-        cursor = conn.execute(
-            """
-            SELECT id, course_id, user_id, review_text,
-                   rating, difficulty, timestamp
-              FROM reviews
-             ORDER BY timestamp DESC
-            """
-        )
-    rows = cursor.fetchall()
-    conn.close()
+        sql += " WHERE course_id = ?"
+        params = (course_id,)
+    sql += " ORDER BY timestamp DESC"
 
-    # Build a list of dicts by iterating over sqlite3.Row.keys()
-    reviews = []
-    for row in rows:
-        review = {}
-        for col in row.keys():
-            review[col] = row[col]
-        reviews.append(review)
-
-    return jsonify(reviews)
+    # Streamed in fetchmany batches: memory stays flat however many reviews
+    rows = stream(sql, params, _get_conn(), row=dict)
+    return Response(stream_with_context(_stream_json(rows)), mimetype="application/json")
 
 
 # ---------- API: Favorites --------------------------------------------------
@@ -475,10 +521,10 @@ def api_favorites_get():
     fav_ids = [r["course_id"] for r in conn.execute(
         "SELECT course_id FROM favorites WHERE user_id=?", (user_id,)
     ).fetchall()]
-    conn.close()
     if not fav_ids:
         return jsonify([])
     placeholders = ",".join("?" * len(fav_ids))
+    term = _resolve_term(conn)
     sql = f"""
     SELECT
         c.crse_id AS id,
@@ -489,16 +535,14 @@ def api_favorites_get():
         ca.curriculum_modes_of_inquiry   AS moi,
         GROUP_CONCAT(DISTINCT i.name_display) AS professors
     FROM courses c
-    LEFT JOIN course_offerings  co ON c.crse_id = co.crse_id
-    LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id
-    LEFT JOIN class_listings    cl ON c.crse_id = cl.crse_id
+    LEFT JOIN course_offerings  co ON c.crse_id = co.crse_id{" AND co.strm = ?" if term else ""}
+    LEFT JOIN course_attributes ca ON co.offering_id = ca.offering_id{" AND ca.strm = co.strm" if term else ""}
+    LEFT JOIN class_listings    cl ON c.crse_id = cl.crse_id{" AND cl.strm = ?" if term else ""}
     LEFT JOIN instructors       i  ON cl.class_id = i.class_id
     WHERE c.crse_id IN ({placeholders})
     GROUP BY c.crse_id
     """
-    conn = _get_conn()
-    rows = conn.execute(sql, fav_ids).fetchall()
-    conn.close()
+    rows = conn.execute(sql, ([term, term] if term else []) + fav_ids).fetchall()
     return jsonify([dict(r) for r in rows])
 
 @app.route("/api/favorites", methods=["POST"])
@@ -509,7 +553,7 @@ def api_favorites_post():
     user_id   = session["user_id"]
     if not course_id:
         return jsonify({"error": "course_id is required"}), 400
-    conn = connect_db()
+    conn = _get_write_conn()
     try:
         conn.execute(
             "INSERT INTO favorites (user_id, course_id) VALUES (?, ?)",
@@ -518,7 +562,6 @@ def api_favorites_post():
         conn.commit()
     except sqlite3.IntegrityError:
         pass  # already favorited
-    conn.close()
     return jsonify({"success": True})
 
 @app.route("/api/favorites", methods=["DELETE"])
@@ -535,13 +578,12 @@ def api_favorites_delete():
     if not course_id:
         return jsonify({"error": "course_id is required"}), 400
 
-    conn = connect_db()
+    conn = _get_write_conn()
     conn.execute(
         "DELETE FROM favorites WHERE user_id=? AND course_id=?",
         (user_id, course_id)
     )
     conn.commit()
-    conn.close()
 
     return jsonify({"success": True})
 
@@ -550,9 +592,8 @@ def api_favorites_delete():
 @login_required
 def schedule():
     # need the list of subjects (majors) for the dropdown
-    conn = connect_db()
+    conn = _get_conn()
     subjects = [r[0] for r in conn.execute("SELECT DISTINCT subject FROM courses ORDER BY subject").fetchall()]
-    conn.close()
     return render_template("schedule.html", subjects=subjects)
 
 # ─── Schedule Builder API ───────────────────────────────────────
@@ -563,7 +604,9 @@ def api_schedule():
     if not major:
         return jsonify({"error":"major is required"}), 400
 
-    sql = """
+    conn = _get_conn()
+    term = _resolve_term(conn)
+    sql = f"""
     SELECT
       c.crse_id                AS id,
       c.catalog_nbr            AS catalog_nbr,
@@ -571,21 +614,19 @@ def api_schedule():
       GROUP_CONCAT(DISTINCT mp.ssr_mtg_sched_long) AS schedule,
       MAX(pr.avg_rating)       AS avg_rating
     FROM courses c
-    LEFT JOIN class_listings   cl ON c.crse_id = cl.crse_id
+    LEFT JOIN class_listings   cl ON c.crse_id = cl.crse_id{" AND cl.strm = ?" if term else ""}
     LEFT JOIN meeting_patterns mp
       ON cl.class_id = mp.class_id
       AND mp.ssr_mtg_sched_long IS NOT NULL
     LEFT JOIN instructors     i  ON cl.class_id = i.class_id
     LEFT JOIN professor_ratings pr
-      ON i.name_display = pr.professor
+      ON {_rating_join(conn)}
     WHERE c.subject = ?
     GROUP BY c.crse_id
     ORDER BY avg_rating DESC
     """
 
-    conn = _get_conn()
-    rows = conn.execute(sql, (major,)).fetchall()
-    conn.close()
+    rows = conn.execute(sql, ([term] if term else []) + [major]).fetchall()
 
     # pick first 5 courses with unique schedule strings
     selected = []
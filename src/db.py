@@ -1,15 +1,79 @@
 import sqlite3
 import os
+import time
+import threading
+import dataclasses
+import operator
+import urllib.parse
+from collections.abc import Iterator
+from src import telemetry
 
 # Get absolute path to the `data/courses.db` file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(BASE_DIR, "..", "data", "courses.db")
 
+# User data (accounts, reviews, favorites, scraped ratings) lives in its own
+# file so catalog rebuilds never touch it; None → users.db next to DB_FILE.
+USERS_DB_FILE = None
+
+class Connection(sqlite3.Connection):
+    """
+    sqlite3.Connection that keeps the TableLoaders compiled on it (its
+    column registry), so repeated loads skip the PRAGMA and re-planning.
+    Every connection this module opens is one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loaders = {}          # table -> TableLoader
+
 def connect_db() -> sqlite3.Connection:
     """Open (or create) the SQLite database file and return its connection."""
-    return sqlite3.connect(DB_FILE)
+    return sqlite3.connect(DB_FILE, factory=Connection)
+
+def set_db_file(path: str) -> None:
+    """Point every helper in this module at another database file
+    (e.g. a staging copy that a build writes into)."""
+    global DB_FILE
+    DB_FILE = path
+
+def set_users_db_file(path: str | None) -> None:
+    """Point the app and scrapers at another user database (None: follow DB_FILE)."""
+    global USERS_DB_FILE
+    USERS_DB_FILE = path
+
+def users_db_file(catalog: str | None = None) -> str:
+    """The user database that goes with *catalog* (default DB_FILE)."""
+    if USERS_DB_FILE is not None:
+        return USERS_DB_FILE
+    return os.path.join(os.path.dirname(os.path.abspath(catalog or DB_FILE)), "users.db")
 
-def create_table(table: str, schema: dict[str, str]) -> None:
+def read_only_uri(path: str, immutable: bool = False) -> str:
+    """A file: URI opening *path* read-only (for connect(uri=True) or ATTACH),
+    percent-encoded so paths containing ?, # or % survive."""
+    uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+    return uri + "&immutable=1" if immutable else uri
+
+def attach_catalog(conn: sqlite3.Connection, path: str | None = None,
+                   schema: str = "catalog") -> bool:
+    """
+    Attach the catalog at *path* (default DB_FILE) to *conn* as *schema*,
+    read-only and immutable: SQLite takes no locks on it and never checks
+    it for changes, which is safe because builds only ever replace the
+    file by rename. Unqualified table names resolve to main first, so the
+    user tables shadow any legacy copies left in an old catalog.
+
+    Returns:
+      False (and attaches nothing) if there is no catalog file yet.
+    """
+    path = os.path.abspath(path or DB_FILE)
+    if not os.path.exists(path):
+        return False
+    conn.execute("ATTACH DATABASE ? AS " + schema, (read_only_uri(path, immutable=True),))
+    return True
+
+def create_table(table: str, schema: dict[str, str],
+                 conn: sqlite3.Connection | None = None) -> None:
     """
     Create a table if it doesn’t exist.
 
@@ -17,49 +81,249 @@ def create_table(table: str, schema: dict[str, str]) -> None:
       table: Name of the table.
       schema: Mapping of column_name → SQL type/constraints.
                 e.g. {"id": "INTEGER PRIMARY KEY", "name": "TEXT NOT NULL"}
+      conn: Optional open connection to run in (left uncommitted and open).
     """
     columns_sql = ", ".join(f"{col} {typ}" for col, typ in schema.items())
     sql = f"CREATE TABLE IF NOT EXISTS {table} ({columns_sql})"
+    if conn is not None:
+        conn.execute(sql)
+        return
+    conn = connect_db()
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+def create_index(table: str, columns: list[str], unique: bool = False,
+                 conn: sqlite3.Connection | None = None) -> None:
+    """
+    Create an index on *table*(*columns*) if it doesn’t exist.
+    The index is named <table>_<col1>_<col2>_idx.
+    """
+    name = f"{table}_{'_'.join(columns)}_idx"
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    sql = f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    if conn is not None:
+        conn.execute(sql)
+        return
     conn = connect_db()
     conn.execute(sql)
     conn.commit()
     conn.close()
 
-def insert_many(table: str, rows: list[dict[str, any]]) -> int:
+# ──────────────────────────────────────────────────────────────
+# Compiled per-table loaders
+# ──────────────────────────────────────────────────────────────
+def _to_int(v):
+    if type(v) is str or isinstance(v, int):
+        return int(v)              # bool is an int; "12" parses, "1.5" does not
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    raise TypeError
+
+# declared-type affinity (SQLite's rules, in its order) → (type, converter)
+_AFFINITIES = [
+    (("INT",),                  (int, _to_int)),
+    (("CHAR", "CLOB", "TEXT"),  None),           # SQLite stores numbers as text itself
+    (("BLOB",),                 None),
+    (("REAL", "FLOA", "DOUB"),  (float, float)),
+]
+
+def _converter(decl: str):
+    decl = decl.upper()
+    for names, conv in _AFFINITIES:
+        if any(n in decl for n in names):
+            return conv
+    return None
+
+class TableLoader:
+    """
+    Everything needed to load dict rows into one table, worked out once
+    from its declared schema (PRAGMA table_info): the column order, the
+    INSERT OR REPLACE and UPSERT statements, and per-column checks.
+
+    `tuples()` turns rows into parameter tuples in a single pass: unknown
+    keys and NULLs in NOT NULL columns are rejected, and values headed for
+    INTEGER / REAL columns are converted (so "3" lands as 3 and "abc" is an
+    error instead of a silently stored string). TEXT columns are passed
+    through untouched, which keeps the common case cheap. `fix()` applies
+    the same checks to rows that are already tuples in column order.
+
+    Get one with loader(table, conn); they are cached per connection.
+    """
+
+    def __init__(self, table: str, info: list[tuple]):
+        self.table = table
+        self.columns = [r[1] for r in info]
+        self.types = {r[1]: r[2] for r in info}
+        self._known = frozenset(self.columns)
+        # rows that carry every column: one C-level call, and len(row) then
+        # proves there are no unknown keys either
+        self._get_all = (operator.itemgetter(*self.columns) if len(self.columns) > 1
+                         else lambda row, c=self.columns[0]: (row[c],))
+        self._convert = [(i, *conv) for i, r in enumerate(info)
+                         if (conv := _converter(r[2])) is not None]
+        # NOT NULL without a default; an INTEGER PRIMARY KEY fills itself in
+        self._required = [i for i, r in enumerate(info)
+                          if r[3] and r[4] is None and not (r[5] and "INT" in r[2].upper())]
+
+        cols = ", ".join(self.columns)
+        marks = ", ".join("?" for _ in self.columns)
+        self.replace_sql = f"INSERT OR REPLACE INTO {table} ({cols}) VALUES ({marks})"
+        pk = [r[1] for r in sorted(info, key=lambda r: r[5]) if r[5]]
+        sql = f"INSERT INTO {table} ({cols}) VALUES ({marks})"
+        rest = [c for c in self.columns if c not in pk]
+        if pk and rest:
+            sql += (f" ON CONFLICT ({', '.join(pk)}) DO UPDATE SET "
+                    + ", ".join(f"{c}=excluded.{c}" for c in rest))
+            if "row_hash" in rest:
+                sql += f" WHERE {table}.row_hash IS NOT excluded.row_hash"
+        elif pk:
+            sql += f" ON CONFLICT ({', '.join(pk)}) DO NOTHING"
+        self.upsert_sql = sql
+
+    def _unknown(self, row):
+        unknown = sorted(set(row) - self._known)
+        return ValueError(f"{self.table} has no column(s) {', '.join(unknown)}")
+
+    def _reject(self, i, value=None):
+        col = self.columns[i]
+        if value is None:
+            return ValueError(f"{self.table}.{col} is NOT NULL")
+        return ValueError(f"{self.table}.{col} is {self.types[col]}, got {value!r}")
+
+    def tuples(self, rows: list[dict[str, any]]) -> list:
+        """Parameter rows for replace_sql / upsert_sql; missing keys are NULL."""
+        return self._checked(self._values(rows))
+
+    def fix(self, rows: list[tuple]) -> list:
+        """
+        The same checks and conversions for rows that are already tuples in
+        column order (RowBuffer's); a short tuple, buffered before the table
+        gained columns, has the missing tail written as NULL.
+        """
+        n = len(self.columns)
+        def padded():
+            for values in rows:
+                if len(values) != n:
+                    if len(values) > n:
+                        raise ValueError(f"{self.table} has {n} columns, got {len(values)} values")
+                    values += (None,) * (n - len(values))
+                yield values
+        return self._checked(padded())
+
+    def _values(self, rows):
+        cols, known, get_all, ncols = self.columns, self._known, self._get_all, len(self.columns)
+        complete = True          # until a row leaves a column out; its batch-mates likely do too
+        for row in rows:
+            if complete:
+                try:
+                    values = get_all(row)
+                except KeyError:
+                    complete = False
+            if not complete:
+                if not known.issuperset(row):
+                    raise self._unknown(row)
+                values = tuple(map(row.get, cols))
+            elif len(row) != ncols:
+                raise self._unknown(row)
+            yield values
+
+    def _checked(self, value_rows) -> list:
+        # column by column: a C-level scan of each converted column's types
+        # finds the (usually zero) values that need converting, so only
+        # those rows are touched in Python
+        out = list(value_rows)
+        for i, typ, conv in self._convert:
+            column = list(map(operator.itemgetter(i), out))
+            if set(map(type, column)) <= {typ, type(None)}:
+                continue
+            for k, v in enumerate(column):
+                if v is not None and type(v) is not typ:
+                    values = list(out[k])
+                    try:
+                        values[i] = conv(v)
+                    except (TypeError, ValueError):
+                        raise self._reject(i, v) from None
+                    out[k] = values
+        for i in self._required:
+            if None in map(operator.itemgetter(i), out):
+                raise self._reject(i)
+        return out
+
+def loader(table: str, conn: sqlite3.Connection) -> TableLoader:
+    """
+    *table*'s TableLoader on *conn*, compiled on first use and kept in the
+    connection's registry (only module Connections have one; others get a
+    fresh loader each call). add_columns_if_missing keeps it current.
+    """
+    cache = getattr(conn, "loaders", None)
+    if cache is not None and table in cache:
+        return cache[table]
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not info:
+        raise sqlite3.OperationalError(f"no such table: {table}")
+    compiled = TableLoader(table, [tuple(r) for r in info])
+    if cache is not None:
+        cache[table] = compiled
+    return compiled
+
+def _compile_rows(table: str, rows: list[dict[str, any]], conn) -> tuple[TableLoader, list]:
+    """(loader, parameter rows); a batch rejected for keys the loader doesn't
+    know is retried once on a freshly compiled loader, in case the table
+    gained columns behind the cache."""
+    compiled = loader(table, conn)
+    try:
+        return compiled, compiled.tuples(rows)
+    except ValueError:
+        cache = getattr(conn, "loaders", None)
+        if (cache is None or all(compiled._known.issuperset(row) for row in rows)
+                or cache.pop(table, None) is None):
+            raise
+        compiled = loader(table, conn)
+        return compiled, compiled.tuples(rows)
+
+def insert_many(table: str, rows: list[dict[str, any]],
+                conn: sqlite3.Connection | None = None) -> int:
     """
     Bulk-insert (or replace) a list of dictionaries into the given table.
 
     Args:
       table: Table name.
-      rows: Each dict’s keys must exactly match table column names.
+      rows: Dicts keyed by column name; missing columns are written as NULL,
+            unknown ones raise ValueError (see TableLoader).
+      conn: Optional open connection. When given, the insert joins the
+            caller’s transaction and is neither committed nor closed here.
 
     Returns:
       Number of rows inserted.
     """
     if not rows:
         return 0
-    
-    cols = sorted({k for row in rows for k in row})
-    placeholders = ", ".join("?" for _ in cols)
-    sql = f'INSERT OR REPLACE INTO {table} ({", ".join(cols)}) VALUES ({placeholders})'
-    values = [
-        tuple(row.get(col) for col in cols)    # use .get -> None for missing
-        for row in rows
-    ]
 
-    conn = connect_db()
-    conn.executemany(sql, values)
-    conn.commit()
-    conn.close()
-    return len(values)
+    started = time.perf_counter()
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+    try:
+        compiled, params = _compile_rows(table, rows, conn)
+        conn.executemany(compiled.replace_sql, params)
+        if own_conn:
+            conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+    telemetry.record_insert(table, len(rows), time.perf_counter() - started)
+    return len(rows)
 
-def query(table: str, filters: dict[str, any] | None = None) -> list[tuple]:
+def query(table: str, filters: dict[str, any] | None = None,
+          conn: sqlite3.Connection | None = None) -> list[tuple]:
     """
     SELECT * FROM table with optional equality filters.
 
     Args:
       table: Table name.
       filters: Optional dict of {column: value} for WHERE clauses.
+      conn: Optional open connection to run on (left open).
 
     Returns:
       List of result tuples.
@@ -72,6 +336,8 @@ def query(table: str, filters: dict[str, any] | None = None) -> list[tuple]:
         sql += " WHERE " + " AND ".join(clauses)
         params = list(filters.values())
 
+    if conn is not None:
+        return conn.execute(sql, params).fetchall()
     conn = connect_db()
     cursor = conn.cursor()
     cursor.execute(sql, params)
@@ -79,15 +345,71 @@ def query(table: str, filters: dict[str, any] | None = None) -> list[tuple]:
     conn.close()
     return rows
 
-def add_columns_if_missing(table: str, columns: dict[str, str]) -> None:
+STREAM_BATCH = 500        # rows per fetchmany() in stream()
+
+def _row_maker(row, columns: list[str]):
+    if row is None:
+        return None
+    if row is tuple:
+        return tuple
+    if row is dict:
+        return lambda r: dict(zip(columns, r))
+    if dataclasses.is_dataclass(row) and isinstance(row, type):
+        return lambda r: row(**dict(zip(columns, r)))
+    raise TypeError(f"row must be None, tuple, dict or a dataclass, not {row!r}")
+
+def stream(sql: str, params: tuple | dict = (), conn: sqlite3.Connection | None = None,
+           row=None, batch: int = STREAM_BATCH) -> Iterator:
+    """
+    Run *sql* and yield its rows *batch* at a time (cursor.fetchmany), so
+    memory stays flat however many rows match. Nothing runs until the
+    first row is requested.
+
+    Args:
+      sql: Query to run.
+      params: Its parameters.
+      conn: Optional open connection (left open); otherwise one is opened
+            on DB_FILE and closed when the generator finishes or is closed.
+      row: None (whatever the connection's row_factory gives), tuple, dict,
+           or a dataclass built from the columns by name.
+      batch: Rows fetched per round trip.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+    cursor = None
+    try:
+        cursor = conn.execute(sql, params)
+        make = _row_maker(row, [d[0] for d in cursor.description or ()])
+        while rows := cursor.fetchmany(batch):
+            if make is None:
+                yield from rows
+            else:
+                yield from map(make, rows)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if own_conn:
+            conn.close()
+
+def add_columns_if_missing(table: str, columns: dict[str, str],
+                           conn: sqlite3.Connection | None = None) -> None:
     """
     Adds missing columns to an existing SQLite table without dropping it.
 
     Args:
       table: Table name.
       columns: Dict of {column_name: column_type}.
+      conn: Optional open connection to run in (left uncommitted and open).
+            If its column registry already knows every column, nothing
+            is run at all.
     """
-    conn = connect_db()
+    cache = getattr(conn, "loaders", None)
+    if cache is not None and table in cache and all(c in cache[table].types for c in columns):
+        return
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
     cursor = conn.cursor()
 
     # Get existing column names
@@ -98,6 +420,384 @@ def add_columns_if_missing(table: str, columns: dict[str, str]) -> None:
     for col_name, col_type in columns.items():
         if col_name not in existing_columns:
             cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}")
+    if cache is not None:
+        cache.pop(table, None)         # recompiled with the new columns on next use
 
-    conn.commit()
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+
+# ──────────────────────────────────────────────────────────────
+# Long-lived connections for the web app
+# ──────────────────────────────────────────────────────────────
+# Every connection opens the user database as main and attaches the
+# catalog (attach_catalog). Readers never write (query_only), so a stray
+# write in a read path fails loudly instead of taking the database lock.
+READER_PRAGMAS = {
+    "query_only":   1,
+    "busy_timeout": 5000,          # ms to wait out a writer instead of failing
+    "temp_store":   "MEMORY",
+}
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",         # user writes never block readers
+    "synchronous":  "NORMAL",      # durable at each checkpoint; safe with WAL
+    "busy_timeout": 5000,
+}
+# Set on the attached catalog, for readers and writers alike
+CATALOG_PRAGMAS = {
+    "mmap_size":    256 << 20,     # read pages straight from the OS page cache
+    "cache_size":   -32768,        # KiB when negative → 32 MB per connection
+}
+
+def _file_identity(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+class ConnectionManager:
+    """
+    One reader and one writer connection per thread, kept open across
+    requests so each request skips the connect, schema parse and cold page
+    cache, and reuses the connection's prepared-statement cache. Both open
+    the user database with the catalog attached read-only (attach_catalog).
+
+    A connection is reopened when either path changes (set_db_file) or the
+    file at a path is a different file than the one it opened — create_db.py
+    swaps a new snapshot in with a rename, and a connection to the old inode
+    would keep serving the old catalog.
+
+    Args:
+      path:              Catalog file (default: follow DB_FILE).
+      users_path:        User database (default: users_db_file(path)).
+      reader_pragmas:    PRAGMAs for reader connections (default READER_PRAGMAS).
+      writer_pragmas:    PRAGMAs for writer connections (default WRITER_PRAGMAS).
+      catalog_pragmas:   PRAGMAs for the attached catalog (default CATALOG_PRAGMAS).
+      cached_statements: Prepared statements kept per connection.
+      row_factory:       Row factory for both (default sqlite3.Row).
+    """
+
+    def __init__(self, path: str | None = None, users_path: str | None = None,
+                 reader_pragmas: dict | None = None, writer_pragmas: dict | None = None,
+                 catalog_pragmas: dict | None = None, cached_statements: int = 256,
+                 row_factory=sqlite3.Row):
+        self.path = path
+        self.users_path = users_path
+        self.pragmas = {
+            "reader": READER_PRAGMAS if reader_pragmas is None else reader_pragmas,
+            "writer": WRITER_PRAGMAS if writer_pragmas is None else writer_pragmas,
+        }
+        self.catalog_pragmas = CATALOG_PRAGMAS if catalog_pragmas is None else catalog_pragmas
+        self.cached_statements = cached_statements
+        self.row_factory = row_factory
+        self.opened = 0                  # connections opened, all threads
+        self._local = threading.local()
+
+    def _connection(self, role: str) -> sqlite3.Connection:
+        catalog = self.path or DB_FILE
+        users = self.users_path or users_db_file(catalog)
+        files = (catalog, _file_identity(catalog), users, _file_identity(users))
+        held = getattr(self._local, role, None)
+        if held is not None:
+            conn, held_files = held
+            if held_files == files:
+                return conn
+            conn.close()
+        conn = sqlite3.connect(users, cached_statements=self.cached_statements, factory=Connection)
+        conn.row_factory = self.row_factory
+        for name, value in self.pragmas[role].items():
+            conn.execute(f"PRAGMA {name}={value}")
+        if attach_catalog(conn, catalog):
+            for name, value in self.catalog_pragmas.items():
+                conn.execute(f"PRAGMA catalog.{name}={value}")
+        if files[3] is None:                # connect() just created users.db
+            files = files[:3] + (_file_identity(users),)
+        setattr(self._local, role, (conn, files))
+        self.opened += 1
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection."""
+        return self._connection("reader")
+
+    def writer(self) -> sqlite3.Connection:
+        """This thread's read/write connection; callers commit."""
+        return self._connection("writer")
+
+    def release(self) -> None:
+        """End of request: roll back anything left uncommitted, keep the
+        connections open."""
+        for role in self.pragmas:
+            held = getattr(self._local, role, None)
+            if held is not None and held[0].in_transaction:
+                held[0].rollback()
+
+    def close(self) -> None:
+        """Close this thread's connections."""
+        for role in self.pragmas:
+            held = getattr(self._local, role, None)
+            if held is not None:
+                held[0].close()
+                setattr(self._local, role, None)
+
+def init_app(app, **options) -> ConnectionManager:
+    """
+    Attach a ConnectionManager to a Flask *app* (as app.extensions["sqlite"])
+    and release its connections after every request.
+
+    PRAGMAs can be overridden in app.config as SQLITE_READER_PRAGMAS /
+    SQLITE_WRITER_PRAGMAS / SQLITE_CATALOG_PRAGMAS (merged over the
+    defaults); other keyword *options* go to ConnectionManager.
+    """
+    options.setdefault("reader_pragmas", {**READER_PRAGMAS, **app.config.get("SQLITE_READER_PRAGMAS", {})})
+    options.setdefault("writer_pragmas", {**WRITER_PRAGMAS, **app.config.get("SQLITE_WRITER_PRAGMAS", {})})
+    options.setdefault("catalog_pragmas", {**CATALOG_PRAGMAS, **app.config.get("SQLITE_CATALOG_PRAGMAS", {})})
+    manager = ConnectionManager(**options)
+    app.extensions["sqlite"] = manager
+    app.teardown_appcontext(lambda exc: manager.release())
+    return manager
+
+
+# ──────────────────────────────────────────────────────────────
+# Staging snapshots: build elsewhere, check, then swap in atomically
+# ──────────────────────────────────────────────────────────────
+def _tables(conn: sqlite3.Connection, schema: str = "main") -> list[str]:
+    return [r[0] for r in conn.execute(
+        f"SELECT name FROM {schema}.sqlite_master "
+        "WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    )]
+
+def _count(conn: sqlite3.Connection, table: str, schema: str = "main") -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+
+def check_snapshot(staging: str, live: str, tables: list[str],
+                   min_ratio: float = 0.9) -> list[str]:
+    """
+    Sanity-check a freshly built database before it replaces the live one.
+
+    Args:
+      staging: Path of the candidate database.
+      live: Path of the database it would replace (may not exist yet).
+      tables: Tables that must exist and be non-empty in *staging*.
+      min_ratio: Each of *tables* must keep at least this fraction of the
+                 live row count (0 disables the comparison).
+
+    Returns:
+      Human-readable problems; an empty list means the snapshot is fine.
+      A file too damaged to read is reported, not raised.
+    """
+    problems = []
+    conn = sqlite3.connect(staging)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            problems.append(f"integrity_check: {result}")
+        have = set(_tables(conn))
+        live_counts = {}
+        if os.path.exists(live):
+            conn.execute("ATTACH DATABASE ? AS live", (live,))
+            live_have = set(_tables(conn, "live"))
+            live_counts = {t: _count(conn, t, "live") for t in tables if t in live_have}
+        for t in tables:
+            if t not in have:
+                problems.append(f"{t}: missing")
+                continue
+            n = _count(conn, t)
+            if n == 0:
+                problems.append(f"{t}: empty")
+            elif min_ratio and n < min_ratio * live_counts.get(t, 0):
+                problems.append(f"{t}: {n} rows vs {live_counts[t]} live "
+                                f"(below {min_ratio:.0%})")
+    except sqlite3.DatabaseError as e:
+        problems.append(f"unreadable: {e}")
+    finally:
+        conn.close()
+    return problems
+
+def swap_in_snapshot(staging: str, live: str) -> None:
+    """
+    Atomically replace *live* with *staging*.
+
+    The catalog holds nothing but what the build wrote (user data lives in
+    users.db), so nothing is carried over: the snapshot is synced and
+    renamed over *live*. Readers attach the catalog by path, so their next
+    connection sees the new snapshot while open ones finish on the old file.
+    """
+    conn = sqlite3.connect(staging)
+    conn.execute("PRAGMA journal_mode=DELETE")    # no -wal sidecar left behind
     conn.close()
+
+    fd = os.open(staging, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(staging, live)
+
+
+# ──────────────────────────────────────────────────────────────
+# Bulk loading: one connection and one statement per table for a build
+# ──────────────────────────────────────────────────────────────
+# Applied for the duration of a BulkWriter session, then put back.
+# Safe for builds because they write a staging file that is only
+# swapped in after it has been checked.
+BUILD_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous":  "OFF",
+    "cache_size":   -262144,     # KiB when negative → 256 MB page cache
+    "temp_store":   "MEMORY",
+}
+
+class RowBuffer:
+    """
+    Rows waiting to be written to one table, held as tuples in the table's
+    column order instead of dicts, so a buffered row costs one small tuple
+    rather than a dict plus its key strings.
+
+    `nbytes` is a rough running size (tuple overhead plus string payload)
+    for deciding when to flush; it is not an exact memory measurement.
+    """
+
+    __slots__ = ("table", "columns", "rows", "nbytes", "_known")
+
+    def __init__(self, table: str, columns: list[str]):
+        self.table = table
+        self.columns = list(columns)
+        self._known = frozenset(columns)
+        self.rows = []
+        self.nbytes = 0
+
+    def add(self, row: dict[str, any]) -> None:
+        """Append *row*; missing keys are NULL, unknown ones raise ValueError
+        (as in TableLoader.tuples)."""
+        if not self._known.issuperset(row):
+            unknown = sorted(set(row) - self._known)
+            raise ValueError(f"{self.table} has no column(s) {', '.join(unknown)}")
+        t = tuple(map(row.get, self.columns))
+        self.rows.append(t)
+        self.nbytes += 56 + 8 * len(t) + sum(len(v) for v in t if type(v) is str)
+
+    def rebind(self, columns: list[str]) -> None:
+        """Follow the table after ALTER TABLE … ADD COLUMN (new columns are
+        appended, so rows already buffered stay valid)."""
+        assert columns[:len(self.columns)] == self.columns
+        self.columns = list(columns)
+        self._known = frozenset(columns)
+
+    def clear(self) -> None:
+        self.rows = []
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class BulkWriter:
+    """
+    Holds a single connection open for a whole build.
+
+    Each table gets one prepared UPSERT (`INSERT … ON CONFLICT (pk) DO
+    UPDATE`) covering all of its columns, so existing rows are updated in
+    place instead of being deleted and re-inserted the way `INSERT OR
+    REPLACE` does. If the table has a `row_hash` column the update only
+    fires when the hash differs, so unchanged rows are never rewritten.
+    Tables without a primary key get a plain INSERT.
+    Nothing is committed until `commit()`; build PRAGMAs are applied on
+    open and restored on `close()`.
+
+    Usage:
+      with BulkWriter(path) as w:
+          w.upsert("courses", rows)
+          w.commit()
+    """
+
+    def __init__(self, path: str | None = None, pragmas: dict | None = None):
+        self.conn = sqlite3.connect(path or DB_FILE, cached_statements=256, factory=Connection)
+        self.pragmas = BUILD_PRAGMAS if pragmas is None else pragmas
+        self._saved = {
+            name: self.conn.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in self.pragmas
+        }
+        for name, value in self.pragmas.items():
+            self.conn.execute(f"PRAGMA {name}={value}")
+
+    def upsert(self, table: str, rows: list[dict[str, any]]) -> int:
+        """
+        Insert or update *rows* in *table*, checked and converted by the
+        table's TableLoader. Columns a row leaves out are written as NULL,
+        matching what `insert_many` produces.
+
+        Returns:
+          Number of rows written.
+        """
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        compiled, params = _compile_rows(table, rows, self.conn)
+        self.conn.executemany(compiled.upsert_sql, params)
+        telemetry.record_insert(table, len(rows), time.perf_counter() - started)
+        return len(rows)
+
+    def columns(self, table: str) -> list[str]:
+        """*table*'s columns in declared order (the order tuples must use)."""
+        return loader(table, self.conn).columns
+
+    def buffer(self, table: str) -> "RowBuffer":
+        """An empty RowBuffer bound to *table*'s current column order."""
+        return RowBuffer(table, self.columns(table))
+
+    def write(self, buf: "RowBuffer") -> int:
+        """
+        Upsert everything in *buf*, checked and converted like upsert()'s
+        rows (TableLoader.fix). Tuples added before the table gained columns
+        are shorter than the row; the missing tail is written as NULL.
+
+        Returns:
+          Number of rows written.
+        """
+        if not buf.rows:
+            return 0
+        started = time.perf_counter()
+        compiled = loader(buf.table, self.conn)
+        self.conn.executemany(compiled.upsert_sql, compiled.fix(buf.rows))
+        telemetry.record_insert(buf.table, len(buf.rows), time.perf_counter() - started)
+        return len(buf.rows)
+
+    @property
+    def changes(self) -> int:
+        """Rows inserted, updated or deleted on this session so far
+        (UPSERTs whose row_hash matched count as nothing)."""
+        return self.conn.total_changes
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Run arbitrary SQL (e.g. DELETEs) inside the session's transaction."""
+        return self.conn.execute(sql, params)
+
+    def add_columns_if_missing(self, table: str, columns: dict[str, str]) -> None:
+        """The module-level helper on this session's connection (and its
+        column registry)."""
+        add_columns_if_missing(table, columns, self.conn)
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def rollback(self) -> None:
+        """Discard everything written since the last commit()."""
+        self.conn.rollback()
+
+    def close(self) -> None:
+        """Commit, restore the PRAGMAs found on open, and close."""
+        self.conn.commit()
+        for name, value in self._saved.items():
+            self.conn.execute(f"PRAGMA {name}={value}")
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.conn.rollback()
+        self.close()
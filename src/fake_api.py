@@ -0,0 +1,289 @@
+# src/fake_api.py
+"""
+Local stand-in for the Duke curriculum API, for tests and offline benchmarks.
+
+Serves the endpoints src/api_client.py calls (list_of_values, courses/subject,
+classes/strm/…/crse_id, courses/crse_id) from a deterministic synthetic
+catalog and/or payloads recorded in a ResponseCache file, with optional
+latency and error injection.
+
+    python -m src.fake_api --port 8001 --subjects 40 --latency 0.02
+    python -m src.fake_api --port 8001 --recorded data/api_cache.db
+    DUKE_API_BASE_URL=http://127.0.0.1:8001 python scripts/create_db.py
+
+A recording is just a response cache: run create_db.py once against the
+real API with `--cache on` and point `--recorded` at the cache file.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+from flask import Flask, Response, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from config.settings import BASE_URL
+from src.api_client import ResponseCache
+
+
+def _lov(values):
+    return {"scc_lov_resp": {"lovs": {"lov": {"values": {"value": values}}}}}
+
+
+class SyntheticCatalog:
+    """
+    Deterministic fake catalog shaped like the real API's payloads.
+
+    Args:
+      subjects: Number of subjects (codes S000, S001, …).
+      courses:  Courses listed per subject.
+      terms:    Term codes, oldest first.
+      sections: Sections (meeting pattern + instructor) per class.
+      seed:     Seed for which terms each course is offered in.
+      crosslist: How many of each subject's courses are also listed under
+                the next subject (same crse_id, as with real cross-listings).
+    """
+
+    def __init__(self, subjects: int = 10, courses: int = 20,
+                 terms: tuple[str, ...] = ("1930", "1935", "1940"),
+                 sections: int = 2, seed: int = 0, crosslist: int = 0):
+        self.subjects = [f"S{i:03d}" for i in range(subjects)]
+        self.courses = courses
+        self.terms = list(terms)
+        self.sections = sections
+        self.seed = seed
+        self.crosslist = crosslist
+
+    def course_ids(self, subject: str) -> list[str]:
+        n = int(subject[1:])
+        own = [f"{n:03d}{j:03d}" for j in range(self.courses)]
+        borrowed = [f"{n - 1:03d}{j:03d}" for j in range(self.crosslist)] if n else []
+        return own + borrowed
+
+    def offered(self, crse_id: str, strm: str) -> bool:
+        """Roughly three quarters of courses run in any given term."""
+        return random.Random(f"{self.seed}:{crse_id}:{strm}").random() < 0.75
+
+    def lookup(self, path: str, params: dict | None = None) -> bytes | None:
+        """Body for *path*, or None if this catalog has no such resource."""
+        parts = path.strip("/").split("/")
+        payload = None
+        if parts[:2] == ["list_of_values", "fieldname"] and len(parts) == 3:
+            payload = self._list_of_values(parts[2])
+        elif parts[:2] == ["courses", "subject"] and len(parts) == 3:
+            payload = self._course_listing(parts[2])
+        elif parts[:1] == ["classes"] and len(parts) == 5 and parts[1] == "strm" and parts[3] == "crse_id":
+            payload = self._classes(parts[2], parts[4])
+        elif parts[:2] == ["courses", "crse_id"] and len(parts) == 5 and parts[3] == "crse_offer_nbr":
+            payload = self._course_offering(parts[2], parts[4])
+        return None if payload is None else json.dumps(payload).encode()
+
+    def _list_of_values(self, field):
+        if field == "STRM":
+            return _lov([{"code": t, "desc": f"Term {t}"} for t in self.terms])
+        if field == "SUBJECT":
+            return _lov([{"code": s, "desc": f"Subject {s}"} for s in self.subjects])
+        if field == "ACAD_CAREER":
+            return _lov([{"code": "UGRD", "desc": "Undergraduate"},
+                         {"code": "GRAD", "desc": "Graduate"}])
+        return None
+
+    def _course_listing(self, subject):
+        if subject not in self.subjects:
+            return None
+        summaries = [{
+            "crse_id": cid,
+            "crse_offer_nbr": "1",
+            "subject": subject,
+            "catalog_nbr": str(100 + j),
+            "course_title_long": f"{subject} Course {100 + j}",
+            "ssr_crse_typoff_cd": "FALL",
+            "effdt": "2020-01-01",
+        } for j, cid in enumerate(self.course_ids(subject))]
+        return {"ssr_get_courses_resp": {"course_search_result": {"subjects": {"subject": {
+            "subject": subject, "course_summaries": {"course_summary": summaries}}}}}}
+
+    def _attributes(self, crse_id):
+        n = int(crse_id[-3:])
+        return {"course_attribute": [
+            {"crse_attr_lov_descr": "Curriculum Areas of Knowledge",
+             "crse_attr_value_lov_descr": ("(ALP) Arts, Literature & Performance",
+                                           "(NS) Natural Sciences",
+                                           "(QS) Quantitative Studies")[n % 3]},
+            {"crse_attr_lov_descr": "Curriculum Modes of Inquiry",
+             "crse_attr_value_lov_descr": ("(CCI) Cross Cultural Inquiry",
+                                           "(STS) Science, Technology, and Society",
+                                           "(W) Writing", "(R) Research")[n % 4]},
+        ]}
+
+    def _classes(self, strm, crse_id):
+        if strm not in self.terms or not self.offered(crse_id, strm):
+            return {"ssr_get_classes_resp": {"search_result": {}}}
+        patterns = [{
+            "class_section": f"{s + 1:02d}",
+            "ssr_mtg_loc_long": f"Building {s + 1}",
+            "ssr_mtg_sched_long": ("MoWe 10:05AM - 11:20AM", "TuTh 1:25PM - 2:40PM")[s % 2],
+            "class_instructors": {"class_instructor": {
+                "name_display": f"Instructor {crse_id[-3:]}{s}",
+                "first_name": "Instructor",
+                "last_name": f"{crse_id[-3:]}{s}",
+            }},
+        } for s in range(self.sections)]
+        listing = {
+            "crse_id": crse_id,
+            "crse_offer_nbr": "1",
+            "strm": strm,
+            "ssr_descrlong": f"Synthetic course {crse_id} in term {strm}.",
+            "consent_lov_descr": "No Special Consent Required",
+            "acad_career": "UGRD",
+            "ssr_component": "LEC",
+            "course_attributes": self._attributes(crse_id),
+            "classes_summary": {"class_summary": {
+                "classes_meeting_patterns": {"class_meeting_pattern": patterns}}},
+        }
+        return {"ssr_get_classes_resp": {"search_result": {"subjects": {"subject": listing}}}}
+
+    def _course_offering(self, crse_id, crse_offer_nbr):
+        return {"ssr_get_course_offering_resp": {"course_offering_result": {"course_offering": {
+            "crse_id": crse_id,
+            "crse_offer_nbr": crse_offer_nbr,
+            "descrlong": f"Synthetic course {crse_id}.",
+            "rqrmnt_group_descr": None,
+            "course_attributes": self._attributes(crse_id),
+        }}}}
+
+
+class RecordedFixtures:
+    """
+    Serve payloads captured in a ResponseCache file (TTL ignored).
+    Cache entries are keyed by API root, so *recorded_from* must be the
+    base URL the recording was made against (default: the real API).
+    """
+
+    def __init__(self, path: str, recorded_from: str = BASE_URL):
+        self.cache = ResponseCache(path)
+        self.recorded_from = recorded_from
+
+    def lookup(self, path: str, params: dict | None = None) -> bytes | None:
+        return self.cache.get(path, params, ignore_ttl=True, base_url=self.recorded_from)
+
+
+def create_app(*sources, latency: float = 0.0, jitter: float = 0.0,
+               error_rate: float = 0.0, error_status: int = 503,
+               token: str | None = None, seed: int | None = None) -> Flask:
+    """
+    Flask app answering every GET from the first source that knows the path.
+
+    Args:
+      sources:      Objects with .lookup(path, params) -> bytes | None,
+                    tried in order (e.g. recorded first, synthetic fallback).
+      latency:      Seconds added to every response.
+      jitter:       Extra uniform random delay of up to this many seconds.
+      error_rate:   Fraction of requests answered with `error_status`
+                    (sent with `Retry-After: 0` so clients retry at once).
+      error_status: Status code used for injected errors.
+      token:        If set, requests without this access_token get a 401.
+      seed:         Seed for jitter and error injection.
+
+    Request counts are kept in `app.config["STATS"]` and served at /_stats.
+    """
+    app = Flask(__name__)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    stats = Counter()
+    app.config["STATS"] = stats
+
+    @app.get("/_stats")
+    def _stats():
+        return dict(stats)
+
+    @app.get("/<path:path>")
+    def serve(path):
+        path = "/" + path
+        params = {k: v for k, v in request.args.items() if k != "access_token"}
+        endpoint = "/".join(path.split("/")[:3])
+        stats["requests"] += 1
+        stats[endpoint] += 1
+
+        with rng_lock:
+            delay = latency + (rng.uniform(0, jitter) if jitter else 0.0)
+            fail = error_rate and rng.random() < error_rate
+        if delay:
+            time.sleep(delay)
+        if token is not None and request.args.get("access_token") != token:
+            stats["unauthorized"] += 1
+            return {"error": "invalid access_token"}, 401
+        if fail:
+            stats["errors_injected"] += 1
+            return {"error": "injected"}, error_status, {"Retry-After": "0"}
+
+        for source in sources:
+            body = source.lookup(path, params)
+            if body is not None:
+                return Response(body, mimetype="application/json")
+        stats["not_found"] += 1
+        return {"error": f"no fixture for {path}"}, 404
+
+    return app
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_server(app: Flask, host: str = "127.0.0.1", port: int = 0):
+    """
+    Serve *app* from a background thread.
+
+    Returns:
+      (server, base_url); call server.shutdown() when done.
+    """
+    server = make_server(host, port, app, threaded=True, request_handler=_KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Serve a fake Duke curriculum API.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--recorded", default=None,
+                    help="response-cache file to serve recorded payloads from")
+    ap.add_argument("--recorded-from", default=BASE_URL,
+                    help="API root the recording was made against (default: $DUKE_API_BASE_URL "
+                         "or the Duke streamer)")
+    ap.add_argument("--no-synthetic", action="store_true",
+                    help="serve only recorded payloads (404 for anything else)")
+    ap.add_argument("--subjects", type=int, default=10)
+    ap.add_argument("--courses", type=int, default=20, help="courses per subject")
+    ap.add_argument("--terms", default="1930,1935,1940", help="comma-separated term codes")
+    ap.add_argument("--sections", type=int, default=2)
+    ap.add_argument("--crosslist", type=int, default=0,
+                    help="courses per subject also listed under the next subject")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra random delay, up to this many seconds")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    ap.add_argument("--error-status", type=int, default=503)
+    ap.add_argument("--token", default=None, help="require this access_token")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    sources = []
+    if args.recorded:
+        sources.append(RecordedFixtures(args.recorded, args.recorded_from))
+    if not args.no_synthetic:
+        sources.append(SyntheticCatalog(args.subjects, args.courses,
+                                        tuple(args.terms.split(",")), args.sections,
+                                        crosslist=args.crosslist))
+    app = create_app(*sources, latency=args.latency, jitter=args.jitter,
+                     error_rate=args.error_rate, error_status=args.error_status,
+                     token=args.token, seed=args.seed)
+    server = make_server(args.host, args.port, app, threaded=True,
+                         request_handler=_KeepAliveHandler)
+    print(f"🧪 Fake curriculum API on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,141 @@
+# src/fake_rmp.py
+"""
+Local stand-in for RateMyProfessors, for testing and benchmarking
+scripts/scrape_rmp.py offline.
+
+Serves the two pages the scraper visits — the school search
+(/search/professors/<school>?q=<name>) and a professor page
+(/professor/<id>) — as static HTML using the same styled-component class
+names as the real site, so the Chrome and HTTP backends parse it alike.
+
+    python -m src.fake_rmp --port 8002 --professors 500
+    python scripts/scrape_rmp.py --backend http --base-url http://127.0.0.1:8002
+"""
+import html
+import random
+import time
+from collections import Counter
+
+from flask import Flask, Response, request
+
+
+TAG_POOL = ("Tough grader", "Caring", "Amazing lectures", "Lots of homework",
+            "Clear grading criteria", "Inspirational", "Test heavy", "Respected")
+
+_PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="/static/rmp.css"></head>
+<body><div id="root">{body}</div></body></html>"""
+
+
+def synthetic_professors(n: int = 50, seed: int = 0) -> dict[str, dict]:
+    """
+    Deterministic ratings for *n* fake professors, keyed by name.
+
+    Names match the fake curriculum API's instructors ("Instructor 0000",
+    "Instructor 0001", …) so a catalog built from it can be scraped too.
+    """
+    rng = random.Random(seed)
+    profs = {}
+    for i in range(n):
+        name = f"Instructor {i // 2:03d}{i % 2}"
+        profs[name] = {
+            "professor": name,
+            "avg_rating": round(rng.uniform(1, 5), 1),
+            "avg_difficulty": round(rng.uniform(1, 5), 1),
+            "would_take_again_pct": float(rng.randint(0, 100)) if rng.random() < 0.9 else None,
+            "tags": ", ".join(rng.sample(TAG_POOL, rng.randint(0, 3))) or None,
+        }
+    return profs
+
+
+def render_search(matches: list[tuple[int, str]]) -> str:
+    cards = "".join(
+        f'<a class="TeacherCard__StyledTeacherCard-syjs0d-0 dLJIlx" href="/professor/{pid}">'
+        f'<div class="CardName__StyledCardName-sc-1gyrgim-0 cJdVEK">{html.escape(name)}</div></a>'
+        for pid, name in matches)
+    return _PAGE.format(title="Search results",
+                        body=f'<div class="SearchResultsPage__StyledResultsWrapper-vhbycj-4">{cards}</div>')
+
+
+def render_professor(record: dict) -> str:
+    def fmt(v, suffix=""):
+        return "N/A" if v is None else f"{v:g}{suffix}"
+    feedback = "".join(
+        '<div class="FeedbackItem__StyledFeedbackItem-uof32n-0 dTFbKx">'
+        f'<div class="FeedbackItem__FeedbackNumber-uof32n-1 kkESWs">{value}</div>'
+        f'<div class="FeedbackItem__FeedbackDescription-uof32n-2 hddnCs">{label}</div></div>'
+        for value, label in ((fmt(record["would_take_again_pct"], "%"), "Would take again"),
+                             (fmt(record["avg_difficulty"]), "Level of Difficulty")))
+    tags = "".join(f'<span class="Tag-bs9vf4-0 hHOVKF">{html.escape(t)}</span>'
+                   for t in (record["tags"] or "").split(", ") if t)
+    body = (
+        f'<div class="NameTitle__Name-dowf0z-0 cfjPUG"><span>{html.escape(record["professor"])}</span></div>'
+        '<div class="RatingValue__AvgRating-qw8sqy-1 gIgExh">'
+        f'<div class="RatingValue__Numerator-qw8sqy-2 liyUjw">{fmt(record["avg_rating"])}</div>'
+        '<div class="RatingValue__Denominator-qw8sqy-4 UqFtE">/ 5</div></div>'
+        f'<div class="TeacherFeedback__StyledTeacherFeedback-gzhlj7-0 cxVUGc">{feedback}</div><br>'
+        f'<div class="TeacherTags__TagsContainer-sc-16vmh1y-0 dbxJaW">{tags}</div>'
+    )
+    return _PAGE.format(title=html.escape(record["professor"]), body=body)
+
+
+def create_app(professors: dict[str, dict], latency: float = 0.0,
+               school_id: str = "1350") -> Flask:
+    """
+    Flask app serving RMP-shaped search and professor pages.
+
+    Args:
+      professors: name → record (professor, avg_rating, avg_difficulty,
+                  would_take_again_pct, tags), e.g. synthetic_professors().
+      latency:    Seconds added to every response.
+      school_id:  The only school whose search returns results.
+
+    Request counts are kept in `app.config["STATS"]`.
+    """
+    app = Flask(__name__)
+    ids = {name: 1000 + i for i, name in enumerate(professors)}
+    by_id = {pid: professors[name] for name, pid in ids.items()}
+    stats = Counter()
+    app.config["STATS"] = stats
+
+    @app.get("/search/professors/<school>")
+    def search(school):
+        stats["search"] += 1
+        if latency:
+            time.sleep(latency)
+        q = request.args.get("q", "").strip().lower()
+        matches = [(pid, name) for name, pid in ids.items()
+                   if school == school_id and q and q in name.lower()]
+        return Response(render_search(matches), mimetype="text/html")
+
+    @app.get("/professor/<int:pid>")
+    def professor(pid):
+        stats["professor"] += 1
+        if latency:
+            time.sleep(latency)
+        if pid not in by_id:
+            return Response(_PAGE.format(title="Not found", body="Page not found"), 404)
+        return Response(render_professor(by_id[pid]), mimetype="text/html")
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    from werkzeug.serving import make_server
+    from src.fake_api import _KeepAliveHandler
+
+    ap = argparse.ArgumentParser(description="Serve a fake RateMyProfessors.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8002)
+    ap.add_argument("--professors", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    app = create_app(synthetic_professors(args.professors, args.seed), latency=args.latency)
+    server = make_server(args.host, args.port, app, threaded=True,
+                         request_handler=_KeepAliveHandler)
+    print(f"🧪 Fake RateMyProfessors on http://{args.host}:{args.port}")
+    server.serve_forever()
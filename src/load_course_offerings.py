@@ -1,7 +1,7 @@
 # src/load_course_offerings.py
 
-from src.api_client       import get_all_subjects, get_course_listings, get_course_offering_metadata
-from src.db               import create_table, insert_many
+from src.api_client       import get_all_subjects, get_all_terms, get_course_listings, get_course_offering_metadata
+from src.db               import create_table, create_index, insert_many
 
 # ─── 1. Define your tables ─────────────────────────────────────────────────────
 def create_all_tables():
@@ -44,6 +44,15 @@ def create_all_tables():
         "component": "TEXT",
         "PRIMARY KEY (crse_id, strm, section)": ""
     })
+    # single-term lookups filter on strm first
+    create_index("course_offerings", ["strm", "crse_id"])
+    create_index("sections", ["strm", "crse_id"])
+
+def latest_terms(n=1):
+    """The *n* most recent term codes from the API (oldest first)."""
+    values = (get_all_terms().get("scc_lov_resp", {}).get("lovs", {})
+              .get("lov", {}).get("values", {}).get("value", []))
+    return [v.get("code") for v in values][-n:]
 
 # ─── 2. Parse course‐list response ───────────────────────────────────────────────
 def parse_course_list(data, dept_code):
@@ -122,31 +131,37 @@ def parse_offering_and_sections(raw, strm_code):
     return offering_row, section_rows
 
 # ─── 4. Master loader ──────────────────────────────────────────────────────────
-def load_department(dept_code, strm_code="1940"):
+def load_department(dept_code, strm_codes=None):
+    """Load one department's courses plus their offerings/sections in each
+    of *strm_codes* (default: the most recent term)."""
+    strm_codes = strm_codes or latest_terms()
+
     # 4.1 pull & insert courses
     clist = get_course_listings(dept_code)
     courses = parse_course_list(clist, dept_code)
     n1 = insert_many("courses", courses)
 
-    # 4.2 pull & insert offerings + sections
+    # 4.2 pull & insert offerings + sections, keyed by term
     offs, secs = [], []
-    for c in courses:
-        raw = get_course_offering_metadata(c["id"], strm_code)
-        if not raw: 
-            continue
-        o, s_rows = parse_offering_and_sections(raw, strm_code)
-        offs.append(o)
-        secs.extend(s_rows)
+    for strm_code in strm_codes:
+        for c in courses:
+            raw = get_course_offering_metadata(strm_code, c["id"])
+            if not raw:
+                continue
+            o, s_rows = parse_offering_and_sections(raw, strm_code)
+            offs.append(o)
+            secs.extend(s_rows)
 
     n2 = insert_many("course_offerings", offs)
     n3 = insert_many("sections", secs)
 
-    print(f"✅ {dept_code}: {n1} courses, {n2} offerings, {n3} sections")
+    print(f"✅ {dept_code}: {n1} courses, {n2} offerings, {n3} sections "
+          f"across {len(strm_codes)} term(s)")
 
 # ─── 5. Run it ─────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     create_all_tables()
 
     # example: load just CSC to start
-    load_department("COMPSCI", strm_code="1940")
+    load_department("COMPSCI", latest_terms())
     # repeat for other departments as needed
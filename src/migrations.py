@@ -0,0 +1,175 @@
+# src/migrations.py
+"""
+Versioned schema changes, recorded in each database's PRAGMA user_version.
+
+The catalog (courses.db) and the user database (users.db) each have their
+own sequence. Pending migrations run in order, in one transaction with the
+version bump, so a failure leaves the file exactly as it was. Once a file
+is current, migrating it is a single PRAGMA read, so the app can call
+migrate_users() at start-up in every worker. The live catalog is attached
+immutable and never changed in place; create_db.py runs migrate_catalog()
+on each new snapshot before swapping it in.
+
+    python -m src.migrations                       # users.db next to data/courses.db
+    python -m src.migrations --users-db path.db --db catalog.db
+    python -m src.migrations --catalog staging.db  # a snapshot, before it goes live
+"""
+import sqlite3
+
+from src import db
+from src.db import create_table, create_index, add_columns_if_missing, attach_catalog
+from src.schema import (
+    USER_TABLES, USER_PROFILE_COLUMNS, PROFESSOR_RATINGS_SCHEMA, link_professors,
+)
+
+# Indexes behind the app's joins and filters, as (table, columns).
+# tests/test_query_plans.py fails if an endpoint falls back to a full scan.
+CATALOG_INDEXES = [
+    ("courses",           ["subject"]),
+    ("course_offerings",  ["crse_id", "strm"]),
+    ("course_offerings",  ["strm", "crse_id"]),
+    ("class_listings",    ["crse_id", "strm"]),
+    ("class_listings",    ["strm", "crse_id"]),
+    ("meeting_patterns",  ["class_id"]),
+    ("instructors",       ["class_id"]),
+]
+USER_INDEXES = [
+    ("reviews",           ["course_id", "timestamp"]),
+    ("reviews",           ["timestamp"]),
+]
+
+# Tables that moved from the catalog into users.db
+MOVED_TABLES = [*USER_TABLES, "professor_ratings"]
+
+def _tables(conn, schema="main"):
+    return {r[0] for r in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type='table'")}
+
+def _columns(conn, table, schema="main"):
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+# --------------------
+# Catalog
+# --------------------
+def _catalog_indexes(conn):
+    present = _tables(conn)
+    for table, columns in CATALOG_INDEXES:
+        if table in present:
+            create_index(table, columns, conn=conn)
+
+# (version, description, step(conn)); append only, never renumber
+CATALOG_MIGRATIONS = [
+    (1, "integer professor ids",       lambda conn: link_professors(conn, ["instructors"])),
+    (2, "indexes for the app's joins", _catalog_indexes),
+]
+
+# --------------------
+# User database
+# --------------------
+def _user_tables(conn):
+    for table, schema in USER_TABLES.items():
+        create_table(table, schema, conn)
+    add_columns_if_missing("users", USER_PROFILE_COLUMNS, conn)
+
+def _professor_ratings(conn):
+    create_table("professor_ratings", PROFESSOR_RATINGS_SCHEMA, conn)
+
+def _copy_from_catalog(conn):
+    # user data written before the split sits in the catalog; copy it once
+    # (the next catalog build leaves it behind)
+    if "catalog" not in {r[1] for r in conn.execute("PRAGMA database_list")}:
+        return
+    legacy = _tables(conn, "catalog")
+    for table in MOVED_TABLES:
+        if table not in legacy or conn.execute(f"SELECT 1 FROM main.{table}").fetchone():
+            continue
+        keep = set(_columns(conn, table))
+        cols = ", ".join(c for c in _columns(conn, table, "catalog") if c in keep)
+        conn.execute(f"INSERT INTO main.{table} ({cols}) SELECT {cols} FROM catalog.{table}")
+
+def _user_indexes(conn):
+    link_professors(conn, ["professor_ratings"])
+    for table, columns in USER_INDEXES:
+        create_index(table, columns, conn=conn)
+
+USER_MIGRATIONS = [
+    (1, "user tables and profile columns",   _user_tables),
+    (2, "professor_ratings",                 _professor_ratings),
+    (3, "copy user data out of the catalog", _copy_from_catalog),
+    (4, "rating professor ids and indexes",  _user_indexes),
+]
+
+CATALOG_VERSION = CATALOG_MIGRATIONS[-1][0]
+USERS_VERSION = USER_MIGRATIONS[-1][0]
+
+def version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _migrate(conn, migrations, before=None) -> list[int]:
+    try:
+        if version(conn) >= migrations[-1][0]:
+            return []
+        if before is not None:
+            before(conn)                # outside the transaction (PRAGMAs, ATTACH)
+        # one process migrates; any other waits here, then finds nothing to do
+        conn.execute("BEGIN IMMEDIATE")
+        applied = []
+        for number, _, step in migrations:
+            if number <= version(conn):
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            applied.append(number)
+        conn.commit()
+        return applied
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def migrate_catalog(path: str | None = None) -> list[int]:
+    """
+    Apply pending catalog migrations to the snapshot at *path*
+    (default: DB_FILE). Only for files nobody has attached yet.
+
+    Returns:
+      Versions applied by this call (empty if the file was current).
+    """
+    return _migrate(sqlite3.connect(path or db.DB_FILE, timeout=30), CATALOG_MIGRATIONS)
+
+def migrate_users(path: str | None = None, catalog: str | None = None) -> list[int]:
+    """
+    Apply pending migrations to the user database at *path* (default:
+    users_db_file(catalog)), switching it to WAL. User data still in the
+    catalog at *catalog* (default: DB_FILE) is copied over the first time.
+
+    Returns:
+      Versions applied by this call (empty if the file was current).
+    """
+    def before(conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        attach_catalog(conn, catalog)
+    conn = sqlite3.connect(path or db.users_db_file(catalog), timeout=30)
+    return _migrate(conn, USER_MIGRATIONS, before)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    ap.add_argument("--db", default=None, help="catalog the user database goes with (default: data/courses.db)")
+    ap.add_argument("--users-db", default=None, help="user database (default: users.db next to the catalog)")
+    ap.add_argument("--catalog", default=None, help="migrate this catalog snapshot instead")
+    args = ap.parse_args()
+
+    if args.catalog:
+        path, migrations = args.catalog, CATALOG_MIGRATIONS
+        applied = migrate_catalog(path)
+    else:
+        path, migrations = args.users_db or db.users_db_file(args.db), USER_MIGRATIONS
+        applied = migrate_users(path, args.db)
+    for number, name, _ in migrations:
+        if number in applied:
+            print(f"🛠️  {number}: {name}")
+    print(f"✅ {path} is at schema version {migrations[-1][0]}")
@@ -1,3 +1,8 @@
+import re
+import hashlib
+import unicodedata
+from collections import defaultdict
+
 from .api_client import get_all_acad_car, get_all_subjects, get_all_terms, get_course_listings
 
 def parse_departments(): 
@@ -81,4 +86,255 @@ def parse_course_listings():
         if c.get("subject") and c.get("catalog_nbr")
     ]
 
-    return course_values
\ No newline at end of file
+    return course_values
+
+
+# ───── catalog payloads → table rows (scripts/create_db.py) ─────
+# Pure functions of the API payloads, so the ingest pipeline can run them
+# in worker processes.
+
+def sql_safe(name: str) -> str:
+    """
+    Turn arbitrary text into a valid SQLite column name.
+      • replace spaces, hyphens, parens, etc. with underscores
+      • lower-case everything
+      • if it would start with a digit, prefix with “_”
+    """
+    col = re.sub(r"\W+", "_", name.strip().lower())
+    return f"_{col}" if col and col[0].isdigit() else col
+
+
+def _is_attr_dict(x):
+    """Return True only if *x* looks like a course-attribute dict."""
+    return isinstance(x, dict) and "crse_attr_lov_descr" in x
+
+def _as_list(node):
+    """Return *node* itself if it is already a list,
+    wrap it in a one-element list if it is a dict,
+    or return an empty list if it is None / missing."""
+    if node is None:
+        return []
+    return node if isinstance(node, list) else [node]
+
+# ───── safe nested lookup ───────────────────────────────────
+def _dig(node, *keys):
+    """
+    Traverse `node` (a dict or None) through the given key path.
+    If any level is None/missing, return None instead of raising.
+    """
+    for k in keys:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(k)
+    return node
+
+def _first_listing(data):
+    """Return the first class-listing dict in a metadata payload, or None."""
+    sr = data.get("ssr_get_classes_resp", {}).get("search_result", {})
+    subjects_block = sr.get("subjects") or {}
+    items = subjects_block.get("subject")
+    if isinstance(items, dict): items = [items]
+    entries = items or []
+    return entries[0] if entries else None
+
+
+CATALOG_ROW_KEYS = ("courses", "offerings", "attrs", "classes", "meetings", "instructors", "professors")
+
+def name_key(name):
+    """Normalised professor name: '  José  García-López ' → 'jose garcia lopez'."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", ascii_name.lower()).split())
+
+def professor_id(key):
+    """
+    Integer id for a name_key. Derived from the key itself, so every build,
+    shard and scraper run assigns the same id without coordinating.
+    """
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1      # fits SQLite's signed INTEGER
+
+
+def term_rows(rows, columns, term_code, course, data, details):
+    """Append one term's offering, attribute, class, meeting and instructor
+    rows for *course* to *rows*; new attribute column names go in *columns*."""
+    cid = course.get("crse_id")
+    lst = _first_listing(data)
+    if lst is None:
+        return
+
+    off_nbr = lst.get("crse_offer_nbr")
+    off_id = f"{cid}_{off_nbr}"
+    rows["offerings"].append({
+        "offering_id": off_id,
+        "strm": term_code,
+        "crse_id": cid,
+        "descrlong": lst.get("ssr_descrlong"),
+        "consent_lov_descr": lst.get("consent_lov_descr"),
+        "acad_career": lst.get("acad_career"),
+        "ssr_component": lst.get("ssr_component"),
+    })
+
+    # ──────────────────────────────────────────────────────────────
+    # 1) attributes that live in the class-listing (unchanged)
+    # 2) attributes that live in the course-details endpoint
+    #    → guarantees we pick up *every* crse_attr_lov_descr
+    # ──────────────────────────────────────────────────────────────
+    amap = defaultdict(list)
+    src_attrs = _as_list(
+        _dig(lst, "course_attributes", "course_attribute"))
+
+    src_attrs += _as_list(
+        _dig(data,
+            "ssr_get_course_offering_resp",
+            "course_offering_result",
+            "course_offering",
+            "course_attributes",
+            "course_attribute"))
+
+    # ── merge attributes that appear only in the details payload ─────
+    src_attrs += _as_list(
+        _dig(
+            details,
+            "ssr_get_course_offering_resp",
+            "course_offering_result",
+            "course_offering",
+            "course_attributes",
+            "course_attribute"
+        )
+    )
+    # build the pivot dict and remember new column names
+    for a in _as_list(src_attrs):
+        if not _is_attr_dict(a):
+            continue                        # skip stray strings / nulls
+
+        k_raw = a["crse_attr_lov_descr"].strip()
+        v_raw = a["crse_attr_value_lov_descr"].strip()
+        if v_raw.lower() == "foreign languages curriculum course":
+            v_raw = "(FL) Foreign Languages"
+
+        if not (k_raw and v_raw):
+            continue
+
+        k = sql_safe(k_raw)                # legal SQLite identifier
+        amap[k].append(v_raw)
+        columns.add(k)
+
+    course_off = (
+        _dig(details,                       # 1️⃣ preferred – full details call
+            "ssr_get_course_offering_resp",
+            "course_offering_result",
+            "course_offering")
+        or
+        _dig(data,                          # 2️⃣ fallback – metadata call
+            "ssr_get_course_offering_resp",
+            "course_offering_result",
+            "course_offering")
+        or {}
+    )
+
+    descr_txt = (
+        lst.get("ssr_descrlong")            # value from class-listing
+        or course_off.get("descrlong")      # fallback to course-offering
+    )
+
+    prereq_txt = (
+        lst.get("rqrmnt_group_descr")       # present in some class-listings
+        or course_off.get("rqrmnt_group_descr")
+    )
+
+    rows["attrs"].append({
+        "offering_id":          off_id,
+        "strm":                 term_code,
+        "descrlong":            descr_txt,
+        "rqrmnt_group_descr":   prereq_txt,
+        **{k: ", ".join(v) for k, v in amap.items()}
+    })
+
+    # class listing
+    cls_id = f"{off_id}_{term_code}"
+    rows["classes"].append({"class_id": cls_id, "strm": term_code, "crse_id": cid, "crse_offer_nbr": off_nbr})
+    # ------------- meeting patterns  +  instructors -------------
+    class_summaries = _as_list(
+        lst.get("classes_summary", {}).get("class_summary")
+    )
+
+    seen = set()                            # a section's instructor repeats per meeting pattern
+    for cs in class_summaries:
+        pats = _as_list(_dig(cs, "classes_meeting_patterns", "class_meeting_pattern"))
+
+        for p in pats:
+            # ── meeting row ───────────────────────────────────────
+            rows["meetings"].append({
+                "class_id":           cls_id,
+                "strm":               term_code,
+                "class_section":      p.get("class_section"),
+                "ssr_mtg_loc_long":   p.get("ssr_mtg_loc_long"),
+                "ssr_mtg_sched_long": p.get("ssr_mtg_sched_long"),
+            })
+
+            # ── instructors inside *this* pattern ────────────────
+            for ins in _as_list(
+                        _dig(p, "class_instructors", "class_instructor")   # safe!
+            ):
+                name = ins.get("name_display")
+                if (p.get("class_section"), name) in seen:
+                    continue
+                seen.add((p.get("class_section"), name))
+                key = name_key(name) if name else None
+                pid = professor_id(key) if key else None
+                rows["instructors"].append({
+                    "class_id":     cls_id,
+                    "strm":         term_code,
+                    "class_section":      p.get("class_section"),
+                    "name_display": name,
+                    "last_name":    ins.get("last_name"),
+                    "first_name":   ins.get("first_name"),
+                    "professor_id": pid,
+                })
+                if pid is not None:
+                    rows["professors"].append({
+                        "professor_id": pid,
+                        "name_key":     key,
+                        "name_display": name,
+                        "first_name":   ins.get("first_name"),
+                        "last_name":    ins.get("last_name"),
+                    })
+
+
+def row_hash(row):
+    """
+    Short digest of a row's non-NULL values, keyed by column name, so it
+    doesn't depend on column order or on attribute columns the row lacks.
+    Stored as `row_hash` to let writes and diffs skip unchanged rows.
+    """
+    items = sorted((k, v) for k, v in row.items() if v is not None and k != "row_hash")
+    return hashlib.blake2b(repr(items).encode(), digest_size=8).hexdigest()
+
+def parse_course(code, course, term_payloads):
+    """
+    Turn everything fetched for one course into table rows.
+
+    Args:
+      code:          Subject the course was listed under.
+      course:        Its course_summary from the subject listing.
+      term_payloads: [(term_code, (metadata, details)), …] per term.
+
+    Returns:
+      ({buffer_key: [row, …]}, {attribute column names seen})
+    """
+    rows = {key: [] for key in CATALOG_ROW_KEYS}
+    columns = set()
+    rows["courses"].append({
+        "crse_id": course.get("crse_id"),
+        "subject": code,
+        "course_title_long": course.get("course_title_long"),
+        "catalog_nbr": course.get("catalog_nbr"),
+        "ssr_crse_typoff_cd": course.get("ssr_crse_typoff_cd"),
+    })
+    for term_code, (data, details) in term_payloads:
+        term_rows(rows, columns, term_code, course, data, details)
+    rows["professors"] = list({p["professor_id"]: p for p in rows["professors"]}.values())
+    for batch in rows.values():
+        for row in batch:
+            row["row_hash"] = row_hash(row)
+    return rows, columns
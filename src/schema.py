@@ -1,24 +1,23 @@
 # src/schema.py
 """
-Ensures all tables (and new columns) exist every time the app starts.
-Import and call ensure_schema() at the top of any script that touches
-the SQLite database so you never lose columns.
+Table definitions shared by the app, the catalog build and the scrapers.
+The schema itself is applied by src/migrations.py; ensure_schema() is kept
+for scripts that call it and just runs the pending migrations.
 """
-from src.db import create_table, add_columns_if_missing
+from src.parse_api import name_key, professor_id
 
-def ensure_schema():
-    # base users table (already had these)
-    create_table("users", {
+# Tables the app owns; they live in users.db, never in the rebuilt catalog
+USER_TABLES = {
+    "users": {
         "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
         "name": "TEXT NOT NULL",
         "username": "TEXT UNIQUE NOT NULL",
         "password_hash": "TEXT NOT NULL",
         "year": "TEXT",
         "major": "TEXT"
-    })
-
+    },
     # Reviews table for course reviews
-    create_table("reviews", {
+    "reviews": {
         "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
         "course_id": "TEXT NOT NULL",
         "user_id": "INTEGER NOT NULL",
@@ -26,24 +25,83 @@ def ensure_schema():
         "rating": "INTEGER",
         "difficulty": "INTEGER",
         "timestamp": "TEXT"
-    })
-
+    },
     # Favorites table: mapping user_id to course_id
-    create_table("favorites", {
+    "favorites": {
         "user_id": "INTEGER",
         "course_id": "TEXT",
         "PRIMARY KEY (user_id, course_id)": ""
-    })
+    },
+}
+
+# extra profile fields, added after the first release
+USER_PROFILE_COLUMNS = {
+    "second_major":        "TEXT",
+    "minor":               "TEXT",
+    "advisor_name":        "TEXT",
+    "advisor_email":       "TEXT",
+    "expected_grad_term":  "TEXT",
+    "admit_term":          "TEXT",
+    "gpa":                 "REAL",
+    "units":               "REAL",
+    "profile_pic_path":    "TEXT"
+}
+
+# One row per person; instructors and professor_ratings point here by id.
+PROFESSORS_SCHEMA = {
+    "professor_id": "INTEGER PRIMARY KEY",    # parse_api.professor_id(name_key)
+    "name_key":     "TEXT NOT NULL",
+    "name_display": "TEXT",
+    "first_name":   "TEXT",
+    "last_name":    "TEXT",
+    "row_hash":     "TEXT",
+}
+
+# RateMyProfessors scores, written by scripts/scrape_rmp.py into users.db
+PROFESSOR_RATINGS_SCHEMA = {
+    "professor":            "TEXT PRIMARY KEY",
+    "avg_rating":           "REAL",
+    "avg_difficulty":       "REAL",
+    "would_take_again_pct": "REAL",
+    "tags":                 "TEXT",
+    "scraped_at":           "TEXT",
+    "professor_id":         "INTEGER",
+}
+
+# table → column holding the professor's name
+NAME_COLUMNS = {"instructors": "name_display", "professor_ratings": "professor"}
+
+def link_professors(conn, tables=("instructors", "professor_ratings")):
+    """
+    Make sure every row of *tables* in conn's main database carries its
+    professor_id and every instructor has a `professors` row. Cheap once
+    linked (only NULL ids are looked at); upgrades catalogs and ratings
+    from before the professors table. Runs in the caller's transaction;
+    the caller commits.
+    """
+    for table in tables:
+        name_col = NAME_COLUMNS[table]
+        have = {r[1] for r in conn.execute(f"PRAGMA main.table_info({table})")}
+        if not have:
+            continue
+        if table == "instructors":
+            cols = ", ".join(f"{c} {t}" for c, t in PROFESSORS_SCHEMA.items())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS main.professors ({cols})")
+        if "professor_id" not in have:
+            conn.execute(f"ALTER TABLE main.{table} ADD COLUMN professor_id INTEGER")
+        names = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT {name_col} FROM main.{table} "
+            f"WHERE professor_id IS NULL AND {name_col} IS NOT NULL")]
+        keyed = [(name, name_key(name)) for name in names]
+        keyed = [(name, key, professor_id(key)) for name, key in keyed if key]
+        conn.executemany(f"UPDATE main.{table} SET professor_id=? WHERE {name_col}=? AND professor_id IS NULL",
+                         [(pid, name) for name, _, pid in keyed])
+        if table == "instructors":
+            conn.executemany("INSERT OR IGNORE INTO main.professors (professor_id, name_key, name_display) "
+                             "VALUES (?, ?, ?)", [(pid, key, name) for name, key, pid in keyed])
+        conn.execute(f"CREATE INDEX IF NOT EXISTS main.{table}_professor_id_idx ON {table} (professor_id)")
 
-    # extra profile fields
-    add_columns_if_missing("users", {
-        "second_major":        "TEXT",
-        "minor":               "TEXT",
-        "advisor_name":        "TEXT",
-        "advisor_email":       "TEXT",
-        "expected_grad_term":  "TEXT",
-        "admit_term":          "TEXT",
-        "gpa":                 "REAL",
-        "units":               "REAL",
-        "profile_pic_path":    "TEXT"
-    })
+def ensure_schema(path=None):
+    """Bring the user database at *path* (default: users.db) up to the current schema."""
+    from src.migrations import migrate_users
+    return migrate_users(path)
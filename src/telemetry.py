@@ -0,0 +1,189 @@
+# src/telemetry.py
+"""
+Build telemetry: per-endpoint API call stats, per-table write timings and a
+progress/ETA estimate, summarised as JSON so successive builds can be compared.
+
+Collection is off until start() is called; the api_client and db hooks are
+no-ops until then.
+"""
+import json
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+def endpoint_of(path: str) -> str:
+    """
+    Collapse a request path to its endpoint template, so every course shares
+    one row:  /classes/strm/1940/crse_id/012345 → /classes/strm/{strm}/crse_id/{crse_id}
+    """
+    parts = path.strip("/").split("/")
+    out = parts[:1]
+    for i in range(1, len(parts), 2):
+        out.append(parts[i])
+        if i + 1 < len(parts):
+            out.append("{%s}" % parts[i])
+    return "/" + "/".join(out)
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+def _duration(seconds):
+    seconds = int(seconds)
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}h{m:02d}m" if h else f"{m}m{s:02d}s"
+
+
+class _EndpointStats:
+    __slots__ = ("calls", "errors", "retries", "bytes", "cache_hits", "latencies")
+
+    def __init__(self):
+        self.calls = self.errors = self.retries = self.bytes = self.cache_hits = 0
+        self.latencies = array("d")
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        hist, i = {}, 0
+        for bound in LATENCY_BUCKETS:
+            n = 0
+            while i < len(ordered) and ordered[i] <= bound:
+                n += 1
+                i += 1
+            hist["+Inf" if bound == float("inf") else f"{bound:g}"] = n
+        ms = lambda v: None if v is None else round(v * 1000, 1)
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "latency_ms": {
+                "p50": ms(_percentile(ordered, 0.50)),
+                "p95": ms(_percentile(ordered, 0.95)),
+                "p99": ms(_percentile(ordered, 0.99)),
+                "max": ms(ordered[-1] if ordered else None),
+                "mean": ms(sum(ordered) / len(ordered) if ordered else None),
+            },
+            "latency_histogram": hist,
+        }
+
+
+class Telemetry:
+    """
+    Thread-safe metrics for one build.
+
+    Network calls are recorded by ApiClient.get, table writes by
+    db.insert_many and BulkWriter.upsert; the build adds progress and any
+    extra sections (refresh counts, pipeline stages) itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        self.endpoints = defaultdict(_EndpointStats)
+        self.tables = defaultdict(lambda: {"rows": 0, "batches": 0, "seconds": 0.0})
+        self.subjects_done = 0
+        self.sections = {}
+
+    def record_call(self, path: str, seconds: float, nbytes: int, status: int | None,
+                    retries: int = 0, cached: bool = False) -> None:
+        with self._lock:
+            stats = self.endpoints[endpoint_of(path)]
+            stats.calls += 1
+            if cached:
+                stats.cache_hits += 1
+            else:
+                stats.latencies.append(seconds)
+            stats.bytes += nbytes
+            stats.retries += retries
+            if status is None or status >= 400:
+                stats.errors += 1
+
+    def record_insert(self, table: str, rows: int, seconds: float) -> None:
+        with self._lock:
+            t = self.tables[table]
+            t["rows"] += rows
+            t["batches"] += 1
+            t["seconds"] += seconds
+
+    def subject_done(self, remaining: int) -> str:
+        """Count one finished subject; return a progress line with an ETA."""
+        with self._lock:
+            self.subjects_done += 1
+            done = self.subjects_done
+        elapsed = time.perf_counter() - self._clock
+        rate = done / elapsed if elapsed else 0.0
+        eta = _duration(remaining / rate) if rate and remaining else "0m00s"
+        return (f"⏱️  {done} subjects in {_duration(elapsed)} "
+                f"({rate * 60:.1f}/min), {remaining} left, ETA {eta}")
+
+    def add_section(self, name: str, value) -> None:
+        """Attach extra JSON-able data (e.g. refresh counts) to the summary."""
+        self.sections[name] = value
+
+    def summary(self) -> dict:
+        with self._lock:
+            endpoints = {k: v.summary() for k, v in sorted(self.endpoints.items())}
+            tables = {}
+            for name, t in sorted(self.tables.items()):
+                tables[name] = {**t, "seconds": round(t["seconds"], 4),
+                                "rows_per_sec": round(t["rows"] / t["seconds"]) if t["seconds"] else None}
+        wall = time.perf_counter() - self._clock
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(wall, 2),
+            "subjects_done": self.subjects_done,
+            "api": endpoints,
+            "tables": tables,
+            **self.sections,
+        }
+
+    def report(self) -> list[str]:
+        """Human-readable lines for the end-of-build printout."""
+        lines = []
+        for name, s in self.summary()["api"].items():
+            lat = s["latency_ms"]
+            timing = (f"p50 {lat['p50']}ms p95 {lat['p95']}ms p99 {lat['p99']}ms"
+                      if lat["p50"] is not None else "all cached")
+            lines.append(f"{name}: {s['calls']} calls, {timing}, {s['bytes'] / 1e6:.1f} MB, "
+                         f"{s['errors']} errors, {s['retries']} retries")
+        return lines
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+_active = None
+
+def start() -> Telemetry:
+    """Begin collecting; returns the Telemetry the hooks now report to."""
+    global _active
+    _active = Telemetry()
+    return _active
+
+def stop() -> Telemetry | None:
+    global _active
+    current, _active = _active, None
+    return current
+
+def active() -> Telemetry | None:
+    return _active
+
+def record_call(*args, **kwargs) -> None:
+    if _active is not None:
+        _active.record_call(*args, **kwargs)
+
+def record_insert(table: str, rows: int, seconds: float) -> None:
+    if _active is not None:
+        _active.record_insert(table, rows, seconds)
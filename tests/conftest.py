@@ -0,0 +1,91 @@
+import os
+import sqlite3
+
+import pytest
+
+import src.api_client as api_client
+import src.db
+from src.fake_api import SyntheticCatalog, create_app, start_server
+
+SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "scripts")
+
+
+@pytest.fixture
+def fake_api():
+    """Start a fake API; yields a factory taking create_app() options."""
+    servers = []
+
+    def start(*sources, **opts):
+        app = create_app(*(sources or (SyntheticCatalog(subjects=3, courses=4),)), **opts)
+        server, url = start_server(app)
+        servers.append(server)
+        return app, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def create_db(monkeypatch):
+    """scripts/create_db.py as a module, with the globals main() replaces
+    (the shared API client, DB_FILE) put back afterwards."""
+    monkeypatch.syspath_prepend(SCRIPTS)
+    import create_db
+    monkeypatch.setattr(api_client, "_client", api_client._client)
+    monkeypatch.setattr(src.db, "DB_FILE", src.db.DB_FILE)
+    return create_db
+
+
+@pytest.fixture
+def built_catalog(tmp_path, fake_api, create_db):
+    """
+    Factory: build(*argv, db="courses.db", url=None, **catalog_kw) runs
+    create_db.main() against a fake API serving SyntheticCatalog(**catalog_kw)
+    (or *url*, if given) into tmp_path/db, and returns that path.
+    """
+    def build(*argv, db="courses.db", url=None, **catalog_kw):
+        if url is None:
+            _, url = fake_api(SyntheticCatalog(**catalog_kw))
+        live = str(tmp_path / db)
+        create_db.main(["--base-url", url, "--db", live, "--min-ratio", "0", *argv])
+        return live
+
+    return build
+
+
+# The catalog as built before per-term storage, row hashes and professor
+# ids (the schema of the data/courses.db that is deployed)
+LEGACY_CATALOG = {
+    "courses": "crse_id TEXT PRIMARY KEY, subject TEXT, course_title_long TEXT, catalog_nbr TEXT, "
+               "ssr_crse_typoff_cd TEXT",
+    "course_offerings": "offering_id TEXT PRIMARY KEY, crse_id TEXT, descrlong TEXT, "
+                        "consent_lov_descr TEXT, acad_career TEXT, ssr_component TEXT",
+    "course_attributes": "offering_id TEXT PRIMARY KEY, descrlong TEXT, rqrmnt_group_descr TEXT, "
+                         "curriculum_modes_of_inquiry TEXT, curriculum_areas_of_knowledge TEXT",
+    "class_listings": "class_id TEXT PRIMARY KEY, crse_id TEXT, crse_offer_nbr TEXT",
+    "meeting_patterns": "class_id TEXT, class_section TEXT, ssr_mtg_loc_long TEXT, ssr_mtg_sched_long TEXT",
+    "instructors": "class_id TEXT, class_section TEXT, name_display TEXT, last_name TEXT, first_name TEXT",
+}
+
+
+@pytest.fixture
+def legacy_catalog(tmp_path):
+    """Write a small pre-series catalog (LEGACY_CATALOG) to tmp_path/*name*; returns its path."""
+    def write(name="courses.db"):
+        path = str(tmp_path / name)
+        conn = sqlite3.connect(path)
+        for table, cols in LEGACY_CATALOG.items():
+            conn.execute(f"CREATE TABLE {table} ({cols})")
+        for cid, subject, nbr in (("000000", "S000", "100"), ("999999", "OLD", "101")):
+            conn.execute("INSERT INTO courses VALUES (?, ?, ?, ?, 'FALL')", (cid, subject, f"{subject} {nbr}", nbr))
+            conn.execute("INSERT INTO course_offerings VALUES (?, ?, 'desc', NULL, 'UGRD', 'LEC')", (f"{cid}_1", cid))
+            conn.execute("INSERT INTO course_attributes VALUES (?, 'desc', NULL, '(R)', '(NS)')", (f"{cid}_1",))
+            conn.execute("INSERT INTO class_listings VALUES (?, ?, '1')", (f"{cid}_1_1940", cid))
+            conn.execute("INSERT INTO meeting_patterns VALUES (?, '01', 'Room 1', 'MW 10:00')", (f"{cid}_1_1940",))
+            conn.execute("INSERT INTO instructors VALUES (?, '01', 'Ann Lee', 'Lee', 'Ann')", (f"{cid}_1_1940",))
+        conn.commit()
+        conn.close()
+        return path
+
+    return write
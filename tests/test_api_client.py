@@ -0,0 +1,147 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import telemetry
+from src.api_client import ApiClient, RequestBudget, ResponseCache
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"          # keep-alive
+    failures_left = 0
+
+    def do_GET(self):
+        cls = type(self)
+        if cls.failures_left > 0:
+            cls.failures_left -= 1
+            self._send(503, {"error": "busy"}, {"Retry-After": "0"})
+        else:
+            self._send(200, {"path": self.path})
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    _Handler.failures_left = 0
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_get_sends_token_and_reuses_connection(server):
+    client = ApiClient(base_url=server, token="secret", backoff=0)
+    for _ in range(3):
+        resp = client.get("/courses/subject/COMPSCI")
+        assert resp.json()["path"] == "/courses/subject/COMPSCI?access_token=secret"
+
+    assert client.connection_stats() == {"requests": 3, "connections": 1, "reused": 2}
+
+
+def test_get_retries_503_until_success(server):
+    _Handler.failures_left = 2
+    client = ApiClient(base_url=server, token="t", retries=3, backoff=0)
+    assert client.get("/list_of_values/fieldname/STRM").status_code == 200
+
+
+def test_every_retry_takes_a_token_from_the_budget(server):
+    taken = []
+    class Counting(RequestBudget):
+        def acquire(self, url):
+            taken.append(url)
+            super().acquire(url)
+    _Handler.failures_left = 3
+    client = ApiClient(base_url=server, token="t", retries=5, backoff=0)
+    client.budget = Counting(1000)
+    assert client.get("/list_of_values/fieldname/STRM").status_code == 200
+    assert len(taken) == 4 and client.connection_stats()["requests"] == 4
+
+
+def test_get_returns_last_error_when_retries_exhausted(server):
+    _Handler.failures_left = 5
+    client = ApiClient(base_url=server, token="t", retries=1, backoff=0)
+    assert client.get("/list_of_values/fieldname/STRM").status_code == 503
+
+
+def test_cache_serves_repeat_calls_without_network(server, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    client = ApiClient(base_url=server, token="t1", backoff=0, cache=cache)
+    first = client.get("/courses/subject/MATH").json()
+
+    # a different token must hit the same entry
+    again = ApiClient(base_url=server, token="t2", backoff=0, cache=cache)
+    assert again.get("/courses/subject/MATH").json() == first
+    assert again.connection_stats()["requests"] == 0
+
+
+def test_cache_entries_belong_to_one_api(server, tmp_path):
+    other = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=other.serve_forever, daemon=True).start()
+    try:
+        cache = ResponseCache(str(tmp_path / "cache.db"))
+        ApiClient(base_url=server, token="t", backoff=0, cache=cache).get("/courses/subject/MATH")
+
+        # same path, another server sharing the cache file: fetched, not served from cache
+        client = ApiClient(base_url=f"http://127.0.0.1:{other.server_port}/", token="t",
+                           backoff=0, cache=cache)
+        assert client.get("/courses/subject/MATH").headers.get("X-Cache") is None
+        assert client.connection_stats()["requests"] == 1
+        assert client.get("/courses/subject/MATH").headers["X-Cache"] == "HIT"
+        assert cache.stats()["entries"] == 2
+    finally:
+        other.shutdown()
+        other.server_close()
+
+
+def test_replay_mode_never_touches_network(server, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    client = ApiClient(base_url=server, token="t", cache=cache, cache_mode="replay")
+    resp = client.get("/courses/subject/MATH")
+    assert resp.status_code == 504
+    assert client.connection_stats()["requests"] == 0
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_bytes=250)
+    body = bytes(range(100))            # barely compresses: ~110 bytes stored
+    cache.put("/a", None, body)
+    cache.put("/b", None, body)
+    cache.get("/a")                     # /a is now more recent than /b
+    cache.put("/c", None, body)
+
+    assert cache.get("/a") == body
+    assert cache.get("/b") is None
+    assert cache.stats()["bytes"] <= 250
+
+
+def test_telemetry_records_latency_bytes_and_retries(server):
+    metrics = telemetry.start()
+    try:
+        _Handler.failures_left = 1
+        client = ApiClient(base_url=server, token="t", retries=2, backoff=0)
+        client.get("/classes/strm/1940/crse_id/000001")
+        client.get("/classes/strm/1945/crse_id/000002")
+    finally:
+        telemetry.stop()
+
+    stats = metrics.summary()["api"]["/classes/strm/{strm}/crse_id/{crse_id}"]
+    assert stats["calls"] == 2
+    assert stats["retries"] == 1
+    assert stats["errors"] == 0
+    assert stats["bytes"] > 0
+    assert stats["latency_ms"]["p99"] >= stats["latency_ms"]["p50"] > 0
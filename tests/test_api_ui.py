@@ -0,0 +1,63 @@
+import importlib
+import sqlite3
+
+import pytest
+
+import src.db
+from src.fake_api import SyntheticCatalog
+
+CATALOG = {"subjects": 2, "courses": 8, "terms": ("1935", "1940")}
+
+
+def logged_in(catalog):
+    src.db.set_db_file(catalog)
+    # imported here: the app migrates the users.db next to DB_FILE on import
+    client = importlib.reload(importlib.import_module("src.api_ui")).app.test_client()
+    client.post("/signup", data={"name": "A", "username": "a", "password": "pw"})
+    client.post("/login", data={"username": "a", "password": "pw"})
+    return client
+
+
+@pytest.fixture
+def client(built_catalog):
+    return logged_in(built_catalog("--terms", "latest:2", **CATALOG))    # DB_FILE put back by create_db
+
+
+def test_terms_lists_the_ingested_terms(client):
+    assert client.get("/api/terms").get_json() == [
+        {"code": "1935", "name": "Term 1935"}, {"code": "1940", "name": "Term 1940"}]
+
+
+def test_term_scopes_course_detail_favorites_and_schedule(client):
+    catalog = SyntheticCatalog(**CATALOG)
+    cid = next(c for s in catalog.subjects for c in catalog.course_ids(s)
+               if catalog.offered(c, "1940") and not catalog.offered(c, "1935"))
+
+    detail = {t: client.get(f"/api/course/{cid}?term={t}").get_json() for t in ("1935", "1940")}
+    assert detail["1940"]["aok"] and detail["1940"]["professors"]
+    assert detail["1935"]["aok"] is None and detail["1935"]["professors"] is None
+    assert client.get(f"/api/course/{cid}").get_json() == detail["1940"]     # newest by default
+
+    client.post("/api/favorites", json={"course_id": cid})
+    for t in ("1935", "1940"):
+        assert client.get(f"/api/favorites?term={t}").get_json() == [detail[t]]
+
+    for t in ("1935", "1940"):
+        picked = client.get(f"/api/schedule?major=S000&term={t}").get_json()
+        assert picked and all(catalog.offered(c["id"], t) for c in picked)
+
+
+def test_a_catalog_from_before_professor_ids_is_still_served(legacy_catalog, monkeypatch):
+    monkeypatch.setattr(src.db, "DB_FILE", src.db.DB_FILE)
+    client = logged_in(legacy_catalog())
+    users = sqlite3.connect(src.db.users_db_file())
+    users.execute("INSERT INTO professor_ratings (professor, avg_rating) VALUES ('Ann Lee', 4.5)")
+    users.commit()
+    users.close()
+
+    courses = client.get("/api/courses").get_json()["courses"]
+    assert {c["id"] for c in courses} == {"000000", "999999"}
+    assert all(c["best_prof_rating"] == 4.5 for c in courses)        # matched by name
+    assert client.get("/api/professors").get_json()[0]["avg_rating"] == 4.5
+    assert client.get("/api/schedule?major=S000").get_json()[0]["avg_rating"] == 4.5
+    assert client.get("/api/course/000000").get_json()["aok"] == "(NS)"
@@ -0,0 +1,296 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from src import telemetry
+from src.db import BulkWriter
+from src.fake_api import SyntheticCatalog
+from src.migrations import CATALOG_INDEXES
+
+BUILT_TABLES = ("courses", "course_offerings", "course_attributes",
+                "class_listings", "meeting_patterns", "instructors")
+
+
+class RevisedCatalog(SyntheticCatalog):
+    """SyntheticCatalog whose listings give the *revised* courses a newer effdt
+    (and, with *offer_nbr*, a new crse_offer_nbr)."""
+
+    def __init__(self, revised=(), offer_nbr=None, **kw):
+        super().__init__(**kw)
+        self.revised = set(revised)
+        self.offer_nbr = offer_nbr
+
+    def _classes(self, strm, crse_id):
+        payload = super()._classes(strm, crse_id)
+        if self.offer_nbr and crse_id in self.revised and payload["ssr_get_classes_resp"]["search_result"]:
+            payload["ssr_get_classes_resp"]["search_result"]["subjects"]["subject"]["crse_offer_nbr"] = \
+                self.offer_nbr
+        return payload
+
+    def _course_listing(self, subject):
+        payload = super()._course_listing(subject)
+        summaries = payload["ssr_get_courses_resp"]["course_search_result"]["subjects"]["subject"]
+        for course in summaries["course_summaries"]["course_summary"]:
+            if course["crse_id"] in self.revised:
+                course["effdt"] = "2021-01-01"
+        return payload
+
+
+def dump(path, ordered=False):
+    """Every built table's rows; sorted unless *ordered* (insertion order matters)."""
+    conn = sqlite3.connect(path)
+    rows = {t: conn.execute(f"SELECT * FROM {t}").fetchall() for t in BUILT_TABLES}
+    conn.close()
+    return rows if ordered else {t: sorted(r) for t, r in rows.items()}
+
+
+def test_create_db_end_to_end_offline(fake_api, built_catalog):
+    catalog = SyntheticCatalog(subjects=3, courses=5, terms=("1935", "1940"))
+    _, url = fake_api(catalog)
+    live = built_catalog("--terms", "latest:2", "--workers", "4", url=url)
+
+    conn = sqlite3.connect(live)
+    assert conn.execute("SELECT COUNT(*) FROM courses").fetchone()[0] == 15
+    offered = sum(catalog.offered(cid, t) for s in catalog.subjects
+                  for cid in catalog.course_ids(s) for t in catalog.terms)
+    assert conn.execute("SELECT COUNT(*) FROM class_listings").fetchone()[0] == offered
+    assert conn.execute("SELECT COUNT(*) FROM meeting_patterns").fetchone()[0] == offered * 2
+    # one professors row per person, and every instructor row points at one
+    assert conn.execute("SELECT COUNT(*) FROM professors").fetchone()[0] == \
+        conn.execute("SELECT COUNT(DISTINCT name_display) FROM instructors").fetchone()[0]
+    assert conn.execute("SELECT COUNT(*) FROM instructors i LEFT JOIN professors p "
+                        "ON p.professor_id = i.professor_id WHERE p.name_key IS NULL").fetchone()[0] == 0
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {f"{t}_{'_'.join(cols)}_idx" for t, cols in CATALOG_INDEXES} <= indexes
+    conn.close()
+
+
+def test_concurrent_harvest_builds_the_same_catalog(fake_api, built_catalog):
+    _, url = fake_api(SyntheticCatalog(subjects=4, courses=6, terms=("1935", "1940")))
+    seq = built_catalog("--terms", "latest:2", db="seq.db", url=url)
+    threaded = built_catalog("--terms", "latest:2", "--workers", "4", db="threaded.db", url=url)
+    assert dump(seq, ordered=True) == dump(threaded, ordered=True)
+
+
+def test_pipeline_builds_the_same_catalog(fake_api, built_catalog):
+    _, url = fake_api(SyntheticCatalog(subjects=4, courses=6, terms=("1935", "1940")))
+    seq = built_catalog("--terms", "latest:2", db="seq.db", url=url)
+    pipe = built_catalog("--terms", "latest:2", "--pipeline", "--workers", "3", "--parsers", "2",
+                         db="pipe.db", url=url)
+    assert dump(seq) == dump(pipe)
+
+
+def test_sharded_build_merges_to_the_unsharded_catalog(fake_api, built_catalog):
+    _, url = fake_api(SyntheticCatalog(subjects=6, courses=4, terms=("1940",), crosslist=2))
+
+    whole = built_catalog(db="whole.db", url=url)
+    for k in (1, 2, 3):
+        built_catalog("--shard", f"{k}/3", db="merged.db", url=url)
+    merged = built_catalog("--merge", db="merged.db", url=url)
+
+    assert dump(whole) == dump(merged)
+    assert len(dump(merged)["courses"]) == 24          # cross-listings kept once
+
+
+def test_reparse_rebuilds_from_the_archive_without_network(fake_api, built_catalog, tmp_path):
+    app, url = fake_api(SyntheticCatalog(subjects=3, courses=4, terms=("1935", "1940")))
+    archive = str(tmp_path / "archive.db")
+
+    fetched = built_catalog("--terms", "latest:2", "--archive", archive, db="fetched.db", url=url)
+    requests_made = app.config["STATS"]["requests"]
+    reparsed = built_catalog("--terms", "latest:2", "--archive", archive, "--reparse",
+                             db="reparsed.db", url=url)
+    assert app.config["STATS"]["requests"] == requests_made
+    assert dump(fetched, ordered=True) == dump(reparsed, ordered=True)
+
+
+def test_size_triggered_flushes_do_not_change_the_catalog(fake_api, built_catalog):
+    _, url = fake_api(SyntheticCatalog(subjects=2, courses=30, terms=("1940",)))
+    one = built_catalog(db="one.db", url=url)
+    many = built_catalog("--flush-rows", "25", db="many.db", url=url)
+    assert dump(one) == dump(many)
+
+
+def test_rebuild_reports_only_changed_rows(built_catalog, tmp_path):
+    (tmp_path / "odd ?#% dir").mkdir()                 # URI metacharacters in the path
+
+    def build(**catalog_kw):
+        live = built_catalog(db="odd ?#% dir/courses.db", subjects=2, courses=5, terms=("1940",),
+                             **catalog_kw)
+        with open(live + ".changes.json") as f:
+            return json.load(f)
+
+    first = build()
+    assert first["baseline"] is None and len(first["crse_ids"]["added"]) == 10
+
+    again = build()
+    assert all(c == {"added": 0, "changed": 0, "removed": 0} for c in again["tables"].values())
+    assert again["crse_ids"] == {"added": [], "changed": [], "removed": []}
+
+    moved = build(sections=3)
+    assert moved["crse_ids"]["added"] == moved["crse_ids"]["removed"] == []
+    assert moved["crse_ids"]["changed"]
+    assert moved["tables"]["meeting_patterns"]["added"] > 0
+    assert moved["tables"]["courses"] == {"added": 0, "changed": 0, "removed": 0}
+
+
+def test_incremental_refresh_fetches_only_changed_courses_and_drops_vanished_ones(
+        fake_api, built_catalog, tmp_path):
+    live = built_catalog(subjects=2, courses=5, terms=("1940",))
+    # a course per subject disappears and 000001 gets a new effdt; the rest is as stored
+    app, url = fake_api(RevisedCatalog(revised={"000001"}, subjects=2, courses=4, terms=("1940",)))
+    metrics = str(tmp_path / "metrics.json")
+    built_catalog("--incremental", "--metrics-out", metrics, url=url)
+
+    with open(metrics) as f:
+        assert json.load(f)["build"]["refresh"] == {"changed": 1, "unchanged": 7, "removed": 2}
+    assert app.config["STATS"]["/classes/strm"] == 1          # only 000001 was re-fetched
+    conn = sqlite3.connect(live)
+    assert conn.execute("SELECT effdt FROM course_sync WHERE crse_id='000001'").fetchone() == ("2021-01-01",)
+    assert conn.execute("SELECT COUNT(*) FROM class_listings WHERE crse_id IN ('000004', '001004')"
+                        ).fetchone()[0] == 0
+    conn.close()
+    assert dump(live) == dump(built_catalog(db="full.db", url=url))
+
+
+def test_resume_after_an_interrupted_flush_matches_a_clean_build(
+        fake_api, built_catalog, monkeypatch):
+    _, url = fake_api(SyntheticCatalog(subjects=3, courses=6, terms=("1935", "1940")))
+    clean = built_catalog("--terms", "latest:2", db="clean.db", url=url)
+
+    # Ctrl-C lands inside a flush, after some of its tables were written
+    write, calls = BulkWriter.write, []
+    def interrupted(self, buf):
+        calls.append(buf.table)
+        written = write(self, buf)
+        if buf.table == "meeting_patterns" and calls.count(buf.table) == 2:
+            raise KeyboardInterrupt
+        return written
+    monkeypatch.setattr(BulkWriter, "write", interrupted)
+    with pytest.raises(SystemExit) as stopped:
+        built_catalog("--terms", "latest:2", "--flush-rows", "40", url=url)
+    assert stopped.value.code == 0
+    monkeypatch.setattr(BulkWriter, "write", write)
+
+    live = built_catalog("--resume", url=url)
+    assert dump(live) == dump(clean)
+
+
+def test_a_shrunken_snapshot_is_refused_and_the_live_db_kept(built_catalog, tmp_path):
+    live = built_catalog(subjects=2, courses=5, terms=("1940",))
+    before = open(live, "rb").read()
+
+    with pytest.raises(SystemExit) as refused:
+        built_catalog("--min-ratio", "0.9", subjects=2, courses=2, terms=("1940",))
+    assert refused.value.code == 1
+    assert open(live, "rb").read() == before and os.path.exists(live + ".staging")
+
+    inode = os.stat(live).st_ino
+    built_catalog("--min-ratio", "0.9", subjects=2, courses=5, terms=("1940",))
+    assert os.stat(live).st_ino != inode and not os.path.exists(live + ".staging")
+    assert dump(live) == dump(built_catalog(db="fresh.db", subjects=2, courses=5, terms=("1940",)))
+
+
+def test_resume_publishes_a_finished_build_that_was_refused(fake_api, built_catalog):
+    live = built_catalog(subjects=2, courses=5, terms=("1940",))
+    app, url = fake_api(SyntheticCatalog(subjects=2, courses=2, terms=("1940",)))
+    with pytest.raises(SystemExit) as refused:
+        built_catalog("--min-ratio", "0.9", url=url)
+    assert refused.value.code == 1 and os.path.exists(live + ".staging")
+    shrunk = dump(live + ".staging")
+
+    requests_made = app.config["STATS"]["requests"]
+    built_catalog("--resume", url=url)                  # the shrink was expected after all
+    assert app.config["STATS"]["requests"] - requests_made == 2     # subject and term lists
+    assert not os.path.exists(live + ".staging") and dump(live) == shrunk
+
+
+def test_replay_with_a_cold_cache_names_the_miss(fake_api, built_catalog, tmp_path):
+    _, url = fake_api()
+    with pytest.raises(SystemExit, match="Replay miss.*subject list"):
+        built_catalog("--cache", "replay", "--cache-path", str(tmp_path / "cold.db"), url=url)
+
+
+def test_select_terms(create_db):
+    terms = [{"code": c} for c in ("1930", "1935", "1940")]
+    assert create_db.select_terms("latest", terms) == ["1940"]
+    assert create_db.select_terms("latest:2", terms) == ["1935", "1940"]
+    assert create_db.select_terms("latest:9", terms) == ["1930", "1935", "1940"]
+    assert create_db.select_terms("1930, 1940", terms) == ["1930", "1940"]
+    for bad in ("latest:0", "latest:-1", "latest:x", "latest:", "1930,1999"):
+        with pytest.raises(SystemExit):
+            create_db.select_terms(bad, terms)
+
+
+def test_each_build_writes_its_own_metrics_and_stops_telemetry(built_catalog, tmp_path):
+    for _ in range(2):                     # well within one second of each other
+        built_catalog(subjects=1, courses=2, terms=("1940",))
+        assert telemetry.active() is None
+    assert len(list((tmp_path / "build_metrics").glob("*.json"))) == 2
+
+
+def test_refetched_courses_rewrite_only_rows_that_changed(fake_api, built_catalog, tmp_path):
+    def refresh(**catalog_kw):
+        # an older effdt on record makes every course count as changed and be re-fetched
+        conn = sqlite3.connect(live)
+        conn.execute("UPDATE course_sync SET effdt = '1999-01-01'")
+        conn.commit()
+        conn.close()
+        metrics = str(tmp_path / "metrics.json")
+        built_catalog("--incremental", "--metrics-out", metrics, subjects=2, courses=5,
+                      terms=("1940",), **catalog_kw)
+        with open(metrics) as f:
+            build = json.load(f)["build"]
+        assert build["refresh"]["changed"] == 10
+        return {t: n for t, n in build["rows_changed"].items() if n and t in BUILT_TABLES}
+
+    live = built_catalog(subjects=2, courses=5, terms=("1940",))
+    before = dump(live)
+    assert refresh() == {}                              # same payloads: nothing rewritten
+    assert dump(live) == before
+
+    classes = len(before["class_listings"])
+    assert refresh(sections=3) == {"meeting_patterns": classes, "instructors": classes}
+    assert dump(live) == dump(built_catalog(db="full.db", subjects=2, courses=5, terms=("1940",),
+                                            sections=3))
+    assert refresh(sections=1) == {"meeting_patterns": 2 * classes, "instructors": 2 * classes}
+    assert dump(live) == dump(built_catalog(db="one.db", subjects=2, courses=5, terms=("1940",),
+                                            sections=1))
+
+
+def test_a_build_over_a_pre_hash_catalog_publishes(built_catalog, legacy_catalog):
+    fresh = dump(built_catalog(db="fresh.db", subjects=2, courses=3, terms=("1940",)))
+    # --incremental sees the old schema and falls back to a full build
+    for argv, name in (((), "full.db"), (("--incremental",), "incremental.db")):
+        live = legacy_catalog(name)
+        built_catalog(*argv, db=name, subjects=2, courses=3, terms=("1940",))
+        assert not os.path.exists(live + ".staging") and dump(live) == fresh
+        with open(live + ".changes.json") as f:
+            changes = json.load(f)
+        assert changes["tables"]["courses"] == {"added": 6, "changed": 0, "removed": 2}
+        assert changes["tables"]["meeting_patterns"] == {"added": 8, "changed": 0, "removed": 2}
+        assert changes["crse_ids"]["removed"] == ["999999"]
+        assert changes["crse_ids"]["changed"] == ["000000"]
+        assert len(changes["crse_ids"]["added"]) == 5
+
+
+def test_attributes_are_kept_per_term_and_follow_a_new_offer_nbr(fake_api, built_catalog):
+    catalog = dict(subjects=2, courses=4, terms=("1935", "1940"))
+    live = built_catalog("--terms", "latest:2", **catalog)
+    conn = sqlite3.connect(live)
+    assert conn.execute("SELECT COUNT(*) FROM course_attributes").fetchone() == \
+        conn.execute("SELECT COUNT(*) FROM course_offerings").fetchone()
+    assert conn.execute("SELECT COUNT(*) FROM course_attributes a JOIN course_offerings o "
+                        "USING (offering_id, strm) WHERE a.descrlong != o.descrlong").fetchone() == (0,)
+    conn.close()
+
+    cid = next(c for c in ("000000", "000001", "000002") if SyntheticCatalog(**catalog).offered(c, "1940"))
+    _, url = fake_api(RevisedCatalog(revised={cid}, offer_nbr="2", **catalog))
+    built_catalog("--terms", "latest:2", "--incremental", url=url)
+    conn = sqlite3.connect(live)
+    assert conn.execute("SELECT COUNT(*) FROM course_attributes WHERE offering_id = ?",
+                        (f"{cid}_1",)).fetchone() == (0,)
+    conn.close()
+    assert dump(live) == dump(built_catalog("--terms", "latest:2", db="full.db", url=url))
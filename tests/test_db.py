@@ -0,0 +1,225 @@
+import dataclasses
+import os
+import re
+import sqlite3
+import threading
+
+import pytest
+
+import src.db
+from src.db import (
+    BulkWriter, ConnectionManager, add_columns_if_missing, check_snapshot, insert_many, stream,
+    swap_in_snapshot,
+)
+
+
+def make_db(path, value):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (v TEXT)")
+    conn.execute("INSERT INTO t VALUES (?)", (value,))
+    conn.commit()
+    conn.close()
+
+
+def test_connections_are_reused_per_thread_and_reader_is_read_only(tmp_path):
+    path = str(tmp_path / "a.db")
+    make_db(path, "one")
+    db = ConnectionManager(path)
+
+    assert db.reader() is db.reader()
+    assert db.reader() is not db.writer()
+    assert db.reader().execute("PRAGMA query_only").fetchone()[0] == 1
+    with pytest.raises(sqlite3.OperationalError):
+        db.reader().execute("INSERT INTO t VALUES ('x')")
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(db.reader().execute("SELECT v FROM t").fetchone()[0]))
+    t.start()
+    t.join()
+    assert other == ["one"] and db.opened == 3        # reader + writer here, reader there
+
+
+def test_reader_follows_a_snapshot_swapped_in_by_rename(tmp_path):
+    live, staging = str(tmp_path / "live.db"), str(tmp_path / "live.db.staging")
+    make_db(live, "old")
+    db = ConnectionManager(live)
+    assert db.reader().execute("SELECT v FROM t").fetchone()["v"] == "old"
+
+    make_db(staging, "new")
+    os.replace(staging, live)
+    assert db.reader().execute("SELECT v FROM t").fetchone()["v"] == "new"
+
+
+def test_release_rolls_back_but_keeps_the_connection(tmp_path):
+    path = str(tmp_path / "a.db")
+    make_db(path, "one")
+    db = ConnectionManager(path)
+    w = db.writer()
+    w.execute("CREATE TABLE u (v TEXT)")
+    w.commit()
+    w.execute("INSERT INTO u VALUES ('uncommitted')")
+    db.release()
+    assert db.writer() is w
+    assert db.reader().execute("SELECT COUNT(*) FROM u").fetchone()[0] == 0
+
+
+def test_catalog_is_attached_read_only_and_user_data_goes_to_users_db(tmp_path):
+    path = str(tmp_path / "a.db")
+    make_db(path, "one")
+    db = ConnectionManager(path)
+    w = db.writer()
+    with pytest.raises(sqlite3.OperationalError):
+        w.execute("INSERT INTO t VALUES ('x')")
+    assert w.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert {r[1]: r[2] for r in w.execute("PRAGMA database_list")} == {
+        "main": str(tmp_path / "users.db"), "catalog": path}
+
+
+@dataclasses.dataclass
+class Row:
+    id: int
+    v: str
+
+
+def test_stream_fetches_in_batches_with_row_factories(tmp_path, monkeypatch):
+    path = str(tmp_path / "a.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE r (id INTEGER, v TEXT)")
+    conn.executemany("INSERT INTO r VALUES (?, ?)", [(i, f"v{i}") for i in range(1050)])
+    conn.commit()
+
+    fetched = []
+    class Counting(sqlite3.Cursor):
+        def fetchmany(self, size):
+            fetched.append(size)
+            return super().fetchmany(size)
+    class CountingConnection(sqlite3.Connection):
+        def execute(self, sql, params=()):
+            return self.cursor(Counting).execute(sql, params)
+    counting = sqlite3.connect(path, factory=CountingConnection)
+
+    rows = stream("SELECT id, v FROM r ORDER BY id", conn=counting, batch=100)
+    assert fetched == []                                # lazy until iterated
+    assert sum(1 for _ in rows) == 1050 and fetched == [100] * 12    # last one comes back empty
+
+    sql = "SELECT id, v FROM r WHERE id < ? ORDER BY id"
+    assert list(stream(sql, (2,), conn)) == [(0, "v0"), (1, "v1")]
+    assert list(stream(sql, (2,), conn, row=dict)) == [{"id": 0, "v": "v0"}, {"id": 1, "v": "v1"}]
+    assert list(stream(sql, (2,), conn, row=Row)) == [Row(0, "v0"), Row(1, "v1")]
+    conn.close()
+
+    monkeypatch.setattr(src.db, "DB_FILE", path)
+    rows = stream("SELECT id FROM r ORDER BY id", batch=10)
+    assert next(rows) == (0,)
+    rows.close()                                        # and its own connection with it
+
+
+def test_insert_many_checks_and_converts_through_a_cached_loader(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.db, "DB_FILE", str(tmp_path / "a.db"))
+    conn = src.db.connect_db()
+    conn.execute("CREATE TABLE p (id INTEGER PRIMARY KEY, name TEXT NOT NULL, gpa REAL, n INTEGER)")
+    pragmas = []
+    conn.set_trace_callback(lambda sql: pragmas.append(sql) if sql.startswith("PRAGMA") else None)
+
+    insert_many("p", [{"name": "a", "gpa": "3.5", "n": "7"}, {"name": "b", "n": 2.0}], conn)
+    insert_many("p", [{"name": "c", "gpa": 4}], conn)
+    assert conn.execute("SELECT name, gpa, n FROM p ORDER BY id").fetchall() == \
+        [("a", 3.5, 7), ("b", None, 2), ("c", 4.0, None)]
+    assert len(pragmas) == 1                            # compiled once per connection
+
+    for bad, message in (({"name": "d", "n": "1.5"}, "p.n is INTEGER"),
+                         ({"gpa": 1.0}, "p.name is NOT NULL"),
+                         ({"name": "e", "color": "red"}, "no column(s) color")):
+        with pytest.raises(ValueError, match=re.escape(message)):
+            insert_many("p", [bad], conn)
+
+    assert len(pragmas) == 2                            # only the unknown column re-checks the schema
+    add_columns_if_missing("p", {"gpa": "REAL"}, conn)  # known: no PRAGMA at all
+    assert len(pragmas) == 2
+    add_columns_if_missing("p", {"color": "TEXT"}, conn)
+    insert_many("p", [{"name": "e", "color": "red"}], conn)
+    assert conn.execute("SELECT color FROM p WHERE name='e'").fetchone() == ("red",)
+    conn.close()
+
+
+def test_a_damaged_snapshot_is_refused_and_a_good_one_swapped_in(tmp_path):
+    live, staging = str(tmp_path / "live.db"), str(tmp_path / "live.db.staging")
+    make_db(live, "old")
+    conn = sqlite3.connect(staging)
+    conn.execute("CREATE TABLE t (v TEXT)")
+    conn.execute("CREATE INDEX t_v ON t (v)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(f"row {i} " * 20,) for i in range(2000)])
+    conn.commit()
+    conn.close()
+    good = open(staging, "rb").read()
+
+    damaged = bytearray(good)
+    for i in range(len(good) - 3 * 4096, len(good) - 2 * 4096, 7):    # scribble over a page
+        damaged[i] = 0x55
+    with open(staging, "wb") as f:
+        f.write(damaged)
+    assert check_snapshot(staging, live, ["t"])[0].startswith("unreadable")
+
+    with open(staging, "wb") as f:
+        f.write(good)
+    assert check_snapshot(staging, live, ["t"]) == []
+    swap_in_snapshot(staging, live)
+    assert not os.path.exists(staging)
+    assert sqlite3.connect(live).execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2000
+
+
+def test_bulk_writer_updates_in_place_and_restores_pragmas(tmp_path):
+    path = str(tmp_path / "a.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE c (id TEXT PRIMARY KEY, title TEXT, row_hash TEXT)")
+    conn.close()
+
+    w = BulkWriter(path)
+    saved = dict(w._saved)                              # what the connection had on open
+    assert saved["journal_mode"] == "delete"
+    assert w.conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+    buf = w.buffer("c")
+    buf.add({"id": "a", "title": "Old", "row_hash": "1"})
+    buf.add({"id": "b", "title": "Same", "row_hash": "2"})
+    w.write(buf)
+    w.commit()
+    rowids = dict(w.conn.execute("SELECT id, rowid FROM c"))
+
+    changes = w.conn.total_changes
+    w.upsert("c", [{"id": "a", "title": "New", "row_hash": "3"},
+                   {"id": "b", "title": "Same", "row_hash": "2"}])
+    assert w.conn.total_changes - changes == 1          # same hash: b is not rewritten
+    restored = []
+    w.conn.set_trace_callback(restored.append)
+    w.close()
+
+    assert restored[-len(saved):] == [f"PRAGMA {k}={v}" for k, v in saved.items()]
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT id, title FROM c ORDER BY id").fetchall() == [("a", "New"), ("b", "Same")]
+    assert dict(conn.execute("SELECT id, rowid FROM c")) == rowids     # updated, not replaced
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+
+
+def test_buffered_rows_are_checked_and_converted_like_dict_rows(tmp_path):
+    path = str(tmp_path / "a.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE p (id TEXT PRIMARY KEY, name TEXT NOT NULL, n INTEGER)")
+    conn.close()
+
+    w = BulkWriter(path)
+    buf = w.buffer("p")
+    buf.add({"id": "a", "name": "A", "n": "7"})
+    buf.rows.append(("b", "B"))                         # buffered before n was added
+    w.write(buf)
+    assert w.conn.execute("SELECT id, n FROM p ORDER BY id").fetchall() == [("a", 7), ("b", None)]
+
+    for bad, message in (({"id": "c", "name": "C", "n": "1.5"}, "p.n is INTEGER"),
+                         ({"id": "d", "n": 1}, "p.name is NOT NULL")):
+        buf.clear()
+        buf.add(bad)
+        with pytest.raises(ValueError, match=re.escape(message)):
+            w.write(buf)
+    with pytest.raises(ValueError, match=re.escape("p has no column(s) nmae")):
+        buf.add({"id": "e", "nmae": "E"})                # a typo fails here, not as a NULL
+    w.close()
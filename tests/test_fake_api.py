@@ -0,0 +1,48 @@
+import src.api_client as api_client
+from src.api_client import ApiClient, ResponseCache
+from src.fake_api import RecordedFixtures, SyntheticCatalog
+
+
+def test_synthetic_payloads_parse_like_the_real_api(fake_api, monkeypatch):
+    _, url = fake_api()
+    monkeypatch.setattr(api_client, "_client", ApiClient(base_url=url, token="t", backoff=0))
+
+    terms = api_client.get_all_terms()["scc_lov_resp"]["lovs"]["lov"]["values"]["value"]
+    assert [t["code"] for t in terms] == ["1930", "1935", "1940"]
+
+    listing = api_client.get_course_listings("S001")
+    summaries = listing["ssr_get_courses_resp"]["course_search_result"]["subjects"]["subject"]["course_summaries"]["course_summary"]
+    assert len(summaries) == 4
+
+    cid = summaries[0]["crse_id"]
+    details = api_client.get_course_details(cid, "1")
+    assert details["ssr_get_course_offering_resp"]["course_offering_result"]["course_offering"]["crse_id"] == cid
+    assert "ssr_get_classes_resp" in api_client.get_course_offering_metadata("1940", cid)
+
+
+def test_unknown_path_is_404_and_token_is_enforced(fake_api):
+    app, url = fake_api(token="secret")
+    assert ApiClient(base_url=url, token="secret").get("/courses/subject/NOPE").status_code == 404
+    assert ApiClient(base_url=url, token="wrong").get("/courses/subject/S000").status_code == 401
+    assert app.config["STATS"]["unauthorized"] == 1
+
+
+def test_injected_errors_are_retried(fake_api):
+    app, url = fake_api(error_rate=0.5, seed=1)
+    client = ApiClient(base_url=url, token="t", retries=10, backoff=0)
+    for i in range(10):
+        assert client.get(f"/courses/subject/S00{i % 3}").status_code == 200
+    assert app.config["STATS"]["errors_injected"] > 0
+
+
+def test_recorded_fixtures_take_precedence(fake_api, tmp_path):
+    recording = str(tmp_path / "recorded.db")
+    ResponseCache(recording).put("/courses/subject/S000", None, b'{"recorded": true}',
+                                 base_url="https://api.example.edu/curriculum")
+
+    _, url = fake_api(RecordedFixtures(recording, "https://api.example.edu/curriculum"),
+                      SyntheticCatalog(subjects=2))
+    client = ApiClient(base_url=url, token="t")
+    assert client.get("/courses/subject/S000").json() == {"recorded": True}
+    assert "ssr_get_courses_resp" in client.get("/courses/subject/S001").json()
+
@@ -0,0 +1,75 @@
+import importlib
+import re
+import sqlite3
+
+import pytest
+
+import src.db
+from src.migrations import CATALOG_VERSION, USERS_VERSION, migrate_catalog, migrate_users
+
+
+ENDPOINTS = [
+    "/", "/profile", "/schedule",
+    "/api/courses",
+    "/api/courses?subject=S001&professor=Instr&term=1935",
+    "/api/courses?aok=NS&location=Building",
+    "/api/course/000001",
+    "/api/departments", "/api/terms",
+    "/api/professors", "/api/professors?query=000",
+    "/api/reviews", "/api/reviews?course_id=000000",
+    "/api/favorites",
+    "/api/schedule?major=S002",
+]
+
+# tables an endpoint may read end to end: the professors listing is unfiltered
+FULL_SCANS_OK = {"p"}
+
+
+@pytest.fixture
+def catalog(built_catalog):
+    live = built_catalog("--terms", "latest:2", subjects=4, courses=6, terms=("1935", "1940"))
+    src.db.set_db_file(live)            # put back by the create_db fixture
+    return live
+
+
+def test_migrations_are_recorded_and_idempotent(catalog):
+    users = src.db.users_db_file(catalog)
+    for path, expected in ((catalog, CATALOG_VERSION), (users, USERS_VERSION)):
+        conn = sqlite3.connect(path)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == expected
+        conn.close()
+    assert migrate_catalog(catalog) == [] and migrate_users(users, catalog) == []
+
+
+def test_endpoints_do_not_fall_back_to_full_scans(catalog):
+    import src.api_ui
+    catalog_before = open(catalog, "rb").read()
+    app = importlib.reload(src.api_ui).app
+    client = app.test_client()
+    client.post("/signup", data={"name": "A", "username": "a", "password": "pw"})
+    client.post("/login", data={"username": "a", "password": "pw"})
+    client.post("/api/favorites", json={"course_id": "000000"})
+    client.post("/api/reviews", json={"course_id": "000000", "review_text": "ok"})
+
+    seen = []
+    reader = app.extensions["sqlite"].reader()
+    traced = (reader, app.extensions["sqlite"].writer())
+    for conn in traced:
+        conn.set_trace_callback(seen.append)
+    try:
+        for url in ENDPOINTS:
+            assert client.get(url).status_code == 200, url
+    finally:
+        for conn in traced:
+            conn.set_trace_callback(None)
+
+    selects = [sql for sql in seen if sql.lstrip().upper().startswith("SELECT")]
+    assert selects
+    for sql in selects:
+        for detail in (row[3] for row in reader.execute("EXPLAIN QUERY PLAN " + sql)):
+            # an AUTOMATIC index is one SQLite builds per query because ours is missing
+            scan = re.match(r"SCAN (\w+)", detail)
+            if "AUTOMATIC" in detail or (scan and "INDEX" not in detail
+                                         and scan.group(1) not in FULL_SCANS_OK):
+                pytest.fail(f"{detail} in: {' '.join(sql.split())}")
+    assert open(catalog, "rb").read() == catalog_before     # user writes went to users.db
@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+from src.fake_api import start_server
+from src.fake_rmp import create_app, synthetic_professors
+from src.parse_api import professor_id
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+import scrape_rmp
+
+
+class FakeDriver:
+    started = 0
+
+    def __init__(self):
+        FakeDriver.started += 1
+
+    def quit(self):
+        pass
+
+
+def fake_scrape(driver, name):
+    time.sleep(0.02)      # stands in for a page load
+    return {"professor": name, "avg_rating": 4.0, "avg_difficulty": 3.0,
+            "would_take_again_pct": 80.0, "tags": None}
+
+
+def run_pool(names, drivers, **kw):
+    saved, lock = [], threading.Lock()
+    def save(record):
+        with lock:
+            saved.append(record["professor"])
+    pool = scrape_rmp.ScrapePool(names, drivers, make_driver=FakeDriver,
+                                 scrape=kw.get("scrape", fake_scrape), save=save)
+    start = time.perf_counter()
+    pool.run()
+    return pool, saved, time.perf_counter() - start
+
+
+def test_pool_scrapes_every_name_once_and_scales(monkeypatch):
+    monkeypatch.setattr(scrape_rmp, "MIN_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "MAX_DELAY", 0.0)
+    names = [f"Prof {i}" for i in range(40)]
+
+    _, one, t1 = run_pool(names, 1)
+    pool, four, t4 = run_pool(names, 4)
+    assert sorted(one) == sorted(four) == sorted(names)
+    assert pool.drivers == 4 and t4 < t1 / 2
+
+
+def test_pool_recycles_browsers_and_steals_work(monkeypatch):
+    monkeypatch.setattr(scrape_rmp, "MIN_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "MAX_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "RESTART_EVERY", 5)
+    FakeDriver.started = 0
+
+    def uneven(driver, name):
+        if name.endswith("0"):        # worker 0's names are slow
+            time.sleep(0.05)
+        return fake_scrape(driver, name)
+    names = [f"Prof {i}" for i in range(20)]
+    pool, saved, _ = run_pool(names, 2, scrape=uneven)
+    assert sorted(saved) == sorted(names)
+    assert FakeDriver.started == 2 + pool.restarts and pool.restarts >= 2
+
+
+def test_main_resumes_from_scraped_professors(tmp_path, monkeypatch):
+    db = str(tmp_path / "courses.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE instructors (name_display TEXT)")
+    conn.executemany("INSERT INTO instructors VALUES (?)", [("A",), ("B",), ("C",)])
+    conn.commit()
+    conn.close()
+
+    seen = []
+    def scrape(driver, name):
+        seen.append(name)
+        return fake_scrape(driver, name)
+    monkeypatch.setattr(scrape_rmp, "MIN_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "MAX_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "init_driver", FakeDriver)
+    monkeypatch.setattr(scrape_rmp, "scrape_professor", scrape)
+    monkeypatch.setattr(scrape_rmp, "DB_PATH", db)
+
+    scrape_rmp.init_db()
+    scrape_rmp.save_rating({**fake_scrape(None, "B")})
+    scrape_rmp.main(["--db", db, "--drivers", "2"])
+    assert sorted(seen) == ["A", "C"]
+    assert scrape_rmp.get_scraped_professors() == {"A", "B", "C"}
+
+
+@pytest.fixture
+def fake_rmp(monkeypatch):
+    profs = synthetic_professors(12, seed=3)
+    server, url = start_server(create_app(profs))
+    monkeypatch.setattr(scrape_rmp, "RMP_BASE_URL", url)
+    yield profs
+    server.shutdown()
+
+
+def test_http_backend_parses_stub_pages(fake_rmp):
+    driver = scrape_rmp.init_http_driver()
+    try:
+        for name, expected in fake_rmp.items():
+            assert scrape_rmp.scrape_professor_http(driver, name) == expected
+        with pytest.raises(scrape_rmp.ProfessorNotFound):
+            scrape_rmp.scrape_professor_http(driver, "Nobody Here")
+    finally:
+        driver.quit()
+
+
+def test_chrome_backend_matches_http(fake_rmp):
+    pytest.importorskip("selenium")
+    try:
+        driver = scrape_rmp.init_driver()
+    except Exception as e:          # no Chrome / chromedriver on this machine
+        pytest.skip(f"no headless Chrome: {e}")
+    try:
+        for name, expected in list(fake_rmp.items())[:3]:
+            assert scrape_rmp.scrape_professor(driver, name) == expected
+    finally:
+        driver.quit()
+
+
+def test_rating_writer_commits_in_batches(tmp_path, monkeypatch):
+    db = str(tmp_path / "courses.db")
+    monkeypatch.setattr(scrape_rmp, "DB_PATH", db)
+    scrape_rmp.init_db()
+    users = str(tmp_path / "users.db")
+    visible = lambda: sqlite3.connect(users).execute("SELECT COUNT(*) FROM professor_ratings").fetchone()[0]
+
+    writer = scrape_rmp.RatingWriter(batch=3, secs=60)
+    for i in range(7):
+        writer.save(fake_scrape(None, f"P{i}"))
+    assert visible() == 6 and writer.commits == 2     # the 7th waits for its batch
+    writer.close()
+    assert visible() == 7
+
+    writer = scrape_rmp.RatingWriter(batch=100, secs=0.2)
+    writer.save(fake_scrape(None, "Late"))
+    deadline = time.time() + 5
+    while visible() < 8 and time.time() < deadline:
+        time.sleep(0.05)
+    assert visible() == 8                               # flushed by the timer
+    writer.close()
+
+
+def test_schedule_puts_new_then_stalest_busiest_first(tmp_path, monkeypatch):
+    db = str(tmp_path / "courses.db")
+    monkeypatch.setattr(scrape_rmp, "DB_PATH", db)
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE class_listings (class_id TEXT, strm TEXT)")
+    conn.execute("CREATE TABLE instructors (class_id TEXT, strm TEXT, class_section TEXT, name_display TEXT)")
+    conn.executemany("INSERT INTO class_listings VALUES (?, ?)", [("c1", "1935"), ("c2", "1940")])
+    conn.executemany("INSERT INTO instructors VALUES (?, ?, ?, ?)", [
+        ("c2", "1940", "01", "Busy"), ("c2", "1940", "02", "Busy"), ("c2", "1940", "03", "Busy"),
+        ("c1", "1935", "01", "Idle"), ("c1", "1935", "01", "Old"), ("c1", "1935", "01", "Fresh"),
+        ("c1", "1935", "01", "Unknown"), ("c2", "1940", "01", "New"),
+    ])
+    conn.commit()
+    conn.close()
+    scrape_rmp.init_db()
+    conn = sqlite3.connect(str(tmp_path / "users.db"))
+    conn.executemany("INSERT INTO professor_ratings (professor, scraped_at) VALUES (?, ?)", [
+        ("Busy", "2026-08-01T00:00:00"),     # 60 days × (1 + 3 sections)
+        ("Idle", "2026-07-01T00:00:00"),     # 91 days × 1
+        ("Old", "2026-04-01T00:00:00"),      # 182 days × 1
+        ("Fresh", "2026-09-25T00:00:00"),    # 5 days: not due
+        ("Unknown", None),                   # never timestamped: oldest
+    ])
+    conn.commit()
+    conn.close()
+
+    now = scrape_rmp.datetime.datetime(2026, 9, 30)
+    assert scrape_rmp.schedule(now=now) == (["New"], {"new": 1, "stale": 0})
+    names, counts = scrape_rmp.schedule(refresh=True, now=now)
+    assert names == ["New", "Unknown", "Busy", "Old", "Idle"]
+    assert counts == {"new": 1, "stale": 4}
+
+
+def test_pool_stops_starting_scrapes_when_budget_runs_out(monkeypatch):
+    monkeypatch.setattr(scrape_rmp, "MIN_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "MAX_DELAY", 0.0)
+    saved = []
+    pool = scrape_rmp.ScrapePool([f"P{i}" for i in range(100)], 2, make_driver=FakeDriver,
+                                 scrape=fake_scrape, save=saved.append, budget=0.2)
+    pool.run()
+    assert 0 < len(saved) < 100 and pool.left == 100 - len(saved) - pool.skipped
+    assert saved[0]["professor"] in ("P0", "P1")
+
+
+def test_pool_without_save_batches_through_its_own_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape_rmp, "MIN_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "MAX_DELAY", 0.0)
+    monkeypatch.setattr(scrape_rmp, "DB_PATH", str(tmp_path / "courses.db"))
+    scrape_rmp.init_db()
+    pool = scrape_rmp.ScrapePool([f"P{i}" for i in range(7)], 2, make_driver=FakeDriver,
+                                 scrape=fake_scrape)
+    assert pool.run() == 7 and pool.save is None        # the writer was closed with the run
+    assert scrape_rmp.get_scraped_professors() == {f"P{i}" for i in range(7)}
+
+
+def test_init_db_moves_legacy_ratings_out_of_the_catalog(tmp_path, monkeypatch):
+    db = str(tmp_path / "courses.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE instructors (class_id TEXT, name_display TEXT)")
+    conn.executemany("INSERT INTO instructors VALUES (?, ?)",
+                     [("c1", "José García"), ("c2", "José García"), ("c3", "Ann Lee")])
+    conn.execute("CREATE TABLE professor_ratings (professor TEXT PRIMARY KEY, avg_rating REAL, "
+                 "avg_difficulty REAL, would_take_again_pct REAL, tags TEXT)")
+    conn.execute("INSERT INTO professor_ratings (professor, avg_rating) VALUES ('jose  garcia', 4.0)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(scrape_rmp, "DB_PATH", db)
+
+    catalog_before = open(db, "rb").read()
+    scrape_rmp.init_db()
+    assert open(db, "rb").read() == catalog_before       # the catalog is only read
+
+    conn = sqlite3.connect(str(tmp_path / "users.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("SELECT professor, avg_rating, professor_id, scraped_at FROM professor_ratings").fetchall() \
+        == [("jose  garcia", 4.0, professor_id("jose garcia"), None)]
+    conn.close()
+    assert list(scrape_rmp.get_all_professors()) == ["Ann Lee", "José García"]